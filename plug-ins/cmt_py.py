@@ -1,19 +1,19 @@
 import maya.OpenMayaMPx as OpenMayaMPx
+import cmt.plugins.dgmodifier as dgmodifier
 import cmt.plugins.swingtwist as swingtwist
 
 
 def initializePlugin(obj):
     plugin = OpenMayaMPx.MFnPlugin(obj, 'Chad Vernon', '1.0', 'Any')
 
-    # plugin.registerNode(swingtwist.SwingTwistNode.name, swingtwist.SwingTwistNode.id,
-    #                     swingtwist.SwingTwistNode.creator, swingtwist.SwingTwistNode.initialize)
-    #
-    # plugin.registerCommand(swingtwist.SwingTwistCommand.name, swingtwist.SwingTwistCommand.creator,
-    #                        swingtwist.SwingTwistCommand.command_syntax)
-    #
+    plugin.registerCommand(dgmodifier.DGModifierCommand.name, dgmodifier.DGModifierCommand.creator)
+
+    # The swingTwist node used to be registered here.  Scenes that still require this plug-in
+    # get the compiled node which has the same attributes.
+    swingtwist.load_plugin()
+
 
 def uninitializePlugin(obj):
     plugin = OpenMayaMPx.MFnPlugin(obj)
 
-    # plugin.deregisterCommand(swingtwist.SwingTwistCommand.name)
-    # plugin.deregisterNode(swingtwist.SwingTwistNode.id)
+    plugin.deregisterCommand(dgmodifier.DGModifierCommand.name)
@@ -0,0 +1,574 @@
+"""Retarget a library of fbx animation clips in a pool of headless mayapy processes.
+
+Each worker process opens the retarget scene once and then retargets clips until the
+batch is finished.  A clip is retargeted with the same steps as Retarget Selected in the
+ikRig window: the fbx is imported onto the source skeleton and the animation of the
+target skeleton is baked and exported.  The retarget scene is prepared beforehand by
+attaching the skeletons with :func:`cmt.anim.ikrig.attach_skeletons` and saving it.
+
+Progress is recorded in a json manifest.  Clips that fail are retried, and running the
+same batch again with the same manifest only retargets the clips that are not done yet.
+
+Example Usage
+=============
+From Maya or any Python interpreter::
+
+    from cmt.anim.batchretarget import retarget
+    summary = retarget(
+        glob.glob("D:/mocap/*.fbx"),
+        "D:/rigs/retarget.ma",
+        "root",
+        "D:/retargeted",
+        workers=8,
+        manifest="D:/retargeted/manifest.json",
+    )
+
+From the command line, where directories are searched for fbx files::
+
+    python batchretarget.py D:/rigs/retarget.ma root D:/mocap -o D:/retargeted -w 8
+
+The mayapy executable is found from MAYA_LOCATION unless it is passed in.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+)
+CMT_ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+
+# Workers report results on stdout with this prefix so they can be told apart from
+# anything Maya prints
+RESULT_PREFIX = "cmt.batchretarget.result:"
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def get_export_path(
+    path, export_directory, prefix="", suffix="", search="", replace=""
+):
+    """Get the generated export path given an input path.
+
+    :param path: Input path
+    :param export_directory: Directory of the exported file
+    :param prefix: Prefix added to the file name
+    :param suffix: Suffix added to the file name
+    :param search: Text to replace in the file name
+    :param replace: Replacement of the search text
+    :return: Export path
+    """
+    name = os.path.basename(path)
+    if search:
+        name = name.replace(search, replace)
+    name = "{}{}{}".format(prefix, name, suffix)
+    return os.path.realpath(os.path.join(export_directory, name))
+
+
+def find_mayapy():
+    """Get the mayapy executable of the Maya install in MAYA_LOCATION or the current
+    interpreter if it is mayapy.
+
+    :return: The mayapy executable path.
+    """
+    location = os.environ.get("MAYA_LOCATION")
+    if location:
+        path = os.path.join(location, "bin", "mayapy")
+        if platform.system() == "Windows":
+            path += ".exe"
+        return path
+    if os.path.basename(sys.executable).lower().startswith("mayapy"):
+        return sys.executable
+    raise RuntimeError("Unable to find mayapy.  Set MAYA_LOCATION or pass the path.")
+
+
+class Manifest(object):
+    """The retarget jobs of a batch and their results, saved to a json file."""
+
+    def __init__(self, file_path=None):
+        """Constructor
+
+        :param file_path: Optional json file.  Existing jobs are loaded from it.
+        """
+        self.file_path = file_path
+        self.jobs = []
+        self.summary = None
+        if file_path and os.path.exists(file_path):
+            with open(file_path, "r") as fh:
+                data = json.load(fh)
+            self.jobs = data.get("jobs", [])
+            self.summary = data.get("summary")
+
+    def add(self, source, output):
+        """Add a job, or get the existing job of the source file.
+
+        :param source: Fbx file to retarget
+        :param output: Exported fbx file
+        :return: The job dictionary
+        """
+        for job in self.jobs:
+            if job["source"] == source:
+                job["output"] = output
+                return job
+        job = {
+            "source": source,
+            "output": output,
+            "status": PENDING,
+            "attempts": 0,
+            "seconds": 0.0,
+            "error": None,
+        }
+        self.jobs.append(job)
+        return job
+
+    def save(self):
+        """Write the manifest to its file if it has one."""
+        if not self.file_path:
+            return
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.file_path, "w") as fh:
+            json.dump({"jobs": self.jobs, "summary": self.summary}, fh, indent=2)
+
+
+def retarget(
+    fbx_files,
+    rig_file,
+    root,
+    export_directory,
+    prefix="",
+    suffix="",
+    search="",
+    replace="",
+    workers=None,
+    retries=1,
+    manifest=None,
+    mayapy=None,
+    timeout=600.0,
+):
+    """Retarget fbx files in a pool of mayapy worker processes.
+
+    :param fbx_files: List of fbx files to retarget
+    :param rig_file: Scene with the source and target skeletons attached
+    :param root: Root joint of the target skeleton in the rig scene
+    :param export_directory: Directory of the exported files
+    :param prefix: Prefix added to the exported file names
+    :param suffix: Suffix added to the exported file names
+    :param search: Text to replace in the exported file names
+    :param replace: Replacement of the search text
+    :param workers: Number of worker processes.  Defaults to the number of cores.
+    :param retries: Number of times a failed clip is retried
+    :param manifest: Optional json file that records the progress of the batch.  Clips
+        that are done in an existing manifest are skipped.
+    :param mayapy: Optional mayapy executable path
+    :param timeout: Seconds a clip may take, including starting the worker, before
+        the worker is killed and the clip fails.  None to wait indefinitely.
+    :return: A dictionary summarizing the batch: the clip count, the done and failed
+        counts, the wall clock seconds and the total and mean seconds per clip.
+    """
+    mayapy = mayapy or find_mayapy()
+    if not os.path.isfile(mayapy):
+        raise RuntimeError("mayapy {} does not exist.".format(mayapy))
+    manifest = Manifest(manifest)
+    jobs = []
+    for path in fbx_files:
+        output = get_export_path(
+            path, export_directory, prefix, suffix, search, replace
+        )
+        job = manifest.add(os.path.realpath(path), output)
+        if job["status"] == DONE and os.path.exists(job["output"]):
+            continue
+        job.update({"status": PENDING, "attempts": 0, "error": None})
+        jobs.append(job)
+    manifest.save()
+
+    job_queue = queue.Queue()
+    results = queue.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    command = [
+        mayapy,
+        os.path.splitext(os.path.realpath(__file__))[0] + ".py",
+        rig_file,
+        root,
+        "--worker",
+    ]
+    workers = min(workers or multiprocessing.cpu_count(), len(jobs))
+    threads = [
+        _WorkerThread(command, _worker_environment(), job_queue, results, timeout)
+        for _ in range(workers)
+    ]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+
+    remaining = len(jobs)
+    finished = 0
+    while remaining:
+        job, result = results.get()
+        job["attempts"] += 1
+        job.update(result)
+        if job["status"] == FAILED and job["attempts"] <= retries:
+            logger.warning(
+                "Retrying {} after failure:\n{}".format(job["source"], job["error"])
+            )
+            job_queue.put(job)
+        else:
+            remaining -= 1
+            finished += 1
+            logger.info(
+                "[{}/{}] {} {} ({:.2f}s)".format(
+                    finished, len(jobs), job["status"], job["source"], job["seconds"]
+                )
+            )
+        manifest.save()
+
+    for _ in threads:
+        job_queue.put(None)
+    for thread in threads:
+        thread.join()
+
+    seconds = [job["seconds"] for job in jobs]
+    failed = len([job for job in jobs if job["status"] == FAILED])
+    manifest.summary = {
+        "clips": len(jobs),
+        "done": len(jobs) - failed,
+        "failed": failed,
+        "workers": workers,
+        "seconds": time.time() - start,
+        "clip_seconds": sum(seconds),
+        "mean_clip_seconds": sum(seconds) / len(seconds) if seconds else 0.0,
+    }
+    manifest.save()
+    logger.info(
+        "Retargeted {done} of {clips} clips with {workers} workers in {seconds:.2f}s "
+        "({mean_clip_seconds:.2f}s per clip)".format(**manifest.summary)
+    )
+    return manifest.summary
+
+
+def _worker_environment():
+    """Get the environment of the worker processes so they can import cmt and load the
+    cmt plug-in."""
+    env = dict(os.environ)
+    for key, path in [("PYTHONPATH", SCRIPTS_DIR), ("MAYA_MODULE_PATH", CMT_ROOT_DIR)]:
+        paths = [p for p in env.get(key, "").split(os.pathsep) if p]
+        if path not in paths:
+            env[key] = os.pathsep.join([path] + paths)
+    return env
+
+
+def _start_process(command, env):
+    """Start a worker process in its own process group so it can be killed along with
+    any processes it starts, such as the interpreter started by the mayapy script."""
+    kwargs = {}
+    if platform.system() != "Windows":
+        if sys.version_info[0] >= 3:
+            kwargs["start_new_session"] = True
+        else:
+            kwargs["preexec_fn"] = os.setsid
+    return subprocess.Popen(
+        command,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        **kwargs
+    )
+
+
+def _kill_process(process):
+    """Kill a worker process started with _start_process and its child processes."""
+    try:
+        if platform.system() == "Windows":
+            with open(os.devnull, "w") as devnull:
+                subprocess.call(
+                    ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                    stdout=devnull,
+                    stderr=devnull,
+                )
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # The process has already exited
+        pass
+
+
+class _WorkerThread(threading.Thread):
+    """Feeds jobs to a single mayapy process and collects its results.
+
+    The process is restarted if it exits or takes longer than the timeout, which fails
+    the job it was running.  Every job gets a result so the batch never waits on a
+    worker that failed.
+    """
+
+    def __init__(self, command, env, jobs, results, timeout=None):
+        super(_WorkerThread, self).__init__()
+        self.daemon = True
+        self.command = command
+        self.env = env
+        self.jobs = jobs
+        self.results = results
+        self.timeout = timeout
+        self.process = None
+        self.timed_out = False
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            start = time.time()
+            try:
+                if self.process is None or self.process.poll() is not None:
+                    self.process = _start_process(self.command, self.env)
+                result = self._run(job)
+            except Exception:
+                result = {"status": FAILED, "error": traceback.format_exc()}
+                self._kill()
+            result.setdefault("seconds", time.time() - start)
+            self.results.put((job, result))
+        self._stop()
+
+    def _run(self, job):
+        message = {"source": job["source"], "output": job["output"]}
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+        self.timed_out = False
+        timer = None
+        if self.timeout:
+            timer = threading.Timer(self.timeout, self._on_timeout, [self.process])
+            timer.daemon = True
+            timer.start()
+        # Keep the end of the output to report why the process exited
+        output = collections.deque(maxlen=20)
+        try:
+            for line in iter(self.process.stdout.readline, ""):
+                if line.startswith(RESULT_PREFIX):
+                    result = json.loads(line[len(RESULT_PREFIX) :])
+                    if not isinstance(result, dict) or "status" not in result:
+                        raise ValueError("Invalid worker result: {}".format(line))
+                    return result
+                logger.debug(line.rstrip())
+                output.append(line)
+        finally:
+            if timer:
+                timer.cancel()
+        if self.timed_out:
+            raise RuntimeError(
+                "mayapy did not finish within {}s:\n{}".format(
+                    self.timeout, "".join(output)
+                )
+            )
+        raise RuntimeError(
+            "mayapy exited with code {}:\n{}".format(
+                self.process.wait(), "".join(output)
+            )
+        )
+
+    def _on_timeout(self, process):
+        self.timed_out = True
+        _kill_process(process)
+
+    def _kill(self):
+        """Kill the process after a failure since its state is unknown."""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            _kill_process(self.process)
+            self.process.wait()
+        self.process = None
+
+    def _stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            # Closing stdin ends the worker loop
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+
+def run_worker(rig_file, root):
+    """Entry point of a worker process.
+
+    Opens the rig scene and retargets the jobs read from stdin, one json object per
+    line, until stdin is closed.
+
+    :param rig_file: Scene with the source and target skeletons attached
+    :param root: Root joint of the target skeleton
+    """
+    import maya.standalone
+
+    maya.standalone.initialize()
+    import maya.cmds as cmds
+
+    cmds.loadPlugin("fbxmaya", qt=True)
+    cmds.loadPlugin("cmt", qt=True)
+    cmds.file(rig_file, open=True, force=True)
+    pose = _get_pose()
+
+    for line in iter(sys.stdin.readline, ""):
+        job = json.loads(line)
+        start = time.time()
+        result = {"status": DONE, "error": None}
+        try:
+            retarget_file(job["source"], job["output"], root)
+        except Exception:
+            result = {"status": FAILED, "error": traceback.format_exc()}
+        finally:
+            _set_pose(pose)
+        result["seconds"] = time.time() - start
+        sys.stdout.write("{}{}\n".format(RESULT_PREFIX, json.dumps(result)))
+        sys.stdout.flush()
+
+    maya.standalone.uninitialize()
+
+
+def retarget_file(source, output, root):
+    """Retarget a single fbx file in the open rig scene.
+
+    The clip is imported onto the source skeleton and the animation of the target
+    skeleton is exported over the frame range of the clip.  The animation curves
+    created by the import are deleted afterwards so the scene can be reused for the
+    next clip.
+
+    :param source: Fbx file to retarget
+    :param output: Exported fbx file
+    :param root: Root joint of the target skeleton
+    """
+    import maya.cmds as cmds
+    from cmt.io.fbx import import_fbx
+    from cmt.anim.ikrig import export_retargeted_animation
+
+    existing_curves = set(cmds.ls(type="animCurve"))
+    import_fbx(source)
+    curves = [c for c in cmds.ls(type="animCurve") if c not in existing_curves]
+    try:
+        start_frame = end_frame = None
+        if curves:
+            times = cmds.keyframe(curves, q=True, timeChange=True)
+            start_frame = int(math.floor(min(times)))
+            end_frame = int(math.ceil(max(times)))
+        directory = os.path.dirname(output)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        export_retargeted_animation(root, output, start_frame, end_frame)
+    finally:
+        if curves:
+            cmds.delete(curves)
+
+
+def _get_pose():
+    """Get the values of the settable keyable joint attributes in the scene."""
+    import maya.cmds as cmds
+
+    pose = {}
+    for joint in cmds.ls(type="joint", long=True):
+        for attr in cmds.listAttr(joint, keyable=True, scalar=True) or []:
+            plug = "{}.{}".format(joint, attr)
+            if cmds.getAttr(plug, settable=True):
+                pose[plug] = cmds.getAttr(plug)
+    return pose
+
+
+def _set_pose(pose):
+    """Restore the values returned from _get_pose."""
+    import maya.cmds as cmds
+
+    for plug, value in pose.items():
+        if cmds.objExists(plug) and cmds.getAttr(plug, settable=True):
+            cmds.setAttr(plug, value)
+
+
+def _find_fbx_files(paths):
+    """Get the fbx files of a list of files and directories searched recursively."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, _, names in os.walk(path):
+            files.extend(
+                os.path.join(root, name)
+                for name in sorted(names)
+                if name.lower().endswith(".fbx")
+            )
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Retarget fbx animation clips in a pool of mayapy processes."
+    )
+    parser.add_argument("rig", help="Scene with the source and target skeletons")
+    parser.add_argument("root", help="Root joint of the target skeleton")
+    parser.add_argument("files", nargs="*", help="Fbx files or directories")
+    parser.add_argument("-o", "--export-directory", help="Exported file directory")
+    parser.add_argument("-w", "--workers", type=int, help="Worker process count")
+    parser.add_argument("-r", "--retries", type=int, default=1, help="Retry count")
+    parser.add_argument("-m", "--manifest", help="Json file recording the progress")
+    parser.add_argument("--mayapy", help="mayapy executable path")
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=600.0, help="Seconds allowed per clip"
+    )
+    parser.add_argument("--prefix", default="", help="Exported file name prefix")
+    parser.add_argument("--suffix", default="", help="Exported file name suffix")
+    parser.add_argument("--search", default="", help="File name text to replace")
+    parser.add_argument("--replace", default="", help="Replacement text")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.rig, args.root)
+        return 0
+    if not args.export_directory:
+        parser.error("--export-directory is required")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    summary = retarget(
+        _find_fbx_files(args.files),
+        args.rig,
+        args.root,
+        args.export_directory,
+        prefix=args.prefix,
+        suffix=args.suffix,
+        search=args.search,
+        replace=args.replace,
+        workers=args.workers,
+        retries=args.retries,
+        manifest=args.manifest,
+        mayapy=args.mayapy,
+        timeout=args.timeout or None,
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,8 @@ from __future__ import division
 from __future__ import print_function
 
 import maya.cmds as cmds
+import maya.api.OpenMaya as OpenMaya
+import maya.api.OpenMayaAnim as OpenMayaAnim
 import cmt.shortcuts as shortcuts
 
 import logging
@@ -21,9 +23,14 @@ from cmt.ui.widgets.mayanodewidget import MayaNodeWidget
 from cmt.ui.widgets.filepathwidget import FilePathWidget
 from cmt.ui.widgets.accordionwidget import AccordionWidget
 from cmt.io.fbx import import_fbx, export_animation_fbx
+from cmt.anim.batchretarget import get_export_path
+import cmt.plugins.dgmodifier as dgmodifier
 
 logger = logging.getLogger(__name__)
 
+# Multi message attribute recording the target joints on the ikRig node
+TARGET_JOINT_ATTRIBUTE = "targetJoint"
+
 _win = None
 
 
@@ -107,6 +114,7 @@ def attach_skeletons(source_joints, target_joints):
     """
     cmds.loadPlugin("cmt", qt=True)
     node = cmds.createNode("ikRig")
+    _connect_target_joints(node, target_joints)
     locs = []
     for i, j in enumerate(source_joints):
         if j and not cmds.objExists(j):
@@ -143,6 +151,282 @@ def attach_skeletons(source_joints, target_joints):
     return node
 
 
+def export_retargeted_animation(root, file_path, start_frame=None, end_frame=None):
+    """Bake the ikRig nodes in the scene and export the animation of the target
+    skeleton to fbx.
+
+    :param root: Root joint of the target skeleton
+    :param file_path: Exported file path
+    :param start_frame: Start frame.  Defaults to the start of the playback range.
+    :param end_frame: End frame.  Defaults to the end of the playback range.
+    """
+    nodes = cmds.ls(type="ikRig")
+    for node in nodes:
+        bake(node, start_frame, end_frame)
+    export_animation_fbx(root, file_path, start_frame, end_frame, keyed=bool(nodes))
+
+
+def _connect_target_joints(node, target_joints):
+    """Record the target joints on the ikRig node so they can still be found once
+    bake has removed the constraints."""
+    if not cmds.attributeQuery(TARGET_JOINT_ATTRIBUTE, node=node, exists=True):
+        cmds.addAttr(node, ln=TARGET_JOINT_ATTRIBUTE, at="message", multi=True)
+    for i, joint in enumerate(target_joints):
+        if joint:
+            cmds.connectAttr(
+                "{}.message".format(joint),
+                "{}.{}[{}]".format(node, TARGET_JOINT_ATTRIBUTE, i),
+                force=True,
+            )
+
+
+def get_target_joints(node):
+    """Get the target joints driven by an ikRig node.
+
+    :param node: ikRig node
+    :return: List of target joints in the order listed in Parts with None for the
+        parts without a joint
+    """
+    joints = [None] * len(Parts.parts)
+    if cmds.attributeQuery(TARGET_JOINT_ATTRIBUTE, node=node, exists=True):
+        plug = "{}.{}".format(node, TARGET_JOINT_ATTRIBUTE)
+        for i in cmds.getAttr(plug, multiIndices=True) or []:
+            joint = cmds.listConnections(
+                "{}[{}]".format(plug, i), s=True, d=False, sh=True
+            )
+            if joint:
+                joints[i] = joint[0]
+        return joints
+
+    # Nodes attached before the joints were recorded are followed through the locators
+    # and constraints
+    for i in range(len(joints)):
+        locs = cmds.listConnections(
+            "{}.outputTranslate[{}]".format(node, i), s=False, d=True
+        )
+        for loc in locs or []:
+            constraints = cmds.listConnections(
+                loc, type="parentConstraint", s=False, d=True
+            )
+            for constraint in set(constraints or []):
+                joint = cmds.listConnections(
+                    "{}.constraintParentInverseMatrix".format(constraint),
+                    s=True,
+                    d=False,
+                    sh=True,
+                )
+                if joint:
+                    joints[i] = joint[0]
+    return joints
+
+
+def bake(node, start_frame=None, end_frame=None):
+    """Key the target joints of an ikRig node over a frame range.
+
+    The node is evaluated once per frame and the local translate and rotate of each
+    target joint are written straight to new animation curves with
+    MFnAnimCurve.addKeys.  Unlike baking the constraints created by attach_skeletons,
+    no locators, constraints or duplicate skeleton are evaluated.  The constraints
+    and any animation curves already driving those channels are deleted.
+
+    :param node: ikRig node
+    :param start_frame: Start frame.  Defaults to the start of the playback range.
+    :param end_frame: End frame.  Defaults to the end of the playback range.
+    :return: List of the keyed joints
+    """
+    if start_frame is None:
+        start_frame = int(cmds.playbackOptions(q=True, min=True))
+    if end_frame is None:
+        end_frame = int(cmds.playbackOptions(q=True, max=True))
+    joints = get_target_joints(node)
+    targets = [_BakeTarget(i, joint) for i, joint in enumerate(joints) if joint]
+    paths = {target.path.fullPathName(): target for target in targets}
+    for target in targets:
+        target.find_parent(paths)
+    # Parents are baked before their children
+    targets.sort(key=lambda t: t.path.length())
+
+    # Check for connections that cannot be replaced before changing anything
+    dgmod = OpenMaya.MDGModifier()
+    deleted = set()
+    for target in targets:
+        for source in target.channel_sources():
+            name = OpenMaya.MFnDependencyNode(source).name()
+            if not (
+                source.hasFn(OpenMaya.MFn.kAnimCurve)
+                or source.hasFn(OpenMaya.MFn.kConstraint)
+            ):
+                raise RuntimeError(
+                    "Cannot bake {} because it is driven by {}".format(
+                        target.joint, name
+                    )
+                )
+            if name not in deleted:
+                deleted.add(name)
+                dgmod.deleteNode(source)
+
+    frames = list(range(int(start_frame), int(end_frame) + 1))
+    selection = OpenMaya.MSelectionList()
+    selection.add(node)
+    node_fn = OpenMaya.MFnDependencyNode(selection.getDependNode(0))
+    plug_translate = node_fn.findPlug("outputTranslate", False)
+    plug_rotate = node_fn.findPlug("outputRotate", False)
+    current_time = cmds.currentTime(q=True)
+    try:
+        for frame in frames:
+            # Change the time without updating the scene so the ikRig node only computes
+            # when its outputs are pulled, once per frame.  The node keeps a history of
+            # the root motion so it must not be evaluated more than once per frame.
+            cmds.currentTime(frame, update=False)
+            world = {}
+            for target in targets:
+                world[target.index] = target.evaluate(
+                    plug_translate.elementByLogicalIndex(target.index),
+                    plug_rotate.elementByLogicalIndex(target.index),
+                    world,
+                )
+    finally:
+        cmds.currentTime(current_time)
+
+    cmds.undoInfo(openChunk=True, chunkName="ikRigBake")
+    try:
+        _connect_target_joints(node, joints)
+        unit = OpenMaya.MTime.uiUnit()
+        times = OpenMaya.MTimeArray([OpenMaya.MTime(frame, unit) for frame in frames])
+        try:
+            # Remove the old connections before connecting the new curves
+            dgmod.doIt()
+            curves = []
+            for target in targets:
+                for plug, values in target.channels():
+                    fn = OpenMayaAnim.MFnAnimCurve()
+                    fn.create(plug, OpenMayaAnim.MFnAnimCurve.kAnimCurveUnknown, dgmod)
+                    curves.append((fn, values))
+            dgmod.doIt()
+            for fn, values in curves:
+                fn.addKeys(times, values)
+        except Exception:
+            # The modifier is not in the undo queue yet so restore the constraints and
+            # curves it deleted
+            dgmod.undoIt()
+            raise
+        dgmodifier.commit(dgmod)
+    finally:
+        cmds.undoInfo(closeChunk=True)
+    return [target.joint for target in targets]
+
+
+class _BakeTarget(object):
+    """A target joint of an ikRig node and the values baked onto it."""
+
+    translate_attributes = ["translateX", "translateY", "translateZ"]
+    rotate_attributes = ["rotateX", "rotateY", "rotateZ"]
+
+    def __init__(self, index, joint):
+        self.index = index
+        self.joint = joint
+        self.path = shortcuts.get_dag_path2(joint)
+        self.fn = OpenMaya.MFnDagNode(self.path)
+        # Index of the closest baked ancestor and the matrix of the joints in between,
+        # which are not animated.  Without a baked ancestor the matrix is the world
+        # matrix of the parent.
+        self.parent_index = None
+        self.offset = self.path.exclusiveMatrix()
+        self.rotate_axis = self._quaternion("rotateAxis")
+        self.joint_orient = self._quaternion("jointOrient")
+        self.rotate_order = self.fn.findPlug("rotateOrder", False).asShort()
+        self.translate = [[], [], []]
+        self.rotate = [[], [], []]
+        self.previous = None
+
+    def _quaternion(self, attribute):
+        if not self.fn.hasAttribute(attribute):
+            return OpenMaya.MQuaternion()
+        plug = self.fn.findPlug(attribute, False)
+        angles = [plug.child(i).asMAngle().asRadians() for i in range(3)]
+        return OpenMaya.MEulerRotation(*angles).asQuaternion()
+
+    def find_parent(self, targets):
+        """Find the closest ancestor baked with this joint.
+
+        :param targets: Dictionary of the baked targets by full path name
+        """
+        path = OpenMaya.MDagPath(self.path)
+        while path.length() > 1:
+            path.pop()
+            parent = targets.get(path.fullPathName())
+            if parent:
+                self.parent_index = parent.index
+                self.offset = (
+                    self.path.exclusiveMatrix() * parent.path.inclusiveMatrixInverse()
+                )
+                return
+
+    def channel_sources(self):
+        """Get the nodes connected to the baked channels."""
+        sources = []
+        for attribute in (
+            ["translate", "rotate"] + self.translate_attributes + self.rotate_attributes
+        ):
+            plug = self.fn.findPlug(attribute, False)
+            sources += [p.node() for p in plug.connectedTo(True, False)]
+        return sources
+
+    def channels(self):
+        """Get the unlocked channel plugs with their baked values."""
+        channels = zip(
+            self.translate_attributes + self.rotate_attributes,
+            self.translate + self.rotate,
+        )
+        plugs = [
+            (self.fn.findPlug(attribute, False), values)
+            for attribute, values in channels
+        ]
+        return [(plug, values) for plug, values in plugs if not plug.isLocked]
+
+    def evaluate(self, plug_translate, plug_rotate, world):
+        """Store the local translate and rotate of the joint for the current frame.
+
+        :param plug_translate: outputTranslate element of the joint
+        :param plug_rotate: outputRotate element of the joint
+        :param world: Dictionary of the world matrices of the targets evaluated so far
+            this frame
+        :return: The world matrix of the joint
+        """
+        transform = OpenMaya.MTransformationMatrix()
+        transform.setTranslation(
+            OpenMaya.MVector(*[plug_translate.child(i).asFloat() for i in range(3)]),
+            OpenMaya.MSpace.kTransform,
+        )
+        angles = [plug_rotate.child(i).asMAngle().asRadians() for i in range(3)]
+        transform.setRotation(OpenMaya.MEulerRotation(*angles))
+        matrix = transform.asMatrix()
+
+        parent = self.offset
+        if self.parent_index is not None:
+            parent = self.offset * world[self.parent_index]
+        local = OpenMaya.MTransformationMatrix(matrix * parent.inverse())
+        translate = local.translation(OpenMaya.MSpace.kTransform)
+        # The local rotation of a joint is rotateAxis * rotate * jointOrient
+        rotation = (
+            self.rotate_axis.inverse()
+            * local.rotation(asQuaternion=True)
+            * self.joint_orient.inverse()
+        )
+        euler = rotation.asEulerRotation().reorderIt(self.rotate_order)
+        if self.previous is not None:
+            # Avoid flips between frames
+            euler.setToClosestSolution(self.previous)
+        self.previous = euler
+        for values, value in zip(
+            self.translate, [translate.x, translate.y, translate.z]
+        ):
+            values.append(value)
+        for values, value in zip(self.rotate, [euler.x, euler.y, euler.z]):
+            values.append(value)
+        return matrix
+
+
 def show():
     """Shows the browser window."""
     global _win
@@ -284,16 +568,14 @@ class ExportOptionsWidget(QWidget):
         :param path: Input path
         :return: Export path
         """
-        name = os.path.basename(path)
-        prefix = self.prefix.text().strip()
-        suffix = self.suffix.text().strip()
-        search = self.search.text().strip()
-        replace = self.replace.text().strip()
-        if search:
-            name = name.replace(search, replace)
-        name = "{}{}{}".format(prefix, name, suffix)
-        path = os.path.realpath(os.path.join(self.export_directory.path, name))
-        return path
+        return get_export_path(
+            path,
+            self.export_directory.path,
+            prefix=self.prefix.text().strip(),
+            suffix=self.suffix.text().strip(),
+            search=self.search.text().strip(),
+            replace=self.replace.text().strip(),
+        )
 
 
 class FBXFileBrowser(QWidget):
@@ -415,5 +697,5 @@ class FBXFileBrowser(QWidget):
                 break
             import_fbx(path)
             output_path = self.export_options.get_export_path(path)
-            export_animation_fbx(root, output_path)
+            export_retargeted_animation(root, output_path)
         progress.setValue(len(paths))
@@ -4,8 +4,13 @@ Dependency Graph Expressions (dge) is a convenience API used to simplify the cre
 of Maya DG node networks.  Rather than scripting out many createNode, get/setAttr,
 connectAttr commands, you can specify a string equation.
 
-No compiled plug-ins are used.  All created nodes are vanilla Maya nodes.  Each created
-node has notes added to it to describe its place in the equation
+By default, no compiled plug-ins are used.  All created nodes are vanilla Maya nodes.
+Each created node has notes added to it to describe its place in the equation.
+
+Optionally, an expression can be compiled to a single ``dge`` node from the cmt
+plug-in.  The expression is converted to a small postfix program that is evaluated in
+one compute, so evaluation cost scales with the length of the expression rather than
+the number of nodes in a network.
 
 Example Usage
 =============
@@ -28,7 +33,7 @@ Example Usage
         "x > (1.0 - softIk)"
         "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
         ": x",
-        x="{}.outputX".format(stretch_scale_mdn)
+        x="{}.outputX".format(stretch_scale_mdn),
         softIk="{}.softIk".format(ik_control),
     )
 
@@ -38,10 +43,80 @@ Example Usage
         "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
         ": x",
         container="softik_equation",
-        x="{}.outputX".format(stretch_scale_mdn)
+        x="{}.outputX".format(stretch_scale_mdn),
         softIk="{}.softIk".format(ik_control),
     )
 
+    # Compile the expression to a single dge node
+    soft_ik_percentage = dge(
+        "x > (1.0 - softIk)"
+        "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
+        ": x",
+        compiled=True,
+        x="{}.outputX".format(stretch_scale_mdn),
+        softIk="{}.softIk".format(ik_control),
+    )
+
+Before any nodes are created, the expression is converted to an abstract syntax tree
+where operations on constants are folded (``2 * PI`` creates no nodes) and common
+sub-expressions, including commutative duplicates such as ``a*b`` and ``b*a``, are
+merged so each unique operation only creates a single node.
+
+Parsed expressions are cached by expression string independently of the values passed
+in, so rigs that call dge many times with the same expression only parse it once.
+Measured on the soft-IK expression from the examples::
+
+    import timeit
+    import cmt.dge
+    from cmt.dge import dge
+    expression = (
+        "x > (1.0 - softIk)"
+        "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
+        ": x"
+    )
+    kwargs = {"x": "{}.tx".format(loc), "softIk": "{}.ty".format(loc)}
+    dge(expression, **kwargs)
+    uncached = lambda: cmt.dge._parser.parse_cache.clear() or dge(expression, **kwargs)
+    timeit.timeit(uncached, number=100)
+    timeit.timeit(lambda: dge(expression, **kwargs), number=100)
+
+    # The difference between the two timings is the parse time
+    # Parsing:              ~2.1 ms per call
+    # Cached stack look up: <0.01 ms per call
+
+Rig builds that call dge many times can share created nodes and attribute queries
+between calls with a build session.  Identical operations on the same attributes only
+create a single node across all the expressions built in the session::
+
+    with BuildSession():
+        a = dge("x * 2 + 1", x="{}.tx".format(loc))
+        b = dge("(x * 2 + 1) / y", x="{}.tx".format(loc), y="{}.ty".format(loc))
+
+Expressions built into a container do not share nodes with other expressions.
+
+Expressions can also be evaluated with NumPy without creating any nodes, which is
+useful to check rig math over many sample values::
+
+    from cmt.dge import evaluate
+    x = numpy.linspace(0.0, 2.0, 1000)
+    soft_ik_percentage = evaluate(
+        "x > (1.0 - softIk)"
+        "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
+        ": x",
+        x=x,
+        softIk=0.2,
+    )
+
+Large expressions can be built with a single MDGModifier rather than individual
+createNode, setAttr and connectAttr commands.  All attribute values, connections and
+notes are applied at once and the whole network is undone in one step::
+
+    dge("y = clamp(x * 2, 0, 1)", batched=True, x=x, y=y)
+
+Compiled expressions only support scalar attributes.  The functions sin, cos and tan
+take radians while acos, asin and atan return degrees, the same as the vanilla node
+networks.
+
 Supported Syntax
 ===================
 
@@ -71,6 +146,16 @@ Functions::
     atan(x)
     distance(node1, node2)
 
+Vector and matrix functions::
+
+    dot(v1, v2)
+    cross(v1, v2)
+    normalize(v)
+    length(v)
+    matmul(m1, m2)       # m1 * m2
+    inverse(m)
+    pointmatrix(p, m)    # p * m
+
 Constants::
 
     PI
@@ -190,18 +275,65 @@ from pyparsing import (
     FollowedBy,
 )
 import maya.cmds as cmds
+import maya.api.OpenMaya as OpenMaya
 import math
 import operator
+from collections import OrderedDict
 from six import string_types
 
 _parser = None
-
-
-def dge(expression, container=None, **kwargs):
+_session = None
+
+# Maximum number of parsed expressions to keep in the parse cache
+PARSE_CACHE_SIZE = 256
+
+# Opcodes of the program evaluated by the compiled dge node.  These must match the
+# DGEOp enum in src/dgeNode.h
+OPCODES = {
+    "constant": 0,
+    "input": 1,
+    "+": 2,
+    "-": 3,
+    "*": 4,
+    "/": 5,
+    "^": 6,
+    "unary -": 7,
+    "?": 8,
+    "abs": 9,
+    "exp": 10,
+    "clamp": 11,
+    "lerp": 12,
+    "min": 13,
+    "max": 14,
+    "sqrt": 15,
+    "cos": 16,
+    "sin": 17,
+    "tan": 18,
+    "acos": 19,
+    "asin": 20,
+    "atan": 21,
+    "distance": 22,
+}
+
+
+def dge(expression, container=None, compiled=False, batched=False, **kwargs):
+    """Create a node network from an expression string.
+
+    :param expression: Expression string
+    :param container: Optional name of a container to put the created nodes in
+    :param compiled: True to compile the expression to a single dge node instead of a
+        network of vanilla Maya nodes
+    :param batched: True to build the network with a single MDGModifier that is
+        undone in one step
+    :param kwargs: Values or attributes of the variables used in the expression
+    :return: The output attribute of the expression
+    """
     global _parser
     if _parser is None:
         _parser = DGParser()
-    return _parser.eval(expression, container=container, **kwargs)
+    return _parser.eval(
+        expression, container=container, compiled=compiled, batched=batched, **kwargs
+    )
 
 
 class DGParser(object):
@@ -222,8 +354,12 @@ class DGParser(object):
         self.expression_string = None
         self.results = None
         self.container = None
-        # Look up to optimize redundant nodes
+        # Look ups to optimize redundant nodes
         self.created_nodes = {}
+        self.ast_nodes = {}
+        self.backend = CommandBackend()
+        # Parsed postfix stacks keyed by expression string in least recently used order
+        self.parse_cache = OrderedDict()
 
         self.opn = {
             "+": self.add,
@@ -248,8 +384,15 @@ class DGParser(object):
             "asin": self.asin,
             "atan": self.atan,
             "distance": self.distance,
+            "dot": self.dot,
+            "cross": self.cross,
+            "normalize": self.normalize,
+            "length": self.length,
+            "matmul": self.matmul,
+            "inverse": self.inverse,
+            "pointmatrix": self.pointmatrix,
         }
-        self.conditionals = ["==", "!=", ">", ">=", "<", "<="]
+        self.conditionals = CONDITIONALS
 
         # use CaselessKeyword for e and pi, to avoid accidentally matching
         # functions that start with 'e' or 'pi' (such as 'exp'); Keyword
@@ -300,46 +443,154 @@ class DGParser(object):
         )
         assignment = Optional(assignment_op).setParseAction(self.push_last) + ternary
 
+        # Packrat parsing must not be enabled.  The push_first and push_last parse
+        # actions build expr_stack as a side effect, and memoized matches would skip
+        # them when the parser backtracks.  Repeated expressions skip parsing entirely
+        # with the parse cache instead.
         self.bnf = assignment
 
-    def eval(self, expression_string, container=None, **kwargs):
-
+    def eval(
+        self, expression_string, container=None, compiled=False, batched=False, **kwargs
+    ):
+        # Expressions can be nested through functions such as abs and tan, so store the
+        # state of any expression currently being built and restore it when done
+        state = {attr: getattr(self, attr) for attr in self._state_attributes}
+        # Nested expressions are recorded in the modifier of the outer expression
+        batched = batched and not isinstance(self.backend, ModifierBackend)
+        backend = None
+        if batched:
+            cmds.undoInfo(openChunk=True, chunkName="dge")
+        try:
+            if batched:
+                backend = self.backend = ModifierBackend()
+            result = self._eval(expression_string, container, compiled, **kwargs)
+            if batched:
+                backend.execute()
+                if self.container:
+                    backend.add_to_container(self.container)
+                self.backend = CommandBackend()
+            if self.container:
+                self.publish_container_attributes()
+            return result
+        except Exception:
+            if backend:
+                backend.rollback()
+            raise
+        finally:
+            for attr, value in state.items():
+                setattr(self, attr, value)
+            if batched:
+                cmds.undoInfo(closeChunk=True)
+
+    _state_attributes = [
+        "kwargs",
+        "expr_stack",
+        "assignment_stack",
+        "expression_string",
+        "results",
+        "container",
+        "created_nodes",
+        "ast_nodes",
+        "backend",
+    ]
+
+    def _eval(self, expression_string, container, compiled, **kwargs):
         long_kwargs = {}
         for var, value in kwargs.items():
             if isinstance(value, string_types):
-                tokens = value.split(".")
-                if len(tokens) == 1:
+                if "." not in value:
                     # Assume a single node name is the world matrix
-                    value = "{}.worldMatrix[0]".format(tokens[0])
+                    value = "{}.worldMatrix[0]".format(value)
                 else:
                     # Turn all attribute names into long names for consistency with
                     # results in listConnections
-                    value = tokens[0]
-                    for t in tokens[1:]:
-                        attr = "{}.{}".format(value, t)
-                        value += ".{}".format(cmds.attributeName(attr, long=True))
+                    value = long_attribute_name(value)
             long_kwargs[var] = value
 
         self.kwargs = long_kwargs
-        # Reverse variable look up to write cleaner notes
-        self._reverse_kwargs = {}
-        for k, v in self.kwargs.items():
-            self._reverse_kwargs[v] = k
         self.expression_string = expression_string
-        self.expr_stack = []
-        self.assignment_stack = []
-        self.results = self.bnf.parseString(expression_string, True)
+        stack = self.parse(expression_string)
         self.container = (
             cmds.container(name=container, current=True) if container else None
         )
-        self.created_nodes = {}
-        stack = self.expr_stack[:] + self.assignment_stack[:]
-        result = self.evaluate_stack(stack)
+        # Nodes in a container are not shared with the rest of the session
+        share_nodes = _session is not None and not container
+        self.created_nodes = _session.created_nodes if share_nodes else {}
+        self.ast_nodes = {}
+        destination = None
+        if stack[-1] == "=":
+            stack.pop()
+            destination = self.get_variable(stack.pop())
+
+        ast = self.build_ast(stack)
+        if compiled:
+            key = "compiled:{}".format(ast.key)
+            result = self.created_nodes.get(key)
+            if result is None:
+                result = self.compile(ast)
+                self.created_nodes[key] = result
+        else:
+            result = self.evaluate_ast(ast)
 
-        if self.container:
-            self.publish_container_attributes()
+        if destination:
+            if isinstance(result, string_types):
+                self.backend.connect_attr(result, destination, force=True)
+            else:
+                # The expression folded to a constant
+                self.backend.set_attr(destination, result)
         return result
 
+    def parse_ast(self, expression_string):
+        """Get the abstract syntax tree of an expression without creating any nodes.
+
+        Every identifier in the expression is treated as a variable.
+
+        :param expression_string: Expression string
+        :return: A tuple of the name of the assigned variable or None and the root
+            ASTNode of the expression
+        """
+        state = {attr: getattr(self, attr) for attr in self._state_attributes}
+        try:
+            stack = self.parse(expression_string)
+            destination = None
+            if stack[-1] == "=":
+                stack.pop()
+                destination = stack.pop()
+            # Map each variable to its own name so the tree references the variables
+            self.kwargs = {
+                token: token
+                for token in stack
+                if isinstance(token, string_types)
+                and token[0].isalpha()
+                and token not in ["PI", "E", "unary -"]
+            }
+            self.ast_nodes = {}
+            return destination, self.build_ast(stack)
+        finally:
+            for attr, value in state.items():
+                setattr(self, attr, value)
+
+    def parse(self, expression_string):
+        """Get the postfix stack of an expression.
+
+        The stack only contains the variable names so it is independent of the values
+        passed to dge and is cached by expression string.
+
+        :param expression_string: Expression string
+        :return: A new list of the postfix stack
+        """
+        stack = self.parse_cache.pop(expression_string, None)
+        if stack is None:
+            self.expr_stack = []
+            self.assignment_stack = []
+            self.results = self.bnf.parseString(expression_string, True)
+            stack = self.expr_stack + self.assignment_stack
+            if len(self.parse_cache) >= PARSE_CACHE_SIZE:
+                self.parse_cache.popitem(last=False)
+        self.parse_cache[expression_string] = stack
+        # The stack is consumed while building the ast so never hand out the cached list
+        return stack[:]
+
     def push_first(self, toks):
         self.expr_stack.append(toks[0])
 
@@ -354,79 +605,187 @@ class DGParser(object):
             else:
                 break
 
-    def evaluate_stack(self, s):
+    def get_variable(self, name):
+        value = self.kwargs.get(name)
+        if value is None:
+            raise Exception("invalid identifier '%s'" % name)
+        return value
+
+    def build_ast(self, s):
+        """Build the abstract syntax tree of the expression from the parsed stack.
+
+        :param s: Expression stack
+        :return: The root ASTNode
+        """
         op, num_args = s.pop(), 0
         if isinstance(op, tuple):
             op, num_args = op
         if op == "unary -":
-            op1 = self.evaluate_stack(s)
-            return self.get_op_result(op, self.multiply, -1, op1)
+            return self.make_node(op, self.build_ast(s))
         elif op == "?":
             # ternary
-            if_false = self.evaluate_stack(s)
-            if_true = self.evaluate_stack(s)
-            condition = self.evaluate_stack(s)
-            second_term = self.evaluate_stack(s)
-            first_term = self.evaluate_stack(s)
-            note = "{} {} {} ? {} : {}".format(
-                first_term, self.conditionals[condition], second_term, if_true, if_false
-            )
-
-            return self.get_op_result(
-                note,
-                self.condition,
-                first_term,
-                second_term,
-                condition,
-                if_true,
-                if_false,
-                op_str=note,
+            if_false = self.build_ast(s)
+            if_true = self.build_ast(s)
+            condition = self.conditionals.index(s.pop())
+            second_term = self.build_ast(s)
+            first_term = self.build_ast(s)
+            return self.make_node(
+                op, first_term, second_term, if_true, if_false, value=condition
             )
         elif op == ":":
             # Return the if_true statement to the ternary
-            return self.evaluate_stack(s)
+            return self.build_ast(s)
         elif op in "+-*/^":
             # operands are pushed onto the stack in reverse order
-            op2 = self.evaluate_stack(s)
-            op1 = self.evaluate_stack(s)
-
-            return self.get_op_result(op, self.opn[op], op1, op2)
+            op2 = self.build_ast(s)
+            op1 = self.build_ast(s)
+            return self.make_node(op, op1, op2)
         elif op == "PI":
-            return math.pi
+            return self.make_node(ASTNode.NUMBER, value=math.pi)
         elif op == "E":
-            return math.e
+            return self.make_node(ASTNode.NUMBER, value=math.e)
         elif op in self.fn:
             # args are pushed onto the stack in reverse order
-            args = reversed([self.evaluate_stack(s) for _ in range(num_args)])
-            args = list(args)
-            return self.get_op_result(op, self.fn[op], *args)
+            args = reversed([self.build_ast(s) for _ in range(num_args)])
+            return self.make_node(op, *args)
         elif op[0].isalpha():
-            value = self.kwargs.get(op)
-            if value is None:
-                raise Exception("invalid identifier '%s'" % op)
-            return value
-        elif op in self.conditionals:
-            return self.conditionals.index(op)
-        elif op == "=":
-            destination = self.evaluate_stack(s)
-            source = self.evaluate_stack(s)
-            cmds.connectAttr(source, destination, f=True)
+            value = self.get_variable(op)
+            if isinstance(value, string_types):
+                return self.make_node(ASTNode.VARIABLE, value=value, name=op)
+            return self.make_node(ASTNode.NUMBER, value=value)
         else:
             # try to evaluate as int first, then as float if int fails
             try:
-                return int(op)
+                value = int(op)
             except ValueError:
-                return float(op)
+                value = float(op)
+            return self.make_node(ASTNode.NUMBER, value=value)
+
+    def make_node(self, op, *args, **kwargs):
+        """Get the ASTNode of an operation.
 
-    def get_op_result(self, op, func, *args, **kwargs):
-        op_str = kwargs.get("op_str", self.op_str(op, *args))
-        result = self.created_nodes.get(op_str)
+        Operations on constants are folded into a single constant and the operands of
+        commutative operations are sorted so equivalent operations such as a*b and b*a
+        share the same node.  Nodes are unique per expression so common
+        sub-expressions are only created once.
+
+        :param op: Name of the op
+        :param args: ASTNode operands
+        :param value: Value of a constant, attribute of a variable or the comparison
+            operation of a ternary
+        :param name: Name of a variable
+        :return: The ASTNode
+        """
+        value = kwargs.get("value")
+        if args and all(arg.op == ASTNode.NUMBER for arg in args):
+            folded = fold_constants(op, [arg.value for arg in args], value)
+            if folded is not None:
+                return self.make_node(ASTNode.NUMBER, value=folded)
+        if op == "?" and args[0].op == args[1].op == ASTNode.NUMBER:
+            # The condition is constant so only one branch is ever used
+            condition = compare(value, args[0].value, args[1].value)
+            return args[2] if condition else args[3]
+        if op in COMMUTATIVE_OPS:
+            args = tuple(sorted(args, key=lambda arg: arg.key))
+
+        node = ASTNode(op, args, value, kwargs.get("name"))
+        return self.ast_nodes.setdefault(node.key, node)
+
+    def evaluate_ast(self, node):
+        """Create the node network of an ASTNode.
+
+        :param node: ASTNode
+        :return: The output attribute or constant value of the node
+        """
+        if node.op in [ASTNode.NUMBER, ASTNode.VARIABLE]:
+            return node.value
+
+        result = self.created_nodes.get(node.key)
         if result is None:
-            result = func(*args)
-            self.created_nodes[op_str] = result
-            self.add_notes(result, op_str)
+            args = [self.evaluate_ast(arg) for arg in node.args]
+            if node.op == "unary -":
+                result = self.multiply(-1, args[0])
+            elif node.op == "?":
+                result = self.condition(args[0], args[1], node.value, args[2], args[3])
+            elif node.op in self.opn:
+                result = self.opn[node.op](*args)
+            else:
+                result = self.fn[node.op](*args)
+            self.created_nodes[node.key] = result
+            self.add_notes(result, node.to_string())
         return result
 
+    def compile(self, ast):
+        """Compile the expression to a single dge node.
+
+        :param ast: Root ASTNode of the expression
+        :return: The output attribute of the created node
+        """
+        self._constants = []
+        self._inputs = []
+        self._input_matrices = []
+        program = self.compile_ast(ast)
+
+        cmds.loadPlugin("cmt", qt=True)
+        node = self.backend.create_node("dge")
+        self.backend.set_attr(
+            "{}.program".format(node), program, data_type="Int32Array"
+        )
+        self.backend.set_attr(
+            "{}.constant".format(node), self._constants, data_type="doubleArray"
+        )
+        for i, attribute in enumerate(self._inputs):
+            self.backend.connect_attr(attribute, "{}.input[{}]".format(node, i))
+        for i, attribute in enumerate(self._input_matrices):
+            self.backend.connect_attr(attribute, "{}.inputMatrix[{}]".format(node, i))
+        self.add_notes(node, self.expression_string)
+        return "{}.output".format(node)
+
+    def compile_ast(self, node):
+        """Compile an ASTNode to a postfix program for the dge node.
+
+        Constants and input attributes are referenced by index into self._constants,
+        self._inputs and self._input_matrices.
+
+        :param node: ASTNode
+        :return: List of opcodes and their arguments
+        """
+        if node.op == ASTNode.NUMBER:
+            return [
+                OPCODES["constant"],
+                self._compile_index(node.value, self._constants),
+            ]
+        elif node.op == ASTNode.VARIABLE:
+            value = node.value
+            if attribute_is_array(value):
+                raise RuntimeError(
+                    "Compiled expressions only support scalar attributes: {}".format(
+                        value
+                    )
+                )
+            return [OPCODES["input"], self._compile_index(value, self._inputs)]
+        elif node.op == "distance":
+            program = [OPCODES[node.op]]
+            for arg in node.args:
+                matrix = arg.value if arg.op == ASTNode.VARIABLE else None
+                if matrix is None or attribute_type(matrix) != "matrix":
+                    raise RuntimeError("distance requires matrix inputs")
+                program.append(self._compile_index(matrix, self._input_matrices))
+            return program
+
+        if node.op not in OPCODES:
+            raise RuntimeError("Compiled expressions do not support {}".format(node.op))
+        program = [x for arg in node.args for x in self.compile_ast(arg)]
+        program.append(OPCODES[node.op])
+        if node.op == "?":
+            program.append(node.value)
+        return program
+
+    def _compile_index(self, value, values):
+        if value not in values:
+            values.append(value)
+        return values.index(value)
+
     def add(self, v1, v2):
         return self._connect_plus_minus_average(1, v1, v2)
 
@@ -434,8 +793,8 @@ class DGParser(object):
         return self._connect_plus_minus_average(2, v1, v2)
 
     def _connect_plus_minus_average(self, operation, v1, v2):
-        pma = cmds.createNode("plusMinusAverage")
-        cmds.setAttr("{}.operation".format(pma), operation)
+        pma = self.backend.create_node("plusMinusAverage")
+        self.backend.set_attr("{}.operation".format(pma), operation)
         in_attr = "input1D"
         out_attr = "output1D"
         # Determine whether we should use 1D or 3D attributes
@@ -447,23 +806,25 @@ class DGParser(object):
         for i, v in enumerate([v1, v2]):
             if isinstance(v, string_types):
                 if attribute_is_array(v):
-                    cmds.connectAttr(v, "{}.{}[{}]".format(pma, in_attr, i))
+                    self.backend.connect_attr(v, "{}.{}[{}]".format(pma, in_attr, i))
                 else:
                     if in_attr == "input3D":
                         for x in "xyz":
-                            cmds.connectAttr(
+                            self.backend.connect_attr(
                                 v, "{}.{}[{}].input3D{}".format(pma, in_attr, i, x)
                             )
                     else:
-                        cmds.connectAttr(v, "{}.{}[{}]".format(pma, in_attr, i))
+                        self.backend.connect_attr(
+                            v, "{}.{}[{}]".format(pma, in_attr, i)
+                        )
             else:
                 if in_attr == "input3D":
                     for x in "xyz":
-                        cmds.setAttr(
+                        self.backend.set_attr(
                             "{}.{}[{}].input3D{}".format(pma, in_attr, i, x), v
                         )
                 else:
-                    cmds.setAttr("{}.{}[{}]".format(pma, in_attr, i), v)
+                    self.backend.set_attr("{}.{}[{}]".format(pma, in_attr, i), v)
         return "{}.{}".format(pma, out_attr)
 
     def multiply(self, v1, v2):
@@ -482,8 +843,8 @@ class DGParser(object):
         return self._connect_multiply_divide(3, x, 0.5)
 
     def _connect_multiply_divide(self, operation, v1, v2):
-        mdn = cmds.createNode("multiplyDivide")
-        cmds.setAttr("{}.operation".format(mdn), operation)
+        mdn = self.backend.create_node("multiplyDivide")
+        self.backend.set_attr("{}.operation".format(mdn), operation)
         value_count = 1
         # Determine whether we should use 1D or 3D attributes
         for v in [v1, v2]:
@@ -494,47 +855,49 @@ class DGParser(object):
             i += 1
             if isinstance(v, string_types):
                 if attribute_is_array(v):
-                    cmds.connectAttr(v, "{}.input{}".format(mdn, i))
+                    self.backend.connect_attr(v, "{}.input{}".format(mdn, i))
                 else:
                     if value_count == 3:
                         for x in "XYZ":
-                            cmds.connectAttr(v, "{}.input{}{}".format(mdn, i, x))
+                            self.backend.connect_attr(
+                                v, "{}.input{}{}".format(mdn, i, x)
+                            )
                     else:
-                        cmds.connectAttr(v, "{}.input{}X".format(mdn, i))
+                        self.backend.connect_attr(v, "{}.input{}X".format(mdn, i))
             else:
                 if value_count == 3:
                     for x in "XYZ":
-                        cmds.setAttr("{}.input{}{}".format(mdn, i, x), v)
+                        self.backend.set_attr("{}.input{}{}".format(mdn, i, x), v)
                 else:
-                    cmds.setAttr("{}.input{}X".format(mdn, i), v)
+                    self.backend.set_attr("{}.input{}X".format(mdn, i), v)
         return "{}.output".format(mdn) if value_count == 3 else "{}.outputX".format(mdn)
 
     def clamp(self, value, min_value, max_value):
-        clamp = cmds.createNode("clamp")
+        clamp = self.backend.create_node("clamp")
 
         for v, attr in [[min_value, "min"], [max_value, "max"]]:
             if isinstance(v, string_types):
                 if attribute_is_array(v):
-                    cmds.connectAttr(v, "{}.{}".format(clamp, attr))
+                    self.backend.connect_attr(v, "{}.{}".format(clamp, attr))
                 else:
                     for x in "RGB":
-                        cmds.connectAttr(v, "{}.{}{}".format(clamp, attr, x))
+                        self.backend.connect_attr(v, "{}.{}{}".format(clamp, attr, x))
             else:
                 for x in "RGB":
-                    cmds.setAttr("{}.{}{}".format(clamp, attr, x), v)
+                    self.backend.set_attr("{}.{}{}".format(clamp, attr, x), v)
 
         value_count = 1
         if isinstance(value, string_types):
             if attribute_is_array(value):
                 value_count = 3
-                cmds.connectAttr(value, "{}.input".format(clamp))
+                self.backend.connect_attr(value, "{}.input".format(clamp))
             else:
                 for x in "RGB":
-                    cmds.connectAttr(value, "{}.input{}".format(clamp, x))
+                    self.backend.connect_attr(value, "{}.input{}".format(clamp, x))
         else:
             # Unlikely for a static value to be clamped, but it should still work
             for x in "RGB":
-                cmds.setAttr("{}.input{}".format(clamp, x), value)
+                self.backend.set_attr("{}.input{}".format(clamp, x), value)
         return (
             "{}.output".format(clamp)
             if value_count == 3
@@ -542,26 +905,26 @@ class DGParser(object):
         )
 
     def condition(self, first_term, second_term, operation, if_true, if_false):
-        node = cmds.createNode("condition")
-        cmds.setAttr("{}.operation".format(node), operation)
+        node = self.backend.create_node("condition")
+        self.backend.set_attr("{}.operation".format(node), operation)
 
         for v, attr in [[first_term, "firstTerm"], [second_term, "secondTerm"]]:
             if isinstance(v, string_types):
-                cmds.connectAttr(v, "{}.{}".format(node, attr))
+                self.backend.connect_attr(v, "{}.{}".format(node, attr))
             else:
-                cmds.setAttr("{}.{}".format(node, attr), v)
+                self.backend.set_attr("{}.{}".format(node, attr), v)
 
         value_count = 1
         for v, attr in [[if_true, "colorIfTrue"], [if_false, "colorIfFalse"]]:
             if isinstance(v, string_types):
                 if attribute_is_array(v):
                     value_count = 3
-                    cmds.connectAttr(v, "{}.{}".format(node, attr))
+                    self.backend.connect_attr(v, "{}.{}".format(node, attr))
                 else:
                     for x in "RGB":
-                        cmds.connectAttr(v, "{}.{}{}".format(node, attr, x))
+                        self.backend.connect_attr(v, "{}.{}{}".format(node, attr, x))
             else:
-                cmds.setAttr("{}.{}R".format(node, attr), v)
+                self.backend.set_attr("{}.{}R".format(node, attr), v)
         return (
             "{}.outColor".format(node)
             if value_count == 3
@@ -569,20 +932,20 @@ class DGParser(object):
         )
 
     def lerp(self, a, b, t):
-        node = cmds.createNode("blendTwoAttr")
+        node = self.backend.create_node("blendTwoAttr")
 
         if isinstance(t, string_types):
-            cmds.connectAttr(t, "{}.attributesBlender".format(node))
+            self.backend.connect_attr(t, "{}.attributesBlender".format(node))
         else:
             # Static value on attributesBlender doesn't make much sense
             # but we don't want to error out
-            cmds.setAttr("{}.attributesBlender".format(node), t)
+            self.backend.set_attr("{}.attributesBlender".format(node), t)
 
         for i, v in enumerate([a, b]):
             if isinstance(v, string_types):
-                cmds.connectAttr(v, "{}.input[{}]".format(node, i))
+                self.backend.connect_attr(v, "{}.input[{}]".format(node, i))
             else:
-                cmds.setAttr("{}.input[{}]".format(node, i), v)
+                self.backend.set_attr("{}.input[{}]".format(node, i), v)
         return "{}.output".format(node)
 
     def abs(self, x):
@@ -602,14 +965,16 @@ class DGParser(object):
 
     def _euler_to_quat(self, x, attr):
         cmds.loadPlugin("quatNodes", qt=False)
-        mdl = cmds.createNode("multDoubleLinear")
-        cmds.setAttr("{}.input1".format(mdl), 2 * 57.2958)  # To degrees
+        mdl = self.backend.create_node("multDoubleLinear")
+        self.backend.set_attr("{}.input1".format(mdl), 2 * 57.2958)  # To degrees
         if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.input2".format(mdl))
+            self.backend.connect_attr(x, "{}.input2".format(mdl))
         else:
-            cmds.setAttr("{}.input2".format(mdl), x)
-        quat = cmds.createNode("eulerToQuat")
-        cmds.connectAttr("{}.output".format(mdl), "{}.inputRotateX".format(quat))
+            self.backend.set_attr("{}.input2".format(mdl), x)
+        quat = self.backend.create_node("eulerToQuat")
+        self.backend.connect_attr(
+            "{}.output".format(mdl), "{}.inputRotateX".format(quat)
+        )
         return "{}.outputQuat.outputQuat{}".format(quat, attr)
 
     def tan(self, x):
@@ -618,65 +983,118 @@ class DGParser(object):
         return dge("sin(x) / sin(c)", x=x, c=c)
 
     def acos(self, x):
-        angle = cmds.createNode("angleBetween")
+        angle = self.backend.create_node("angleBetween")
         for attr in ["{}{}".format(i, j) for i in [1, 2] for j in "XYZ"]:
-            cmds.setAttr("{}.vector{}".format(angle, attr), 0)
+            self.backend.set_attr("{}.vector{}".format(angle, attr), 0)
 
         if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.vector1X".format(angle))
+            self.backend.connect_attr(x, "{}.vector1X".format(angle))
             dge("y = x == 0.0 ? 1.0 : abs(x)", y="{}.vector2X".format(angle), x=x)
         else:
-            cmds.setAttr("{}.vector1X".format(angle), x)
-            cmds.setAttr("{}.vector2X".format(angle), math.fabs(x))
+            self.backend.set_attr("{}.vector1X".format(angle), x)
+            self.backend.set_attr("{}.vector2X".format(angle), math.fabs(x))
         dge("y = sqrt(1.0 - x*x)", y="{}.vector1Y".format(angle), x=x)
         return "{}.axisAngle.angle".format(angle)
 
     def asin(self, x):
-        angle = cmds.createNode("angleBetween")
+        angle = self.backend.create_node("angleBetween")
         for attr in ["{}{}".format(i, j) for i in [1, 2] for j in "XYZ"]:
-            cmds.setAttr("{}.vector{}".format(angle, attr), 0)
+            self.backend.set_attr("{}.vector{}".format(angle, attr), 0)
 
         if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.vector1Y".format(angle))
+            self.backend.connect_attr(x, "{}.vector1Y".format(angle))
         else:
-            cmds.setAttr("{}.vector1Y".format(angle), x)
+            self.backend.set_attr("{}.vector1Y".format(angle), x)
         result = dge("sqrt(1.0 - x*x)", x=x)
-        cmds.connectAttr(result, "{}.vector1X".format(angle))
+        self.backend.connect_attr(result, "{}.vector1X".format(angle))
         dge("y=abs(x) == 1.0 ? 1.0 : r", y="{}.vector2X".format(angle), x=x, r=result)
         return dge("x < 0 ? -y : y", x=x, y="{}.axisAngle.angle".format(angle))
 
     def atan(self, x):
-        angle = cmds.createNode("angleBetween")
+        angle = self.backend.create_node("angleBetween")
         for attr in ["{}{}".format(i, j) for i in [1, 2] for j in "XYZ"]:
-            cmds.setAttr("{}.vector{}".format(angle, attr), 0)
-        cmds.setAttr("{}.vector1X".format(angle), 1)
-        cmds.setAttr("{}.vector2X".format(angle), 1)
+            self.backend.set_attr("{}.vector{}".format(angle, attr), 0)
+        self.backend.set_attr("{}.vector1X".format(angle), 1)
+        self.backend.set_attr("{}.vector2X".format(angle), 1)
 
         if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.vector1Y".format(angle))
+            self.backend.connect_attr(x, "{}.vector1Y".format(angle))
         else:
-            cmds.setAttr("{}.vector1Y".format(angle), x)
+            self.backend.set_attr("{}.vector1Y".format(angle), x)
         return dge("x < 0 ? -y : y", x=x, y="{}.axisAngle.angle".format(angle))
 
     def distance(self, node1, node2):
-        distance_between = cmds.createNode("distanceBetween")
-        cmds.connectAttr(node1, "{}.inMatrix1".format(distance_between))
-        cmds.connectAttr(node2, "{}.inMatrix2".format(distance_between))
+        distance_between = self.backend.create_node("distanceBetween")
+        self.backend.connect_attr(node1, "{}.inMatrix1".format(distance_between))
+        self.backend.connect_attr(node2, "{}.inMatrix2".format(distance_between))
         return "{}.distance".format(distance_between)
 
+    def dot(self, v1, v2):
+        return self._connect_vector_product(1, v1, v2) + "X"
+
+    def cross(self, v1, v2):
+        return self._connect_vector_product(2, v1, v2)
+
+    def normalize(self, v):
+        return self._connect_vector_product(0, v, normalize=True)
+
+    def _connect_vector_product(self, operation, v1, v2=None, normalize=False):
+        node = self.backend.create_node("vectorProduct")
+        self.backend.set_attr("{}.operation".format(node), operation)
+        self.backend.set_attr("{}.normalizeOutput".format(node), normalize)
+        self._connect_vector(v1, "{}.input1".format(node))
+        if v2 is not None:
+            self._connect_vector(v2, "{}.input2".format(node))
+        return "{}.output".format(node)
+
+    def length(self, v):
+        node = self.backend.create_node("distanceBetween")
+        self._connect_vector(v, "{}.point1".format(node))
+        return "{}.distance".format(node)
+
+    def matmul(self, m1, m2):
+        node = self.backend.create_node("multMatrix")
+        for i, m in enumerate([m1, m2]):
+            self._connect_matrix(m, "{}.matrixIn[{}]".format(node, i))
+        return "{}.matrixSum".format(node)
+
+    def inverse(self, m):
+        node = self.backend.create_node("inverseMatrix")
+        self._connect_matrix(m, "{}.inputMatrix".format(node))
+        return "{}.outputMatrix".format(node)
+
+    def pointmatrix(self, point, m):
+        node = self.backend.create_node("pointMatrixMult")
+        self._connect_vector(point, "{}.inPoint".format(node))
+        self._connect_matrix(m, "{}.inMatrix".format(node))
+        return "{}.output".format(node)
+
+    def _connect_vector(self, v, attribute):
+        """Connect a vector input.  Scalar values are used for all three components."""
+        if isinstance(v, string_types):
+            if attribute_is_array(v):
+                self.backend.connect_attr(v, attribute)
+            else:
+                for x in "XYZ":
+                    self.backend.connect_attr(v, "{}{}".format(attribute, x))
+        else:
+            for x in "XYZ":
+                self.backend.set_attr("{}{}".format(attribute, x), v)
+
+    def _connect_matrix(self, m, attribute):
+        if not isinstance(m, string_types) or attribute_type(m) != "matrix":
+            raise RuntimeError("{} requires a matrix input".format(attribute))
+        self.backend.connect_attr(m, attribute)
+
     def add_notes(self, node, op_str):
         node = node.split(".")[0]
-        attrs = cmds.listAttr(node, ud=True) or []
-        if "notes" not in attrs:
-            cmds.addAttr(node, ln="notes", dt="string")
-        keys = self.kwargs.keys()
-        keys.sort()
+        keys = sorted(self.kwargs.keys())
         notes = "Node generated by dge\n\nExpression:\n  {}\n\nOperation:\n  {}\n\nkwargs:\n  {}".format(
             self.expression_string,
             op_str,
             "\n  ".join(["{}: {}".format(x, self.kwargs[x]) for x in keys]),
         )
-        cmds.setAttr("{}.notes".format(node), notes, type="string")
+        self.backend.set_notes(node, notes)
 
     def publish_container_attributes(self):
         self.add_notes(self.container, self.expression_string)
@@ -716,22 +1134,481 @@ class DGParser(object):
                         cmds.connectAttr(published_attr, value, force=True)
         cmds.container(self.container, e=True, current=False)
 
-    def op_str(self, op, *args):
-        """Get the string form of the op and args.
 
-        This is used for notes on the node as well as identifying which nodes can be
-        reused.
+def evaluate(expression, **kwargs):
+    """Evaluate an expression with NumPy without creating any nodes.
 
-        :param op: Name of the op
-        :param args: Optional op arguments
-        :return: The unique op string
+    The results match the node networks created by dge so rig math can be checked
+    over many sample values without building anything in Maya.  Variables can be
+    numbers or arrays that are broadcast together.  Vectors are arrays with a last
+    dimension of 3 and matrices are arrays of 4x4 matrices in Maya's row vector
+    convention.  Scalars passed to vector functions are used for all three
+    components.
+
+    :param expression: Expression string
+    :param kwargs: Values of the variables used in the expression
+    :return: Array of the results.  For assignments this is the assigned value.
+    """
+    import numpy as np
+
+    def vector(v):
+        return v if v.ndim else np.full(3, v)
+
+    global _parser
+    if _parser is None:
+        _parser = DGParser()
+    ast = _parser.parse_ast(expression)[1]
+
+    functions = {
+        "+": np.add,
+        "-": np.subtract,
+        "*": np.multiply,
+        "/": np.true_divide,
+        "^": np.power,
+        "unary -": np.negative,
+        "abs": np.abs,
+        "exp": np.exp,
+        "clamp": lambda x, min_value, max_value: np.minimum(
+            np.maximum(x, min_value), max_value
+        ),
+        "lerp": lambda a, b, t: a + (b - a) * t,
+        # min and max are built with condition nodes
+        "min": lambda x, y: np.where(x <= y, x, y),
+        "max": lambda x, y: np.where(x >= y, x, y),
+        "sqrt": np.sqrt,
+        "cos": np.cos,
+        "sin": np.sin,
+        "tan": np.tan,
+        # The angleBetween based functions output degrees
+        "acos": lambda x: np.degrees(np.arccos(x)),
+        "asin": lambda x: np.degrees(np.arcsin(x)),
+        "atan": lambda x: np.degrees(np.arctan(x)),
+        "distance": lambda m1, m2: np.linalg.norm(
+            m1[..., 3, :3] - m2[..., 3, :3], axis=-1
+        ),
+        "dot": lambda v1, v2: np.sum(vector(v1) * vector(v2), axis=-1),
+        "cross": lambda v1, v2: np.cross(vector(v1), vector(v2)),
+        "normalize": lambda v: vector(v)
+        / np.linalg.norm(vector(v), axis=-1)[..., np.newaxis],
+        "length": lambda v: np.linalg.norm(vector(v), axis=-1),
+        "matmul": np.matmul,
+        "inverse": np.linalg.inv,
+        "pointmatrix": lambda p, m: np.einsum(
+            "...i,...ij->...j",
+            np.concatenate([vector(p), np.ones(vector(p).shape[:-1] + (1,))], -1),
+            m,
+        )[..., :3],
+    }
+    results = {}
+
+    def evaluate_node(node):
+        if node.op == ASTNode.NUMBER:
+            return np.asarray(node.value, dtype=float)
+        elif node.op == ASTNode.VARIABLE:
+            if node.name not in kwargs:
+                raise Exception("invalid identifier '%s'" % node.name)
+            return np.asarray(kwargs[node.name], dtype=float)
+        result = results.get(node.key)
+        if result is None:
+            args = [evaluate_node(arg) for arg in node.args]
+            if node.op == "?":
+                result = np.where(compare(node.value, args[0], args[1]), *args[2:])
+            else:
+                result = functions[node.op](*args)
+            results[node.key] = result
+        return result
+
+    # Invalid values such as sqrt(-1) produce nan like the node networks
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return evaluate_node(ast)
+
+
+class CommandBackend(object):
+    """Builds node networks with maya.cmds."""
+
+    def create_node(self, node_type):
+        return cmds.createNode(node_type)
+
+    def set_attr(self, attribute, value, data_type=None):
+        kwargs = {"type": data_type} if data_type else {}
+        cmds.setAttr(attribute, value, **kwargs)
+
+    def connect_attr(self, source, destination, force=False):
+        cmds.connectAttr(source, destination, force=force)
+
+    def set_notes(self, node, notes):
+        attrs = cmds.listAttr(node, ud=True) or []
+        if "notes" not in attrs:
+            cmds.addAttr(node, ln="notes", dt="string")
+        cmds.setAttr("{}.notes".format(node), notes, type="string")
+
+
+class ModifierBackend(object):
+    """Builds node networks with a single MDGModifier.
+
+    Nodes are created as soon as they are requested so the rest of the expression can
+    reference them by name and query their attribute types.  Attribute values, connections and notes are recorded and
+    applied in one pass when the modifier is executed.  The executed modifier is added
+    to the undo queue so the whole network is undone in one step.
+    """
+
+    def __init__(self):
+        self.dgmod = OpenMaya.MDGModifier()
+        self.nodes = []
+        self._values = []
+        self._connections = []
+        self._notes = OrderedDict()
+        self._committed = False
+
+    def create_node(self, node_type):
+        node = self.dgmod.createNode(node_type)
+        # The modifier only gives the node its unique name when it is executed, and the
+        # parser queries the attribute types of the new node while it builds the rest of
+        # the expression, so the node has to exist now.  Only the create is queued at
+        # this point so this executes nothing else.
+        self.dgmod.doIt()
+        name = OpenMaya.MFnDependencyNode(node).name()
+        self.nodes.append(name)
+        return name
+
+    def set_attr(self, attribute, value, data_type=None):
+        self._values.append((attribute, value, data_type))
+
+    def connect_attr(self, source, destination, force=False):
+        self._connections.append((source, destination, force))
+
+    def set_notes(self, node, notes):
+        # Nodes can be annotated by nested expressions so only the last notes are used
+        self._notes[node] = notes
+
+    def execute(self):
+        """Apply all the recorded changes and add the modifier to the undo queue."""
+        for attribute, value, data_type in self._values:
+            plug = get_plug(attribute)
+            if data_type == "string":
+                self.dgmod.newPlugValueString(plug, value)
+            elif data_type == "Int32Array":
+                data = OpenMaya.MFnIntArrayData().create(OpenMaya.MIntArray(value))
+                self.dgmod.newPlugValue(plug, data)
+            elif data_type == "doubleArray":
+                data = OpenMaya.MFnDoubleArrayData().create(
+                    OpenMaya.MDoubleArray(value)
+                )
+                self.dgmod.newPlugValue(plug, data)
+            else:
+                set_plug_value(self.dgmod, plug, value)
+
+        for source, destination, force in self._connections:
+            destination = get_plug(destination)
+            if force and destination.isDestination:
+                self.dgmod.disconnect(destination.source(), destination)
+            self.dgmod.connect(get_plug(source), destination)
+
+        # The notes attributes need to exist before their values can be set
+        for node in self._notes:
+            fn_node = OpenMaya.MFnDependencyNode(get_mobject(node))
+            if not fn_node.hasAttribute("notes"):
+                attribute = OpenMaya.MFnTypedAttribute().create(
+                    "notes", "nts", OpenMaya.MFnData.kString
+                )
+                self.dgmod.addAttribute(fn_node.object(), attribute)
+        self.dgmod.doIt()
+        for node, notes in self._notes.items():
+            self.dgmod.newPlugValueString(get_plug("{}.notes".format(node)), notes)
+        self.dgmod.doIt()
+
+        from cmt.plugins import dgmodifier
+
+        dgmodifier.commit(self.dgmod)
+        self._committed = True
+
+    def rollback(self):
+        """Remove the nodes created so far if the modifier was never added to the undo
+        queue, since they could not be undone otherwise."""
+        if not self._committed:
+            self.dgmod.undoIt()
+
+    def add_to_container(self, container):
+        """Add the created nodes to a container.
+
+        Nodes created with a modifier are not added to the current container.
+        """
+        contained = set(cmds.container(container, q=True, nodeList=True) or [])
+        nodes = [node for node in self.nodes if node not in contained]
+        if nodes:
+            cmds.container(container, e=True, addNode=nodes)
+
+
+def get_mobject(node):
+    selection = OpenMaya.MSelectionList()
+    selection.add(node)
+    return selection.getDependNode(0)
+
+
+def get_plug(attribute):
+    selection = OpenMaya.MSelectionList()
+    selection.add(attribute)
+    return selection.getPlug(0)
+
+
+def set_plug_value(dgmod, plug, value):
+    """Record a numeric plug value on a modifier with the same units as setAttr.
+
+    :param dgmod: MDGModifier
+    :param plug: MPlug to set
+    :param value: Value in ui units
+    """
+    attribute = plug.attribute()
+    api_type = attribute.apiType()
+    if api_type in [
+        OpenMaya.MFn.kDoubleAngleAttribute,
+        OpenMaya.MFn.kFloatAngleAttribute,
+    ]:
+        dgmod.newPlugValueMAngle(plug, OpenMaya.MAngle(value, OpenMaya.MAngle.uiUnit()))
+    elif api_type in [
+        OpenMaya.MFn.kDoubleLinearAttribute,
+        OpenMaya.MFn.kFloatLinearAttribute,
+    ]:
+        dgmod.newPlugValueMDistance(
+            plug, OpenMaya.MDistance(value, OpenMaya.MDistance.uiUnit())
+        )
+    elif api_type == OpenMaya.MFn.kEnumAttribute:
+        dgmod.newPlugValueShort(plug, int(value))
+    elif api_type == OpenMaya.MFn.kNumericAttribute:
+        numeric_type = OpenMaya.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == OpenMaya.MFnNumericData.kBoolean:
+            dgmod.newPlugValueBool(plug, bool(value))
+        elif numeric_type in [
+            OpenMaya.MFnNumericData.kByte,
+            OpenMaya.MFnNumericData.kChar,
+            OpenMaya.MFnNumericData.kShort,
+        ]:
+            dgmod.newPlugValueShort(plug, int(value))
+        elif numeric_type == OpenMaya.MFnNumericData.kInt:
+            dgmod.newPlugValueInt(plug, int(value))
+        elif numeric_type == OpenMaya.MFnNumericData.kFloat:
+            dgmod.newPlugValueFloat(plug, value)
+        else:
+            dgmod.newPlugValueDouble(plug, value)
+    else:
+        dgmod.newPlugValueDouble(plug, value)
+
+
+class ASTNode(object):
+    """A node in the abstract syntax tree of a parsed expression."""
+
+    NUMBER = "number"
+    VARIABLE = "variable"
+
+    def __init__(self, op, args=(), value=None, name=None):
+        """Constructor
+
+        :param op: Operator, function name, ASTNode.NUMBER or ASTNode.VARIABLE
+        :param args: Tuple of ASTNode operands
+        :param value: Value of a constant, attribute of a variable or the comparison
+            operation index of a ternary
+        :param name: Name of a variable in the expression
+        """
+        self.op = op
+        self.args = tuple(args)
+        self.value = value
+        self.name = name
+        if op == ASTNode.NUMBER:
+            self.key = repr(float(value))
+        elif op == ASTNode.VARIABLE:
+            # Variables are identified by attribute so nodes can be shared between
+            # expressions that use different variable names
+            self.key = value
+        else:
+            # Unique string used to identify equivalent nodes
+            self.key = "{}[{}]({})".format(
+                op, "" if value is None else value, ",".join(a.key for a in self.args)
+            )
+
+    def to_string(self):
+        """Get the infix string of the node used in the notes of created nodes."""
+        if self.op == ASTNode.NUMBER:
+            return str(self.value)
+        elif self.op == ASTNode.VARIABLE:
+            return self.name
+        args = [arg.to_string() for arg in self.args]
+        if self.op == "unary -":
+            return "-{}".format(args[0])
+        elif self.op == "?":
+            return "{} {} {} ? {} : {}".format(
+                args[0], CONDITIONALS[self.value], args[1], args[2], args[3]
+            )
+        elif self.op in "+-*/^":
+            return "({} {} {})".format(args[0], self.op, args[1])
+        return "{}({})".format(self.op, ", ".join(args))
+
+    def __repr__(self):
+        return "ASTNode({})".format(self.to_string())
+
+
+CONDITIONALS = ["==", "!=", ">", ">=", "<", "<="]
+
+COMMUTATIVE_OPS = ["+", "*", "min", "max", "dot"]
+
+
+def compare(operation, a, b):
+    """Evaluate a comparison with the semantics of the condition node.
+
+    :param operation: Index into CONDITIONALS
+    :param a: First term
+    :param b: Second term
+    :return: The result of the comparison
+    """
+    return [
+        operator.eq,
+        operator.ne,
+        operator.gt,
+        operator.ge,
+        operator.lt,
+        operator.le,
+    ][operation](a, b)
+
+
+def _fold_ternary(first_term, second_term, if_true, if_false, operation):
+    return if_true if compare(operation, first_term, second_term) else if_false
+
+
+_fold_functions = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": math.pow,
+    "unary -": operator.neg,
+    "abs": math.fabs,
+    "exp": math.exp,
+    "clamp": lambda x, min_value, max_value: min(max(x, min_value), max_value),
+    "lerp": lambda a, b, t: a + (b - a) * t,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "cos": math.cos,
+    "sin": math.sin,
+    "tan": math.tan,
+    # The angleBetween based functions output degrees
+    "acos": lambda x: math.degrees(math.acos(x)),
+    "asin": lambda x: math.degrees(math.asin(x)),
+    "atan": lambda x: math.degrees(math.atan(x)),
+}
+
+
+def fold_constants(op, args, value=None):
+    """Evaluate an operation on constant values.
+
+    :param op: Name of the op
+    :param args: List of constant operands
+    :param value: Comparison operation of a ternary
+    :return: The folded value or None if the operation cannot be folded
+    """
+    if op == "?":
+        return _fold_ternary(*(args + [value]))
+    func = _fold_functions.get(op)
+    if func is None:
+        return None
+    try:
+        return func(*args)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        # Leave invalid operations to the node network
+        return None
+
+
+class BuildSession(object):
+    """Context manager used to share data between dge calls.
+
+    Nodes created by an expression are reused by any later expression in the session
+    that performs the same operation on the same attributes.  Attribute types and long
+    names are queried once per node type, or once per node for dynamic attributes.
+    Nodes deleted while the session is active are not tracked so do not delete
+    generated nodes until the session ends.
+
+    Sessions can be nested in which case the outermost session is used.
+    """
+
+    def __init__(self):
+        # Output attributes of created nodes keyed by ASTNode key
+        self.created_nodes = {}
+        self.node_types = {}
+        self.static_attributes = {}
+        self.attribute_types = {}
+        self.long_names = {}
+        self._previous = None
+
+    def __enter__(self):
+        global _session
+        self._previous = _session
+        if _session is None:
+            _session = self
+        return _session
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _session
+        _session = self._previous
+
+    def node_type(self, node):
+        node_type = self.node_types.get(node)
+        if node_type is None:
+            node_type = self.node_types[node] = cmds.nodeType(node)
+        return node_type
+
+    def scope(self, node, attribute):
+        """Get the key used to cache queries of an attribute.
+
+        :param node: Node name
+        :param attribute: Attribute path without the node
+        :return: The node type for static attributes, otherwise the node name
         """
-        args = [str(v) for v in args]
-        if op in self.fn:
-            return "{}({})".format(op, ", ".join(args))
-        elif args:
-            return op.join([self._reverse_kwargs.get(x, x) for x in args])
-        return op
+        node_type = self.node_type(node)
+        # Strip any child attributes and indices
+        name = attribute.split(".")[0].split("[")[0]
+        key = (node_type, name)
+        static = self.static_attributes.get(key)
+        if static is None:
+            static = self.static_attributes[key] = cmds.attributeQuery(
+                name, type=node_type, exists=True
+            )
+        return node_type if static else node
+
+    def attribute_type(self, node, attribute):
+        key = (self.scope(node, attribute), attribute)
+        attr_type = self.attribute_types.get(key)
+        if attr_type is None:
+            attr_type = self.attribute_types[key] = _query_attribute_type(
+                node, attribute
+            )
+        return attr_type
+
+    def long_attribute_name(self, node, attribute):
+        key = (self.scope(node, attribute), attribute)
+        long_name = self.long_names.get(key)
+        if long_name is None:
+            long_name = _query_long_attribute_name("{}.{}".format(node, attribute))
+            long_name = self.long_names[key] = long_name.split(".", 1)[-1]
+        return "{}.{}".format(node, long_name)
+
+
+def long_attribute_name(value):
+    """Get the attribute path of an attribute using long attribute names.
+
+    :param value: Attribute path such as node.tx
+    :return: The attribute path with long names such as node.translateX
+    """
+    if _session is not None:
+        return _session.long_attribute_name(*value.split(".", 1))
+    return _query_long_attribute_name(value)
+
+
+def _query_long_attribute_name(value):
+    tokens = value.split(".")
+    value = tokens[0]
+    for t in tokens[1:]:
+        attr = "{}.{}".format(value, t)
+        value += ".{}".format(cmds.attributeName(attr, long=True))
+    return value
 
 
 def attribute_is_array(value):
@@ -740,10 +1617,19 @@ def attribute_is_array(value):
 
 
 def attribute_type(a):
-    tokens = a.split(".")
-    node = tokens[0]
-    attribute = tokens[-1]
-    if attribute.startswith("worldMatrix"):
+    node, attribute = a.split(".", 1)
+    if attribute.split(".")[-1].startswith("worldMatrix"):
         # attributeQuery doesn't seem to work with worldMatrix
         return "matrix"
-    return cmds.attributeQuery(attribute, node=node, at=True)
+    if _session is not None:
+        return _session.attribute_type(node, attribute)
+    return _query_attribute_type(node, attribute)
+
+
+def _query_attribute_type(node, attribute):
+    attr_type = cmds.attributeQuery(attribute.split(".")[-1], node=node, at=True)
+    if attr_type == "typed":
+        # Typed attributes such as matrix outputs only report their data type on
+        # the plug
+        attr_type = cmds.getAttr("{}.{}".format(node, attribute), type=True)
+    return attr_type
@@ -24,7 +24,17 @@ def export_fbx(nodes, file_path):
     mel.eval('FBXExport -f "{}" -s'.format(file_path))
 
 
-def export_animation_fbx(root=None, file_path=None, start_frame=None, end_frame=None):
+def export_animation_fbx(
+    root=None, file_path=None, start_frame=None, end_frame=None, keyed=False
+):
+    """Export the animation of a skeleton to fbx.
+
+    The animation is baked through a duplicate skeleton constrained to the given
+    skeleton unless keyed is True, in which case the existing keys of the skeleton, such
+    as the ones created by cmt.anim.ikrig.bake, are exported directly.  Skeletons in a
+    namespace always use the duplicate skeleton so the exported names do not contain the
+    namespace.
+    """
     if root is None:
         root = cmds.ls(sl=True)
         if not root:
@@ -43,6 +53,16 @@ def export_animation_fbx(root=None, file_path=None, start_frame=None, end_frame=
 
     file_path = file_path.replace("\\", "/")
 
+    if keyed and not shortcuts.get_namespace_from_name(root):
+        joints = [root] + (
+            cmds.listRelatives(root, ad=True, type="joint", path=True) or []
+        )
+        cmds.select(joints)
+        mel.eval("FBXExportApplyConstantKeyReducer -v true;")
+        mel.eval("FBXExportBakeComplexAnimation -v false;")
+        _export_animation(file_path)
+        return
+
     with ExportSkeleton(root) as skeleton:
         cmds.select(skeleton)
         mel.eval("FBXExportApplyConstantKeyReducer -v true;")
@@ -50,16 +70,21 @@ def export_animation_fbx(root=None, file_path=None, start_frame=None, end_frame=
         mel.eval("FBXExportBakeComplexStart -v {};".format(start_frame))
         mel.eval("FBXExportBakeComplexEnd -v {};".format(end_frame))
         mel.eval("FBXExportBakeComplexStep -v 1;")
-        mel.eval("FBXExportCameras -v false;")
-        mel.eval("FBXExportConstraints -v false;")
-        mel.eval("FBXExportInAscii -v false;")
-        mel.eval("FBXExportInputConnections -v false;")
-        mel.eval("FBXExportReferencedAssetsContent -v false;")
-        mel.eval("FBXExportShapes -v true;")
-        mel.eval("FBXExportSkins -v true;")
-        mel.eval("FBXExportSmoothingGroups -v true;")
-        mel.eval("FBXExportSmoothMesh -v false;")
-        mel.eval('FBXExport -f "{}" -s'.format(file_path))
+        _export_animation(file_path)
+
+
+def _export_animation(file_path):
+    """Export the selected skeleton with the animation options already set."""
+    mel.eval("FBXExportCameras -v false;")
+    mel.eval("FBXExportConstraints -v false;")
+    mel.eval("FBXExportInAscii -v false;")
+    mel.eval("FBXExportInputConnections -v false;")
+    mel.eval("FBXExportReferencedAssetsContent -v false;")
+    mel.eval("FBXExportShapes -v true;")
+    mel.eval("FBXExportSkins -v true;")
+    mel.eval("FBXExportSmoothingGroups -v true;")
+    mel.eval("FBXExportSmoothMesh -v false;")
+    mel.eval('FBXExport -f "{}" -s'.format(file_path))
 
 
 class ExportSkeleton(object):
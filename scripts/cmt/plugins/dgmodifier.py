@@ -0,0 +1,63 @@
+"""DGModifier is a command used to add an already executed OpenMaya modifier to the
+undo queue.
+
+Modifiers executed outside of a command are not undoable.  Code that records its
+changes in a modifier can commit the modifier after executing it so all of its
+changes are undone and redone in one step.
+
+dgmod = OpenMaya.MDGModifier()
+# Record and execute changes
+dgmod.doIt()
+dgmodifier.commit(dgmod)
+"""
+
+import os
+
+import maya.cmds as cmds
+import maya.OpenMayaMPx as OpenMayaMPx
+
+PLUGIN_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "plug-ins", "cmt_py.py")
+)
+
+# Modifiers waiting to be claimed by the next DGModifierCommand
+_pending = []
+
+
+def commit(dgmod):
+    """Add an executed modifier to the undo queue.
+
+    :param dgmod: MDGModifier or MDagModifier that has already been executed.
+    """
+    if not cmds.pluginInfo("cmt_py", q=True, loaded=True):
+        cmds.loadPlugin(PLUGIN_PATH, qt=True)
+    _pending.append(dgmod)
+    cmds.cmtDGModifier()
+
+
+class DGModifierCommand(OpenMayaMPx.MPxCommand):
+    name = "cmtDGModifier"
+
+    @classmethod
+    def creator(cls):
+        return OpenMayaMPx.asMPxPtr(DGModifierCommand())
+
+    def __init__(self):
+        OpenMayaMPx.MPxCommand.__init__(self)
+        self._dgmod = None
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, arg_list):
+        # The modifier has already been executed by the caller
+        if _pending:
+            self._dgmod = _pending.pop()
+
+    def redoIt(self):
+        if self._dgmod is not None:
+            self._dgmod.doIt()
+
+    def undoIt(self):
+        if self._dgmod is not None:
+            self._dgmod.undoIt()
@@ -1,6 +1,42 @@
 import maya.cmds as cmds
 import maya.api.OpenMaya as OpenMaya
 import math
+from collections import namedtuple
+
+import numpy as np
+
+from cmt.rig.rbfsolver import quaternion_multiply
+
+# Threshold used to detect duplicate samples
+DUPLICATE_THRESHOLD = 0.0001
+
+EXTENSION = ".rbf"
+
+# Values of the solver attribute
+JACOBI_SVD, LDLT, BDC_SVD, COMPLETE_ORTHOGONAL = range(4)
+
+# Node settings saved with dump
+SETTINGS = ["sampleMode", "rbf", "radius", "regularization", "solver", "nearestSamples"]
+
+# Axis indices of each rotate order in the order the rotations are applied
+ROTATE_ORDER_AXES = np.array(
+    [[0, 1, 2], [1, 2, 0], [2, 0, 1], [0, 2, 1], [1, 0, 2], [2, 1, 0]]
+)
+
+# The sample table of an rbf node.  indices and rotation_types have one entry per
+# sample.  The values are arrays of shape (samples, count) and the quaternions are
+# arrays of shape (samples, count, 4) in x, y, z, w order.
+Samples = namedtuple(
+    "Samples",
+    [
+        "indices",
+        "rotation_types",
+        "input_values",
+        "output_values",
+        "input_quats",
+        "output_quats",
+    ],
+)
 
 
 class RBF(object):
@@ -17,11 +53,15 @@ class RBF(object):
         input_transforms=None,
         output_transforms=None,
         add_neutral_sample=True,
+        twist_axes=None,
     ):
         cmds.loadPlugin("cmt", qt=True)
         name = name or "rbf#"
         node = cmds.createNode("rbf", name=name)
         node = RBF(node)
+        # The node defaults to jacobi svd so existing scenes keep their results, but new
+        # nodes use the faster ldlt which falls back to jacobi svd when needed
+        cmds.setAttr("{}.solver".format(node.name), LDLT)
         if add_neutral_sample:
             # Store the current output values because they may be different once
             # connected
@@ -36,6 +76,8 @@ class RBF(object):
         node.set_outputs(outputs)
         node.set_input_transforms(input_transforms)
         node.set_output_transforms(output_transforms)
+        if twist_axes is not None:
+            node.set_twist_axes(twist_axes)
 
         if add_neutral_sample:
             for i in range(3):
@@ -114,6 +156,26 @@ class RBF(object):
         cmds.setAttr("{}.inputQuatCount".format(self.name), len(input_transforms))
         # TODO: Reshuffle samples if inputs are being re-used
 
+    def set_twist_axes(self, twist_axes):
+        """Set the axis each input transform is decomposed into swing and twist around.
+
+        :param twist_axes: List of 0, 1 or 2 for the X, Y or Z axis, one per input
+            transform.
+        """
+        for i, axis in enumerate(twist_axes):
+            cmds.setAttr("{}.inputTwistAxis[{}]".format(self.name, i), axis)
+
+    def twist_axes(self):
+        """Get the twist axis of each input transform.
+
+        :return: List of 0, 1 or 2 for the X, Y or Z axis.
+        """
+        quat_count = cmds.getAttr("{}.inputQuatCount".format(self.name))
+        return [
+            cmds.getAttr("{}.inputTwistAxis[{}]".format(self.name, i))
+            for i in range(quat_count)
+        ]
+
     def set_output_transforms(self, output_transforms):
         current_output_transforms = self.output_transforms()
         # Disconnect existing transforms
@@ -230,101 +292,303 @@ class RBF(object):
             [[rx, ry, rz], [rx, ry, rz]]
         :return: The sample index
         """
+        indices = self.add_samples(
+            input_values=None if input_values is None else [input_values],
+            output_values=None if output_values is None else [output_values],
+            input_rotations=None if input_rotations is None else [input_rotations],
+            output_rotations=None if output_rotations is None else [output_rotations],
+            rotation_types=[rotation_type],
+        )
+        return indices[0]
+
+    def add_samples(
+        self,
+        input_values=None,
+        output_values=None,
+        input_rotations=None,
+        output_rotations=None,
+        rotation_types=None,
+    ):
+        """Add many samples in a single operation.
+
+        Each argument has one entry per sample.  Any argument that is None uses the
+        current values in the scene for every sample.
+
+        :param input_values: Optional list of input values per sample
+        :param output_values: Optional list of output values per sample
+        :param input_rotations: Optional list of input rotations per sample:
+            [[[rx, ry, rz], [rx, ry, rz]], ...]
+        :param output_rotations: Optional list of output rotations per sample:
+            [[[rx, ry, rz], [rx, ry, rz]], ...]
+        :param rotation_types: Optional list of rotation types per sample.  Defaults
+            to swing.
+        :return: The list of sample indices.  Samples that already exist are skipped
+            and have an index of None.
+        """
+        count = next(
+            (
+                len(x)
+                for x in [
+                    input_values,
+                    output_values,
+                    input_rotations,
+                    output_rotations,
+                    rotation_types,
+                ]
+                if x is not None
+            ),
+            1,
+        )
+        if rotation_types is None:
+            rotation_types = [RBF.swing] * count
+
         if input_values is None:
             # Use existing values
-            input_values = [cmds.getAttr(x) for x in self.inputs()]
+            input_values = [[cmds.getAttr(x) for x in self.inputs()]] * count
 
         input_transforms = self.input_transforms()
         if input_rotations is None:
             input_rotations = [
-                cmds.getAttr("{}.r".format(x))[0] for x in input_transforms
-            ]
+                [cmds.getAttr("{}.r".format(x))[0] for x in input_transforms]
+            ] * count
 
         # Convert euler to quat
-        input_rotations = euler_to_quat(input_rotations, input_transforms)
+        input_quats = euler_to_quat(
+            _to_array(input_rotations, count, (3,)), input_transforms
+        )
 
-        # See if a sample with these inputs already exists
-        if self._sample_already_exists(input_values, input_rotations, rotation_type):
+        # See if samples with these inputs already exist
+        input_values = _to_array(input_values, count)
+        input_quats = _to_array(input_quats, count, (4,))
+        rotation_types = np.array(rotation_types, dtype=int)
+        duplicates = self._samples_already_exist(
+            input_values, input_quats, rotation_types
+        )
+        for _ in range(np.count_nonzero(duplicates)):
             print("Existing sample already exists. Skipping.")
-            return None
 
         if output_values is None:
             # Use existing values
-            output_values = [cmds.getAttr(x) for x in self.outputs()]
+            output_values = [[cmds.getAttr(x) for x in self.outputs()]] * count
 
         output_transforms = self.output_transforms()
         if output_rotations is None:
             # Use existing values
             output_rotations = [
-                cmds.getAttr("{}.r".format(x))[0] for x in output_transforms
-            ]
-        output_rotations = euler_to_quat(output_rotations, output_transforms)
+                [cmds.getAttr("{}.r".format(x))[0] for x in output_transforms]
+            ] * count
+        output_quats = euler_to_quat(
+            _to_array(output_rotations, count, (3,)), output_transforms
+        )
 
-        indices = cmds.getAttr("{}.sample".format(self.name), mi=True) or []
-        idx = indices[-1] + 1 if indices else 0
-        cmds.setAttr("{}.sample[{}].rotationType".format(self.name, idx), rotation_type)
-        for i, v in enumerate(input_values):
-            cmds.setAttr(
-                "{}.sample[{}].sampleInputValue[{}]".format(self.name, idx, i), v
-            )
-        for i, v in enumerate(output_values):
-            cmds.setAttr(
-                "{}.sample[{}].sampleOutputValue[{}]".format(self.name, idx, i), v
-            )
-        for i, v in enumerate(input_rotations):
-            cmds.setAttr(
-                "{}.sample[{}].sampleInputQuat[{}]".format(self.name, idx, i),
-                *v,
-                type="double4"
+        existing_indices = list(self._plug("sample").getExistingArrayAttributeIndices())
+        idx = existing_indices[-1] + 1 if existing_indices else 0
+        result = []
+        new_samples = []
+        for i in range(count):
+            if duplicates[i]:
+                result.append(None)
+                continue
+            result.append(idx)
+            new_samples.append(
+                (
+                    idx,
+                    rotation_types[i],
+                    input_values[i],
+                    output_values[i],
+                    input_quats[i],
+                    output_quats[i],
+                )
             )
-        for i, v in enumerate(output_rotations):
-            cmds.setAttr(
-                "{}.sample[{}].sampleOutputQuat[{}]".format(self.name, idx, i),
-                *v,
-                type="double4"
+            idx += 1
+        if new_samples:
+            self.set_samples(Samples(*zip(*new_samples)))
+        return result
+
+    def samples(self):
+        """Get the whole sample table of the node in one read.
+
+        :return: A Samples tuple
+        """
+        plug = self._plug("sample")
+        indices = list(plug.getExistingArrayAttributeIndices())
+        counts = [
+            self._plug(attribute).asInt()
+            for attribute in [
+                "inputValueCount",
+                "outputValueCount",
+                "inputQuatCount",
+                "outputQuatCount",
+            ]
+        ]
+        input_values = np.zeros((len(indices), counts[0]))
+        output_values = np.zeros((len(indices), counts[1]))
+        input_quats = np.zeros((len(indices), counts[2], 4))
+        output_quats = np.zeros((len(indices), counts[3], 4))
+        rotation_types = np.zeros(len(indices), dtype=int)
+        attributes = self._sample_attributes(plug)
+        for row, idx in enumerate(indices):
+            sample = plug.elementByLogicalIndex(idx)
+            rotation_types[row] = sample.child(attributes["rotationType"]).asShort()
+            for values, name in [
+                [input_values, "sampleInputValue"],
+                [output_values, "sampleOutputValue"],
+            ]:
+                array = sample.child(attributes[name])
+                for i in range(values.shape[1]):
+                    values[row, i] = array.elementByLogicalIndex(i).asDouble()
+            for quats, name in [
+                [input_quats, "sampleInputQuat"],
+                [output_quats, "sampleOutputQuat"],
+            ]:
+                array = sample.child(attributes[name])
+                for i in range(quats.shape[1]):
+                    quat = array.elementByLogicalIndex(i)
+                    quats[row, i] = [quat.child(j).asDouble() for j in range(4)]
+        return Samples(
+            np.array(indices, dtype=int),
+            rotation_types,
+            input_values,
+            output_values,
+            input_quats,
+            output_quats,
+        )
+
+    def set_samples(self, samples):
+        """Write many samples to the node in one undoable operation.
+
+        :param samples: A Samples tuple.  Samples with existing indices are
+            overwritten.
+        """
+        from cmt.plugins import dgmodifier
+
+        plug = self._plug("sample")
+        attributes = self._sample_attributes(plug)
+        dgmod = OpenMaya.MDGModifier()
+        for row, idx in enumerate(samples.indices):
+            sample = plug.elementByLogicalIndex(int(idx))
+            dgmod.newPlugValueShort(
+                sample.child(attributes["rotationType"]),
+                int(samples.rotation_types[row]),
             )
+            for values, name in [
+                [samples.input_values, "sampleInputValue"],
+                [samples.output_values, "sampleOutputValue"],
+            ]:
+                array = sample.child(attributes[name])
+                for i, v in enumerate(values[row]):
+                    dgmod.newPlugValueDouble(array.elementByLogicalIndex(i), float(v))
+            for quats, name in [
+                [samples.input_quats, "sampleInputQuat"],
+                [samples.output_quats, "sampleOutputQuat"],
+            ]:
+                array = sample.child(attributes[name])
+                for i, q in enumerate(quats[row]):
+                    quat = array.elementByLogicalIndex(i)
+                    for j in range(4):
+                        dgmod.newPlugValueDouble(quat.child(j), float(q[j]))
+        dgmod.doIt()
+        dgmodifier.commit(dgmod)
+
+    def evaluate(self, input_values=None, input_quats=None):
+        """Evaluate the node for many frames in one call without going through the
+        dependency graph.
+
+        :param input_values: Array of shape (frames, input count).
+        :param input_quats: Array of shape (frames, input quat count, 4) in the same
+            space as the inputQuat plugs.
+        :return: A tuple of the output values of shape (frames, output count) and the
+            output rotations of shape (frames, output quat count, 3) in the current
+            angular unit.
+        """
+        cmds.loadPlugin("cmt", qt=True)
+        output_count = cmds.getAttr("{}.outputValueCount".format(self.name))
+        output_quat_count = cmds.getAttr("{}.outputQuatCount".format(self.name))
+        kwargs = {}
+        frame_count = 0
+        if input_values is not None:
+            input_values = np.asarray(input_values, dtype=float)
+            frame_count = len(input_values)
+            kwargs["inputValue"] = input_values.reshape(-1).tolist()
+        if input_quats is not None:
+            input_quats = np.asarray(input_quats, dtype=float)
+            frame_count = len(input_quats)
+            kwargs["inputQuat"] = [tuple(q) for q in input_quats.reshape(-1, 4)]
+        result = np.array(cmds.rbfEvaluate(self.name, **kwargs) or [])
+        result = result.reshape(frame_count, output_count + output_quat_count * 3)
+        values = result[:, :output_count]
+        rotations = result[:, output_count:].reshape(frame_count, output_quat_count, 3)
+        return values, rotations
+
+    def _plug(self, attribute):
+        selection = OpenMaya.MSelectionList()
+        selection.add("{}.{}".format(self.name, attribute))
+        return selection.getPlug(0)
+
+    @staticmethod
+    def _sample_attributes(plug):
+        """Look up the attributes of the sample children once so they are not found by
+        name for every sample.
+
+        :param plug: The sample plug
+        :return: Dictionary of the child attribute MObjects by name
+        """
+        fn_node = OpenMaya.MFnDependencyNode(plug.node())
+        return {
+            name: fn_node.attribute(name)
+            for name in [
+                "rotationType",
+                "sampleInputValue",
+                "sampleOutputValue",
+                "sampleInputQuat",
+                "sampleOutputQuat",
+            ]
+        }
 
-        return idx
+    def _samples_already_exist(self, input_values, input_quats, rotation_types):
+        """Check which of the given samples already exist.
 
-    def _sample_already_exists(self, input_values, input_rotations, rotation_type):
-        """Check if a sample with the given inputs already exists.
+        Samples are also compared against the earlier samples in the given arrays.
 
-        :param input_values: List of float values.
-        :param input_rotations: List of 4-tuples representing quaternions
-        :param rotation_type:
-        :return: True if the sample already exists.
+        :param input_values: Array of input values of shape (samples, inputs)
+        :param input_quats: Array of quaternions of shape (samples, quats, 4)
+        :param rotation_types: Array of rotation types
+        :return: Boolean array that is True for each sample that already exists
         """
-        indices = cmds.getAttr("{}.sample".format(self.name), mi=True) or []
-        if not indices:
-            return False
-        threshold = 0.0001
-        for idx in indices:
-            rt = cmds.getAttr("{}.sample[{}].rotationType".format(self.name, idx))
-            if rotation_type != rt:
-                continue
-            sample_is_same = True
-            for i, v1 in enumerate(input_values):
-                v2 = cmds.getAttr(
-                    "{}.sample[{}].sampleInputValue[{}]".format(self.name, idx, i)
-                )
-                if math.fabs(v1 - v2) > threshold:
-                    sample_is_same = False
-                    break
-
-            for i, v1 in enumerate(input_rotations):
-                v2 = cmds.getAttr(
-                    "{}.sample[{}].sampleInputQuat[{}]".format(self.name, idx, i)
-                )[0]
-                q1 = OpenMaya.MQuaternion(*v1)
-                q2 = OpenMaya.MQuaternion(*v2)
-                d = quaternion_distance(q1, q2)
-
-                if d > threshold:
-                    sample_is_same = False
-                    break
-            if sample_is_same:
-                return True
-        return False
+        existing = self.samples()
+
+        def matches(values1, quats1, types1, values2, quats2, types2):
+            same = types1[:, np.newaxis] == types2[np.newaxis, :]
+            if values1.shape[1]:
+                delta = np.abs(values1[:, np.newaxis] - values2[np.newaxis, :])
+                same &= np.all(delta <= DUPLICATE_THRESHOLD, axis=-1)
+            if quats1.shape[1]:
+                distance = quaternion_distance_matrix(quats1, quats2)
+                same &= np.all(distance <= DUPLICATE_THRESHOLD, axis=-1)
+            return same
+
+        duplicates = np.any(
+            matches(
+                input_values,
+                input_quats,
+                rotation_types,
+                _resize(existing.input_values, input_values.shape[1]),
+                _resize(existing.input_quats, input_quats.shape[1]),
+                existing.rotation_types,
+            ),
+            axis=1,
+        )
+        within = matches(
+            input_values,
+            input_quats,
+            rotation_types,
+            input_values,
+            input_quats,
+            rotation_types,
+        )
+        # Only compare against the earlier samples
+        duplicates |= np.any(np.tril(within, k=-1), axis=1)
+        return duplicates
 
     def remove_sample(self, i):
         """Remove the sample at index i
@@ -337,11 +601,156 @@ class RBF(object):
         cmds.removeMultiInstance("{}.sample[{}]".format(self.name, i), all=True, b=True)
 
 
+def dump(node, file_path=None):
+    """Export an rbf node setup to a binary file.
+
+    The file contains the connections, settings and samples of the node along with
+    its solved system so a node loaded from the file does not solve it again.
+
+    :param node: RBF instance or name of the rbf node.
+    :param file_path: Export path.  Opens a file dialog if None.
+    :return: The exported file path.
+    """
+    if not isinstance(node, RBF):
+        node = RBF(node)
+    if file_path is None:
+        file_path = cmds.fileDialog2(
+            fileFilter="RBF Files (*{})".format(EXTENSION),
+            dialogStyle=2,
+            caption="Export RBF",
+            fileMode=0,
+            returnFilter=False,
+        )
+        if not file_path:
+            return
+        file_path = file_path[0]
+
+    # Have the node store its solution while it is exported
+    store_solution = "{}.storeSolution".format(node.name)
+    stored = cmds.getAttr(store_solution)
+    cmds.setAttr(store_solution, True)
+    cmds.getAttr("{}.outputValue[0]".format(node.name))
+    solution = cmds.getAttr("{}.solution".format(node.name)) or []
+    solution_hash = cmds.getAttr("{}.solutionHash".format(node.name)) or ""
+    cmds.setAttr(store_solution, stored)
+
+    quat_count = cmds.getAttr("{}.inputQuatCount".format(node.name))
+    input_rest_quats = [
+        cmds.getAttr("{}.inputRestQuat[{}]".format(node.name, i))[0]
+        for i in range(quat_count)
+    ]
+    data = dict(node.samples()._asdict())
+    data.update(
+        {
+            "inputs": _names(node.inputs()),
+            "outputs": _names(node.outputs()),
+            "input_transforms": _names(node.input_transforms()),
+            "output_transforms": _names(node.output_transforms()),
+            "input_rest_quats": np.array(input_rest_quats, dtype=float).reshape(-1, 4),
+            "twist_axes": np.array(node.twist_axes(), dtype=int),
+            "solution": np.array(solution, dtype=float),
+            "solution_hash": np.array(solution_hash),
+        }
+    )
+    for attribute in SETTINGS:
+        data[attribute] = cmds.getAttr("{}.{}".format(node.name, attribute))
+    with open(file_path, "wb") as fh:
+        np.savez_compressed(fh, **data)
+    return file_path
+
+
+def load(file_path=None, name=None):
+    """Create an rbf node from a file written by dump.
+
+    The attributes and transforms the node was connected to must exist in the scene.
+
+    :param file_path: Path of the file.  Opens a file dialog if None.
+    :param name: Optional name of the new node.
+    :return: The RBF instance of the new node.
+    """
+    if file_path is None:
+        file_path = cmds.fileDialog2(
+            fileFilter="RBF Files (*{})".format(EXTENSION),
+            dialogStyle=2,
+            caption="Import RBF",
+            fileMode=1,
+            returnFilter=False,
+        )
+        if not file_path:
+            return
+        file_path = file_path[0]
+    with open(file_path, "rb") as fh:
+        data = dict(np.load(fh, allow_pickle=False))
+
+    node = RBF.create(
+        name=name,
+        inputs=data["inputs"].tolist(),
+        outputs=data["outputs"].tolist(),
+        input_transforms=data["input_transforms"].tolist(),
+        output_transforms=data["output_transforms"].tolist(),
+        add_neutral_sample=False,
+        # Files written before the twist axis was configurable only used X
+        twist_axes=data.get("twist_axes", np.zeros(0, dtype=int)).tolist(),
+    )
+    for attribute in SETTINGS:
+        cmds.setAttr("{}.{}".format(node.name, attribute), data[attribute].item())
+    # The rest rotations are reset to the current pose when the transforms are connected
+    for i, q in enumerate(data["input_rest_quats"]):
+        cmds.setAttr("{}.inputRestQuat[{}]".format(node.name, i), *q, type="double4")
+    node.set_samples(Samples(*[data[field] for field in Samples._fields]))
+    if data["solution"].size:
+        cmds.setAttr(
+            "{}.solution".format(node.name),
+            data["solution"].tolist(),
+            type="doubleArray",
+        )
+        cmds.setAttr(
+            "{}.solutionHash".format(node.name),
+            data["solution_hash"].item(),
+            type="string",
+        )
+        cmds.setAttr("{}.storeSolution".format(node.name), True)
+    return node
+
+
+def _names(values):
+    """Convert a list of node or attribute names to an array that can be saved without
+    pickling."""
+    return np.array([str(x) for x in values], dtype=str)
+
+
+def _to_array(values, count, item_shape=()):
+    """Convert per sample values to an array of shape (count, values) + item_shape."""
+    array = np.array(values, dtype=float)
+    if not array.size:
+        return np.zeros((count, 0) + item_shape)
+    return array
+
+
+def _resize(array, count):
+    """Resize the second dimension of an array, filling any new values with 0."""
+    resized = np.zeros(array.shape[:1] + (count,) + array.shape[2:])
+    count = min(count, array.shape[1])
+    resized[:, :count] = array[:, :count]
+    return resized
+
+
 def quaternion_distance(q1, q2):
     dot = quaternion_dot(q1, q2)
     return math.acos(2.0 * dot * dot - 1.0) / math.pi
 
 
+def quaternion_distance_matrix(q1, q2):
+    """Get the distances between every pair of quaternions of two arrays.
+
+    :param q1: Array of quaternions of shape (n, ..., 4)
+    :param q2: Array of quaternions of shape (m, ..., 4)
+    :return: Array of distances of shape (n, m, ...)
+    """
+    dot = np.clip(np.einsum("i...j,k...j->ik...", q1, q2), -1.0, 1.0)
+    return np.arccos(np.clip(2.0 * dot * dot - 1.0, -1.0, 1.0)) / math.pi
+
+
 def quaternion_dot(q1, q2):
     value = (q1.x * q2.x) + (q1.y * q2.y) + (q1.z * q2.z) + (q1.w * q2.w)
     # Clamp any floating point error
@@ -353,22 +762,49 @@ def quaternion_dot(q1, q2):
 
 
 def euler_to_quat(eulers, transforms):
-    """Convert a list of eulers to quaternions
+    """Convert eulers to quaternions with the rotate order and joint orient of the
+    transforms they belong to.
 
-    :param eulers: List of tuples or lists of length 3
+    The rotate order and joint orient of each transform are only queried once so whole
+    pose libraries can be converted in one call.
+
+    :param eulers: Array of euler rotations in degrees of shape (..., transforms, 3)
     :param transforms: List of transforms per rotation
-    :return: List of quaternions
+    :return: Array of quaternions of shape (..., transforms, 4)
+    """
+    eulers = np.asarray(eulers, dtype=float)
+    if not len(transforms):
+        return np.zeros(eulers.shape[:-2] + (0, 4))
+    settings = {}
+    for transform in transforms:
+        if transform in settings:
+            continue
+        rotate_order = cmds.getAttr("{}.ro".format(transform))
+        joint_orient = [0.0, 0.0, 0.0]
+        if cmds.nodeType(transform) == "joint":
+            joint_orient = cmds.getAttr("{}.jo".format(transform))[0]
+        settings[transform] = (rotate_order, joint_orient)
+    rotate_orders = np.array([settings[x][0] for x in transforms])
+    joint_orients = np.array([settings[x][1] for x in transforms], dtype=float)
+    quats = eulers_to_quats(eulers, rotate_orders)
+    return quaternion_multiply(quats, eulers_to_quats(joint_orients, 0))
+
+
+def eulers_to_quats(eulers, rotate_orders):
+    """Vectorized conversion of euler rotations to quaternions.
+
+    :param eulers: Array of euler rotations in degrees with a last dimension of 3
+    :param rotate_orders: Maya rotate order index or array of indices broadcastable to
+        the shape of eulers without the last dimension
+    :return: Array of quaternions with a last dimension of 4
     """
-    quats = []
-    for i, v in enumerate(eulers):
-        rotate_order = cmds.getAttr("{}.ro".format(transforms[i]))
-        r = [math.radians(x) for x in v]
-        euler = OpenMaya.MEulerRotation(r[0], r[1], r[2], rotate_order)
-        q = euler.asQuaternion()
-        if cmds.nodeType(transforms[i]) == "joint":
-            jo = cmds.getAttr("{}.jo".format(transforms[i]))[0]
-            jo = [math.radians(x) for x in jo]
-            jo = OpenMaya.MEulerRotation(jo[0], jo[1], jo[2])
-            q *= jo.asQuaternion()
-        quats.append([q.x, q.y, q.z, q.w])
-    return quats
+    half_angles = np.radians(np.asarray(eulers, dtype=float)) * 0.5
+    # (..., axis, 4) quaternions of the rotation around each axis
+    axis_quats = np.zeros(half_angles.shape + (4,))
+    for axis in range(3):
+        axis_quats[..., axis, axis] = np.sin(half_angles[..., axis])
+        axis_quats[..., axis, 3] = np.cos(half_angles[..., axis])
+    axes = ROTATE_ORDER_AXES[np.broadcast_to(rotate_orders, half_angles.shape[:-1])]
+    ordered = np.take_along_axis(axis_quats, axes[..., np.newaxis], axis=-2)
+    quats = quaternion_multiply(ordered[..., 0, :], ordered[..., 1, :])
+    return quaternion_multiply(quats, ordered[..., 2, :])
@@ -0,0 +1,520 @@
+"""NumPy reference implementation of the rbf node solver.
+
+This module does not depend on Maya so pose interpolators can be fit, evaluated and
+benchmarked over whole animation clips in batch, on the farm or in unit tests without a
+Maya session.  The math mirrors LinearRegressionSolver and RBFNode::compute in the cmt
+plug-in.
+
+Quaternions are stored as (x, y, z, w) in the last dimension of the arrays and
+:func:`quaternion_multiply` uses the same multiplication order as MQuaternion.
+
+Example::
+
+    import maya.cmds as cmds
+    from cmt.rig.rbf import RBF
+    from cmt.rig.rbfsolver import PoseInterpolator
+
+    node = RBF("rbf1")
+    rest_quats = cmds.getAttr("rbf1.inputRestQuat")
+    interpolator = PoseInterpolator(
+        node.samples(),
+        rbf=cmds.getAttr("rbf1.rbf"),
+        input_rest_quats=rest_quats,
+        twist_axes=node.twist_axes(),
+    )
+    # input_values has shape (frames, input count), input_quats (frames, quat count, 4)
+    output_values, output_quats = interpolator.evaluate(input_values, input_quats)
+"""
+import math
+
+import numpy as np
+
+SWING = 0
+TWIST = 1
+SWING_TWIST = 2
+
+LINEAR = 0
+GAUSSIAN = 1
+THIN_PLATE = 2
+MULTI_QUADRATIC_BIHARMONIC = 3
+INV_MULTI_QUADRATIC_BIHARMONIC = 4
+BECKERT_WENDLAND_C2_BASIS = 5
+
+ABSOLUTE = 0
+RELATIVE = 1
+
+
+def quaternion_multiply(q1, q2):
+    """Multiply arrays of quaternions with the MQuaternion multiplication order.
+
+    q1 * q2 applies the rotation of q1 followed by the rotation of q2.
+
+    :param q1: Array of quaternions with a last dimension of 4
+    :param q2: Array of quaternions with a last dimension of 4
+    :return: Array of the products
+    """
+    x1, y1, z1, w1 = np.moveaxis(np.asarray(q2, dtype=float), -1, 0)
+    x2, y2, z2, w2 = np.moveaxis(np.asarray(q1, dtype=float), -1, 0)
+    return np.stack(
+        [
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        ],
+        axis=-1,
+    )
+
+
+def quaternion_inverse(q):
+    """Get the inverse of an array of quaternions.
+
+    :param q: Array of quaternions with a last dimension of 4
+    :return: Array of the inverse quaternions
+    """
+    q = np.asarray(q, dtype=float)
+    inverse = q * np.array([-1.0, -1.0, -1.0, 1.0])
+    return inverse / np.sum(q * q, axis=-1, keepdims=True)
+
+
+def quaternion_distances(q1, q2):
+    """Get the rotational distance between quaternions in the range [0, 1].
+
+    :param q1: Array of quaternions with a last dimension of 4
+    :param q2: Array of quaternions with a last dimension of 4
+    :return: Array of the distances between the quaternions
+    """
+    dot = np.clip(np.sum(q1 * q2, axis=-1), -1.0, 1.0)
+    return np.arccos(np.clip(2.0 * dot * dot - 1.0, -1.0, 1.0)) / math.pi
+
+
+def decompose_swing_twist(q, twist_axis=0):
+    """Decompose quaternions into swing and twist around a twist axis.
+
+    :param q: Array of quaternions with a last dimension of 4
+    :param twist_axis: 0, 1 or 2 for the X, Y or Z axis, or an array of axes
+        broadcastable to the leading dimensions of q such as one axis per input rotation
+    :return: Tuple of the swing and twist quaternion arrays
+    """
+    q = np.asarray(q, dtype=float)
+    axis = np.broadcast_to(np.asarray(twist_axis, dtype=int), q.shape[:-1])
+    twist = np.zeros_like(q)
+    np.put_along_axis(
+        twist,
+        axis[..., np.newaxis],
+        np.take_along_axis(q, axis[..., np.newaxis], axis=-1),
+        axis=-1,
+    )
+    twist[..., 3] = q[..., 3]
+    norm = np.linalg.norm(twist, axis=-1, keepdims=True)
+    twist = np.divide(twist, norm, out=twist, where=norm > 0.0)
+    swing = quaternion_multiply(quaternion_inverse(twist), q)
+    return swing, twist
+
+
+def apply_rbf(distances, rbf, radius):
+    """Apply a radial basis function to an array of distances.
+
+    :param distances: Array of distances
+    :param rbf: Radial basis function index matching the rbf node rbf attribute
+    :param radius: Radius or array of radii broadcastable to distances
+    :return: Array of the rbf values
+    """
+    x = np.asarray(distances, dtype=float)
+    radius = np.asarray(radius, dtype=float)
+    positive_radius = np.where(radius > 0.0, radius, 0.001)
+    if rbf == GAUSSIAN:
+        r = positive_radius * 0.4
+        return np.exp(-(x * x) / (2.0 * r * r))
+    elif rbf == THIN_PLATE:
+        v = x / positive_radius
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(v > 0.0, v * v * np.log(v), v)
+    elif rbf == MULTI_QUADRATIC_BIHARMONIC:
+        return np.sqrt(x * x + radius * radius)
+    elif rbf == INV_MULTI_QUADRATIC_BIHARMONIC:
+        return 1.0 / np.sqrt(x * x + radius * radius)
+    elif rbf == BECKERT_WENDLAND_C2_BASIS:
+        v = x / positive_radius
+        return np.where(1.0 - v > 0.0, (1.0 - v) ** 4, 0.0) * (4.0 * v + 1.0)
+    return x.copy()
+
+
+def rotation_search_points(q):
+    """Embed quaternions as the upper triangle of q q^T.
+
+    The squared euclidean distance between two embedded quaternions is
+    2 - 2 (q1 . q2)^2 so it increases with the rotational distance and q and -q map to
+    the same point.
+
+    :param q: Array of quaternions with a last dimension of 4
+    :return: Array of points with a last dimension of 10
+    """
+    x, y, z, w = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    s = math.sqrt(2.0)
+    return np.stack(
+        [x * x, y * y, z * z, w * w, s * x * y, s * x * z, s * x * w, s * y * z]
+        + [s * y * w, s * z * w],
+        axis=-1,
+    )
+
+
+def average_quaternions(quats, weights):
+    """Weighted average of quaternions.
+
+    The plug-in takes the eigenvector of the largest eigenvalue of Q Q^T where Q is the
+    weighted sum of the quaternions.  That matrix has rank one so the eigenvector is the
+    normalized weighted sum, which may differ in sign.
+
+    :param quats: Array of shape (4, count) of the quaternions to average
+    :param weights: Array of shape (frames, count) of the weights of each frame
+    :return: Array of shape (frames, 4) of the averaged quaternions
+    """
+    q = np.einsum("ij,fj->fi", quats, weights)
+    norm = np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.divide(q, norm, out=np.zeros_like(q), where=norm > 0.0)
+
+
+class LinearRegressionSolver(object):
+    """Reference implementation of the solver of a single rotation space.
+
+    With a nearest_count, each frame is solved with a solver built from only the
+    nearest samples of that frame, like the nearestSamples attribute of the node.  The
+    nearest samples are found with a brute force search rather than a kd-tree.
+    """
+
+    def __init__(
+        self,
+        feature_matrix,
+        feature_quats,
+        output_scalars,
+        output_quats=None,
+        rbf=LINEAR,
+        radius=1.0,
+        regularization=0.0,
+        space=SWING_TWIST,
+        nearest_count=0,
+        twist_axes=0,
+    ):
+        """Fit the solver to the sample features.
+
+        :param feature_matrix: Array of shape (samples, input count)
+        :param feature_quats: Array of shape (samples, quat count, 4) of the sample
+            rotations relative to the rest rotations
+        :param output_scalars: Array of shape (samples, output count)
+        :param output_quats: List of (4, samples) arrays, one per output rotation
+        :param rbf: Radial basis function index
+        :param radius: Radius of the radial basis function
+        :param regularization: Regularization added to the system diagonal
+        :param space: SWING, TWIST or SWING_TWIST
+        :param nearest_count: Number of nearest samples to solve each frame with or 0
+            to solve with all the samples
+        :param twist_axes: Twist axis of each input rotation or a single axis for all
+            of them
+        """
+        self.feature_matrix = np.array(feature_matrix, dtype=float)
+        self.feature_quats = np.array(feature_quats, dtype=float)
+        self.output_scalars = np.array(output_scalars, dtype=float)
+        self.output_quats = output_quats or []
+        self.rbf = rbf
+        self.radius = radius
+        self.space = space
+        self.regularization = regularization
+        self.nearest_count = 0
+        self.twist_axes = twist_axes
+        self.theta = None
+
+        sample_count = len(self.feature_matrix) or len(self.feature_quats)
+        if sample_count <= 1:
+            return
+        self.sample_count = sample_count
+        input_count = self.feature_matrix.shape[1] if self.feature_matrix.size else 0
+        quat_count = self.feature_quats.shape[1] if self.feature_quats.size else 0
+
+        if nearest_count > 0 and max(nearest_count, 2) < sample_count:
+            # Scale the input values to a root mean square of 1 over the samples
+            self.nearest_count = max(nearest_count, 2)
+            norms = np.linalg.norm(self.feature_matrix, axis=0)
+            self.search_scale = math.sqrt(sample_count) / np.where(
+                norms != 0.0, norms, 1.0
+            )
+            self.search_points = self._search_points(
+                self.feature_matrix, self.feature_quats
+            )
+            return
+
+        value_cols = sample_count if input_count else 0
+        m = np.zeros((sample_count, value_cols + sample_count * 2 * quat_count))
+
+        self.feature_norms = np.ones(input_count)
+        self.distance_norm = 1.0
+        if input_count:
+            # Normalize each column so each feature is in the same scale
+            norms = np.linalg.norm(self.feature_matrix, axis=0)
+            self.feature_norms = np.where(norms != 0.0, norms, 1.0)
+            self.feature_matrix /= self.feature_norms
+            features = self.feature_matrix
+            m[:, :sample_count] = np.linalg.norm(
+                features[:, np.newaxis, :] - features[np.newaxis, :, :], axis=-1
+            )
+            self.distance_norm = np.linalg.norm(m)
+            m /= self.distance_norm
+            m[:, :sample_count] = apply_rbf(m[:, :sample_count], rbf, radius)
+
+        if quat_count:
+            self.swings, self.twists = decompose_swing_twist(
+                self.feature_quats, self.twist_axes
+            )
+            # (samples, samples, quat count, 2) swing and twist distances
+            distances = np.stack(
+                [
+                    self._distances(self.swings[:, np.newaxis], self.swings, SWING),
+                    self._distances(self.twists[:, np.newaxis], self.twists, TWIST),
+                ],
+                axis=-1,
+            )
+            closest = np.where(distances > 0.000001, distances, 1.0)
+            self.sample_radius = np.minimum(closest.min(axis=(1, 2, 3)), 1.0)
+            radii = self.sample_radius[np.newaxis, :, np.newaxis, np.newaxis] * radius
+            distances = apply_rbf(distances, rbf, radii)
+            # Lay out as the columns of each input rotation, then each sample
+            m[:, value_cols:] = distances.transpose(0, 2, 1, 3).reshape(
+                sample_count, -1
+            )
+
+        # Solve in sample space: m^T (m m^T + r)^-1
+        a = m.dot(m.T) + np.identity(sample_count) * regularization
+        self.theta = np.linalg.lstsq(a, m, rcond=None)[0]
+
+    def _search_points(self, inputs, input_quats):
+        columns = []
+        if self.feature_matrix.size:
+            columns.append(inputs * self.search_scale)
+        if self.feature_quats.size:
+            swing, twist = decompose_swing_twist(input_quats, self.twist_axes)
+            for i in range(input_quats.shape[1]):
+                if self.space != TWIST:
+                    columns.append(rotation_search_points(swing[:, i]))
+                if self.space != SWING:
+                    columns.append(rotation_search_points(twist[:, i]))
+        return np.concatenate(columns, axis=1)
+
+    def _solve_local(self, inputs, input_quats):
+        points = self._search_points(inputs, input_quats)
+        distances = np.sum(
+            (points[:, np.newaxis] - self.search_points[np.newaxis]) ** 2, axis=-1
+        )
+        nearest = np.argsort(distances, axis=1)[:, : self.nearest_count]
+        weights = np.zeros((len(points), self.sample_count))
+        outputs = None
+        if self.output_scalars.size:
+            outputs = np.zeros((len(points), self.output_scalars.shape[1]))
+        for frame, indices in enumerate(nearest):
+            solver = LinearRegressionSolver(
+                self.feature_matrix[indices],
+                self.feature_quats[indices],
+                self.output_scalars[indices],
+                [q[:, indices] for q in self.output_quats],
+                self.rbf,
+                self.radius,
+                self.regularization,
+                self.space,
+                twist_axes=self.twist_axes,
+            )
+            frame_slice = slice(frame, frame + 1)
+            frame_weights, frame_outputs = solver.solve(
+                inputs[frame_slice], input_quats[frame_slice]
+            )
+            weights[frame, indices] = frame_weights[0]
+            if outputs is not None:
+                outputs[frame] = frame_outputs[0]
+        return weights, outputs
+
+    def _distances(self, q1, q2, space):
+        distances = quaternion_distances(q1, q2)
+        if self.space not in (space, SWING_TWIST):
+            distances = np.zeros_like(distances)
+        return distances
+
+    def solve(self, inputs, input_quats):
+        """Evaluate the solver for many frames at once.
+
+        :param inputs: Array of shape (frames, input count)
+        :param input_quats: Array of shape (frames, quat count, 4) of rotations relative
+            to the rest rotations
+        :return: Tuple of the (frames, samples) normalized sample weights and the
+            (frames, output count) output values or (None, None) if the solver has no
+            samples
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        input_quats = np.asarray(input_quats, dtype=float)
+        if self.nearest_count:
+            return self._solve_local(inputs, input_quats)
+        if self.theta is None:
+            return None, None
+        columns = []
+        if self.feature_matrix.size:
+            inputs = inputs / self.feature_norms
+            distances = np.linalg.norm(
+                self.feature_matrix[np.newaxis] - inputs[:, np.newaxis], axis=-1
+            )
+            distances /= self.distance_norm
+            columns.append(apply_rbf(distances, self.rbf, self.radius))
+
+        if self.feature_quats.size:
+            swing, twist = decompose_swing_twist(input_quats, self.twist_axes)
+            frame_count = len(input_quats)
+            distances = np.stack(
+                [
+                    self._distances(swing[:, np.newaxis], self.swings, SWING),
+                    self._distances(twist[:, np.newaxis], self.twists, TWIST),
+                ],
+                axis=-1,
+            )
+            radii = self.sample_radius[np.newaxis, :, np.newaxis, np.newaxis]
+            distances = apply_rbf(distances, self.rbf, radii)
+            columns.append(distances.transpose(0, 2, 1, 3).reshape(frame_count, -1))
+
+        weights = np.concatenate(columns, axis=1).dot(self.theta.T)
+        outputs = weights.dot(self.output_scalars) if self.output_scalars.size else None
+        norm = np.linalg.norm(weights, axis=1, keepdims=True)
+        weights = np.divide(weights, norm, out=np.zeros_like(weights), where=norm > 0.0)
+        return weights, outputs
+
+
+class PoseInterpolator(object):
+    """Reference implementation of the rbf node.
+
+    Samples are split into a solver for each rotation type and the results are combined
+    the same way as the node compute.
+    """
+
+    def __init__(
+        self,
+        samples,
+        rbf=LINEAR,
+        radius=1.0,
+        regularization=0.0,
+        sample_mode=ABSOLUTE,
+        input_rest_quats=None,
+        nearest_count=0,
+        twist_axes=0,
+    ):
+        """Fit the interpolator to a table of samples.
+
+        :param samples: cmt.rig.rbf.Samples or any object with the same fields and
+            array shapes
+        :param rbf: Radial basis function index
+        :param radius: Radius of the radial basis function
+        :param regularization: Regularization added to the system diagonal
+        :param sample_mode: ABSOLUTE or RELATIVE
+        :param input_rest_quats: Array of shape (quat count, 4) of the rest rotations of
+            the input rotations.  Defaults to identity.
+        :param nearest_count: Number of nearest samples to solve each frame with or 0
+            to solve with all the samples
+        :param twist_axes: Twist axis of each input rotation, like the inputTwistAxis
+            attribute of the node, or a single axis for all of them
+        """
+        rotation_types = np.asarray(samples.rotation_types, dtype=int)
+        input_values = np.asarray(samples.input_values, dtype=float)
+        output_values = np.asarray(samples.output_values, dtype=float)
+        input_quats = np.asarray(samples.input_quats, dtype=float)
+        output_quats = np.asarray(samples.output_quats, dtype=float)
+
+        self.sample_mode = sample_mode
+        self.output_count = output_values.shape[1]
+        self.output_quat_count = output_quats.shape[1]
+        quat_count = input_quats.shape[1]
+        if input_rest_quats is None:
+            input_rest_quats = np.tile([0.0, 0.0, 0.0, 1.0], (quat_count, 1))
+        self.input_rest_quats = np.asarray(input_rest_quats, dtype=float)
+        input_quats = self._relative_to_rest(input_quats)
+
+        self.neutral_values = None
+        self.neutral_quats = None
+        self.solvers = []
+        for space in (SWING, TWIST, SWING_TWIST):
+            mask = rotation_types == space
+            outputs = output_values[mask]
+            out_quats = output_quats[mask]
+            if sample_mode == RELATIVE:
+                if self.neutral_values is None and len(outputs) and self.output_count:
+                    self.neutral_values = outputs[0]
+                if self.neutral_values is not None:
+                    outputs = outputs - self.neutral_values
+                has_quats = len(out_quats) and self.output_quat_count
+                if self.neutral_quats is None and has_quats:
+                    self.neutral_quats = out_quats[0]
+                if self.neutral_quats is not None:
+                    out_quats = quaternion_multiply(
+                        quaternion_inverse(self.neutral_quats[0]), out_quats
+                    )
+            self.solvers.append(
+                LinearRegressionSolver(
+                    input_values[mask],
+                    input_quats[mask],
+                    outputs,
+                    [out_quats[:, i].T for i in range(self.output_quat_count)],
+                    rbf,
+                    radius,
+                    regularization,
+                    space,
+                    nearest_count,
+                    twist_axes,
+                )
+            )
+
+    def _relative_to_rest(self, quats):
+        return quaternion_multiply(quats, quaternion_inverse(self.input_rest_quats))
+
+    def evaluate(self, input_values=None, input_quats=None):
+        """Evaluate the interpolator for many frames at once.
+
+        :param input_values: Array of shape (frames, input count)
+        :param input_quats: Array of shape (frames, quat count, 4)
+        :return: Tuple of the (frames, output count) output values and the
+            (frames, output quat count, 4) output rotations
+        """
+        frame_count = len(input_values if input_values is not None else input_quats)
+        if input_values is None:
+            input_values = np.zeros((frame_count, 0))
+        if input_quats is None:
+            input_quats = np.zeros((frame_count, 0, 4))
+        input_quats = self._relative_to_rest(np.asarray(input_quats, dtype=float))
+
+        output_values = np.zeros((frame_count, self.output_count))
+        if self.neutral_values is not None:
+            output_values += self.neutral_values
+
+        relative = self.sample_mode == RELATIVE
+        start = 1 if relative else 0
+        all_weights = [np.zeros((frame_count, 1))] if relative else []
+        all_quats = [[] for _ in range(self.output_quat_count)]
+        for solver in self.solvers:
+            weights, outputs = solver.solve(input_values, input_quats)
+            if outputs is not None:
+                output_values += outputs
+            if len(solver.output_quats) and solver.output_quats[0].shape[1] > 1:
+                for i, quats in enumerate(all_quats):
+                    if relative:
+                        # The node stores the neutral column of the last solver
+                        quats[:1] = [solver.output_quats[i][:, :1]]
+                    quats.append(solver.output_quats[i][:, start:])
+                all_weights.append(weights[:, start:])
+
+        output_quats = np.zeros((frame_count, self.output_quat_count, 4))
+        if self.output_quat_count and all_quats[0]:
+            all_weights = np.concatenate(all_weights, axis=1)
+            if relative:
+                total = all_weights.sum(axis=1)
+                all_weights[:, 0] = np.where(total < 1.0, 1.0 - total, 0.0)
+            norm = np.linalg.norm(all_weights, axis=1, keepdims=True)
+            all_weights = np.divide(
+                all_weights, norm, out=np.zeros_like(all_weights), where=norm > 0.0
+            )
+            for i, quats in enumerate(all_quats):
+                q = average_quaternions(np.concatenate(quats, axis=1), all_weights)
+                if self.neutral_quats is not None:
+                    q = quaternion_multiply(self.neutral_quats[i], q)
+                output_quats[:, i] = q
+        return output_values, output_quats
@@ -0,0 +1,98 @@
+/**
+  Compares the time it takes the rbf LinearRegressionSolver to build its coefficients with each
+  of the available decompositions.
+
+  Build with -DCMT_BUILD_BENCHMARKS=ON and run rbfSolverBenchmark [repetitions]
+*/
+#include <chrono>
+#include <cstdlib>
+#include <iomanip>
+#include <iostream>
+#include <random>
+
+#include "linearRegressionSolver.h"
+
+namespace {
+
+struct Features {
+  MatrixXd inputs;
+  std::vector<QuaternionArray> inputQuats;
+  MatrixXd outputs;
+  std::vector<MatrixXd> outputQuats;
+};
+
+Quaterniond randomQuaternion(std::mt19937& generator) {
+  std::normal_distribution<double> distribution;
+  Eigen::Vector4d coeffs;
+  for (int i = 0; i < 4; ++i) {
+    coeffs[i] = distribution(generator);
+  }
+  return Quaterniond(coeffs.normalized());
+}
+
+Features randomFeatures(int sampleCount, std::mt19937& generator) {
+  // Two scalar inputs, one input rotation, three scalar outputs and one output rotation per sample
+  Features features;
+  features.inputs = MatrixXd::Random(sampleCount, 2);
+  features.outputs = MatrixXd::Random(sampleCount, 3);
+  features.outputQuats.push_back(MatrixXd::Zero(4, sampleCount));
+  for (int i = 0; i < sampleCount; ++i) {
+    features.inputQuats.push_back({randomQuaternion(generator)});
+    features.outputQuats[0].col(i) = randomQuaternion(generator).coeffs();
+  }
+  return features;
+}
+
+double buildTime(const Features& features, Decomposition decomposition, int repetitions,
+                 LinearRegressionSolver& solver) {
+  auto start = std::chrono::steady_clock::now();
+  for (int i = 0; i < repetitions; ++i) {
+    // A new solver each time so no cached distances are reused
+    solver = LinearRegressionSolver();
+    solver.setFeatures(features.inputs, features.inputQuats, features.outputs,
+                       features.outputQuats, 1, 1.0, 0.001, SolverSpace::SwingTwist,
+                       decomposition);
+  }
+  std::chrono::duration<double, std::milli> elapsed = std::chrono::steady_clock::now() - start;
+  return elapsed.count() / repetitions;
+}
+
+}  // namespace
+
+int main(int argc, char* argv[]) {
+  int repetitions = argc > 1 ? std::max(1, std::atoi(argv[1])) : 3;
+  const Decomposition decompositions[] = {Decomposition::JacobiSVD, Decomposition::LDLT,
+                                          Decomposition::BDCSVD,
+                                          Decomposition::CompleteOrthogonal};
+  const char* names[] = {"jacobi svd", "ldlt", "bdc svd", "complete orthogonal"};
+  std::mt19937 generator(0);
+
+  std::cout << std::setw(8) << "samples" << std::setw(22) << "decomposition" << std::setw(14)
+            << "build (ms)" << std::setw(16) << "max weight err" << std::endl;
+  for (int sampleCount : {50, 200, 1000}) {
+    Features features = randomFeatures(sampleCount, generator);
+    VectorXd inputs = VectorXd::Random(2);
+    QuaternionArray inputQuats = {randomQuaternion(generator)};
+
+    VectorXd referenceWeights;
+    for (int i = 0; i < 4; ++i) {
+      LinearRegressionSolver solver;
+      double ms = buildTime(features, decompositions[i], repetitions, solver);
+
+      // Compare the solved weights against the JacobiSVD solution
+      VectorXd outputs;
+      MatrixXd outputQuats;
+      VectorXd weights(solver.weightCount());
+      LinearRegressionSolver::Scratch scratch;
+      solver.solve(inputs, inputQuats, weights, outputs, outputQuats, scratch);
+      if (i == 0) {
+        referenceWeights = weights;
+      }
+      std::cout << std::setw(8) << sampleCount << std::setw(22) << names[i] << std::setw(14)
+                << std::fixed << std::setprecision(2) << ms << std::setw(16) << std::scientific
+                << std::setprecision(2) << (weights - referenceWeights).cwiseAbs().maxCoeff()
+                << std::endl;
+    }
+  }
+  return 0;
+}
@@ -0,0 +1,364 @@
+#include "dgeNode.h"
+
+#include <maya/MArrayDataHandle.h>
+#include <maya/MFnDoubleArrayData.h>
+#include <maya/MFnIntArrayData.h>
+#include <maya/MFnMatrixAttribute.h>
+#include <maya/MFnNumericAttribute.h>
+#include <maya/MFnTypedAttribute.h>
+#include <maya/MGlobal.h>
+#include <maya/MPlugArray.h>
+
+#include <algorithm>
+#include <cmath>
+
+MTypeId DGENode::id(0x0011581C);
+MObject DGENode::aOutput;
+MObject DGENode::aInputs;
+MObject DGENode::aInputMatrices;
+MObject DGENode::aProgram;
+MObject DGENode::aConstants;
+
+const MString DGENode::kName("dge");
+
+namespace {
+
+const double kRadiansToDegrees = 180.0 / M_PI;
+
+// Number of values each op pops from the stack and the number of immediate arguments
+// following the op in the program.
+struct OpInfo {
+  int pops;
+  int args;
+};
+
+const OpInfo kOpInfo[] = {
+    {0, 1},  // Constant
+    {0, 1},  // Input
+    {2, 0},  // Add
+    {2, 0},  // Subtract
+    {2, 0},  // Multiply
+    {2, 0},  // Divide
+    {2, 0},  // Pow
+    {1, 0},  // Negate
+    {4, 1},  // Condition
+    {1, 0},  // Abs
+    {1, 0},  // Exp
+    {3, 0},  // Clamp
+    {3, 0},  // Lerp
+    {2, 0},  // Min
+    {2, 0},  // Max
+    {1, 0},  // Sqrt
+    {1, 0},  // Cos
+    {1, 0},  // Sin
+    {1, 0},  // Tan
+    {1, 0},  // Acos
+    {1, 0},  // Asin
+    {1, 0},  // Atan
+    {0, 2},  // Distance
+};
+
+bool compare(int operation, double a, double b) {
+  switch (operation) {
+    case 0:
+      return a == b;
+    case 1:
+      return a != b;
+    case 2:
+      return a > b;
+    case 3:
+      return a >= b;
+    case 4:
+      return a < b;
+    case 5:
+      return a <= b;
+  }
+  return false;
+}
+
+}  // namespace
+
+MStatus DGENode::initialize() {
+  MStatus status;
+
+  MFnMatrixAttribute mAttr;
+  MFnNumericAttribute nAttr;
+  MFnTypedAttribute tAttr;
+
+  aOutput = nAttr.create("output", "output", MFnNumericData::kDouble);
+  nAttr.setWritable(false);
+  nAttr.setStorable(false);
+  addAttribute(aOutput);
+
+  aInputs = nAttr.create("input", "input", MFnNumericData::kDouble);
+  nAttr.setKeyable(true);
+  nAttr.setArray(true);
+  nAttr.setUsesArrayDataBuilder(true);
+  addAttribute(aInputs);
+  attributeAffects(aInputs, aOutput);
+
+  aInputMatrices = mAttr.create("inputMatrix", "inputMatrix");
+  mAttr.setArray(true);
+  mAttr.setUsesArrayDataBuilder(true);
+  addAttribute(aInputMatrices);
+  attributeAffects(aInputMatrices, aOutput);
+
+  MFnIntArrayData fnIntArrayData;
+  MObject oDefaultProgram = fnIntArrayData.create(&status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  aProgram = tAttr.create("program", "program", MFnData::kIntArray, oDefaultProgram);
+  addAttribute(aProgram);
+  attributeAffects(aProgram, aOutput);
+
+  MFnDoubleArrayData fnDoubleArrayData;
+  MObject oDefaultConstants = fnDoubleArrayData.create(&status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  aConstants = tAttr.create("constant", "constant", MFnData::kDoubleArray, oDefaultConstants);
+  addAttribute(aConstants);
+  attributeAffects(aConstants, aOutput);
+
+  return MS::kSuccess;
+}
+
+void* DGENode::creator() { return new DGENode(); }
+
+DGENode::DGENode() : dirty_(true), valid_(false) {}
+
+DGENode::~DGENode() {}
+
+MStatus DGENode::setDependentsDirty(const MPlug& plug, MPlugArray& affectedPlugs) {
+  if (plug == aProgram || plug == aConstants) {
+    dirty_ = true;
+  }
+  return MPxNode::setDependentsDirty(plug, affectedPlugs);
+}
+
+MStatus DGENode::compute(const MPlug& plug, MDataBlock& data) {
+  MStatus status;
+
+  if (plug != aOutput) {
+    return MS::kUnknownParameter;
+  }
+
+  if (dirty_) {
+    status = buildProgram(data);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    dirty_ = false;
+  }
+
+  // Gather the inputs.  The arrays can be sparse so missing elements are treated as 0.
+  std::fill(inputs_.begin(), inputs_.end(), 0.0);
+  MArrayDataHandle hInputs = data.inputArrayValue(aInputs);
+  unsigned int count = hInputs.elementCount();
+  for (unsigned int i = 0; i < count; ++i, hInputs.next()) {
+    unsigned int index = hInputs.elementIndex();
+    if (index < inputs_.size()) {
+      inputs_[index] = hInputs.inputValue().asDouble();
+    }
+  }
+
+  std::fill(inputMatrices_.begin(), inputMatrices_.end(), MMatrix::identity);
+  MArrayDataHandle hInputMatrices = data.inputArrayValue(aInputMatrices);
+  count = hInputMatrices.elementCount();
+  for (unsigned int i = 0; i < count; ++i, hInputMatrices.next()) {
+    unsigned int index = hInputMatrices.elementIndex();
+    if (index < inputMatrices_.size()) {
+      inputMatrices_[index] = hInputMatrices.inputValue().asMatrix();
+    }
+  }
+
+  MDataHandle hOutput = data.outputValue(aOutput);
+  hOutput.setDouble(valid_ ? evaluate() : 0.0);
+  hOutput.setClean();
+
+  return MS::kSuccess;
+}
+
+MStatus DGENode::buildProgram(MDataBlock& data) {
+  MStatus status;
+  valid_ = false;
+  program_.clear();
+  constants_.clear();
+
+  MFnIntArrayData fnProgram(data.inputValue(aProgram).data(), &status);
+  if (!MFAIL(status)) {
+    MIntArray program = fnProgram.array();
+    program_.resize(program.length());
+    for (unsigned int i = 0; i < program.length(); ++i) {
+      program_[i] = program[i];
+    }
+  }
+
+  MFnDoubleArrayData fnConstants(data.inputValue(aConstants).data(), &status);
+  if (!MFAIL(status)) {
+    MDoubleArray constants = fnConstants.array();
+    constants_.resize(constants.length());
+    for (unsigned int i = 0; i < constants.length(); ++i) {
+      constants_[i] = constants[i];
+    }
+  }
+
+  if (program_.empty()) {
+    return MS::kSuccess;
+  }
+
+  // Validate the program up front so evaluation does not need any bounds checking
+  int depth = 0;
+  int maxDepth = 0;
+  int inputCount = 0;
+  int matrixCount = 0;
+  size_t pc = 0;
+  while (pc < program_.size()) {
+    int op = program_[pc++];
+    if (op < 0 || op >= static_cast<int>(DGEOp::Count)) {
+      MString message("Invalid dge opcode ");
+      message += op;
+      MGlobal::displayError(message);
+      return MS::kSuccess;
+    }
+    const OpInfo& info = kOpInfo[op];
+    if (pc + info.args > program_.size() || depth < info.pops) {
+      MGlobal::displayError("Invalid dge program");
+      return MS::kSuccess;
+    }
+    switch (static_cast<DGEOp>(op)) {
+      case DGEOp::Constant:
+        if (program_[pc] < 0 || program_[pc] >= static_cast<int>(constants_.size())) {
+          MGlobal::displayError("Invalid dge constant index");
+          return MS::kSuccess;
+        }
+        break;
+      case DGEOp::Input:
+        inputCount = std::max(inputCount, program_[pc] + 1);
+        break;
+      case DGEOp::Distance:
+        matrixCount = std::max(matrixCount, std::max(program_[pc], program_[pc + 1]) + 1);
+        break;
+      default:
+        break;
+    }
+    for (int i = 0; i < info.args; ++i) {
+      if (program_[pc + i] < 0) {
+        MGlobal::displayError("Invalid dge program argument");
+        return MS::kSuccess;
+      }
+    }
+    pc += info.args;
+    depth = depth - info.pops + 1;
+    maxDepth = std::max(maxDepth, depth);
+  }
+  if (depth != 1) {
+    MGlobal::displayError("Invalid dge program");
+    return MS::kSuccess;
+  }
+
+  inputs_.resize(inputCount);
+  inputMatrices_.resize(matrixCount);
+  stack_.resize(maxDepth);
+  valid_ = true;
+  return MS::kSuccess;
+}
+
+double DGENode::evaluate() {
+  // The trigonometric functions match the semantics of the vanilla node networks:
+  // sin/cos/tan take radians while the inverse functions return degrees.
+  double* top = stack_.data() - 1;
+  const int* pc = program_.data();
+  const int* end = pc + program_.size();
+  while (pc < end) {
+    DGEOp op = static_cast<DGEOp>(*pc++);
+    switch (op) {
+      case DGEOp::Constant:
+        *(++top) = constants_[*pc++];
+        break;
+      case DGEOp::Input:
+        *(++top) = inputs_[*pc++];
+        break;
+      case DGEOp::Add:
+        --top;
+        top[0] += top[1];
+        break;
+      case DGEOp::Subtract:
+        --top;
+        top[0] -= top[1];
+        break;
+      case DGEOp::Multiply:
+        --top;
+        top[0] *= top[1];
+        break;
+      case DGEOp::Divide:
+        --top;
+        top[0] /= top[1];
+        break;
+      case DGEOp::Pow:
+        --top;
+        top[0] = std::pow(top[0], top[1]);
+        break;
+      case DGEOp::Negate:
+        top[0] = -top[0];
+        break;
+      case DGEOp::Condition: {
+        // Stack: first term, second term, if true, if false
+        top -= 3;
+        top[0] = compare(*pc++, top[0], top[1]) ? top[2] : top[3];
+        break;
+      }
+      case DGEOp::Abs:
+        top[0] = std::fabs(top[0]);
+        break;
+      case DGEOp::Exp:
+        top[0] = std::exp(top[0]);
+        break;
+      case DGEOp::Clamp:
+        top -= 2;
+        top[0] = std::min(std::max(top[0], top[1]), top[2]);
+        break;
+      case DGEOp::Lerp:
+        top -= 2;
+        top[0] = top[0] + (top[1] - top[0]) * top[2];
+        break;
+      case DGEOp::Min:
+        --top;
+        top[0] = std::min(top[0], top[1]);
+        break;
+      case DGEOp::Max:
+        --top;
+        top[0] = std::max(top[0], top[1]);
+        break;
+      case DGEOp::Sqrt:
+        top[0] = std::sqrt(top[0]);
+        break;
+      case DGEOp::Cos:
+        top[0] = std::cos(top[0]);
+        break;
+      case DGEOp::Sin:
+        top[0] = std::sin(top[0]);
+        break;
+      case DGEOp::Tan:
+        top[0] = std::tan(top[0]);
+        break;
+      case DGEOp::Acos:
+        top[0] = std::acos(std::min(std::max(top[0], -1.0), 1.0)) * kRadiansToDegrees;
+        break;
+      case DGEOp::Asin:
+        top[0] = std::asin(std::min(std::max(top[0], -1.0), 1.0)) * kRadiansToDegrees;
+        break;
+      case DGEOp::Atan:
+        top[0] = std::atan(top[0]) * kRadiansToDegrees;
+        break;
+      case DGEOp::Distance: {
+        const MMatrix& m1 = inputMatrices_[pc[0]];
+        const MMatrix& m2 = inputMatrices_[pc[1]];
+        pc += 2;
+        double x = m1[3][0] - m2[3][0];
+        double y = m1[3][1] - m2[3][1];
+        double z = m1[3][2] - m2[3][2];
+        *(++top) = std::sqrt(x * x + y * y + z * z);
+        break;
+      }
+      default:
+        break;
+    }
+  }
+  return stack_[0];
+}
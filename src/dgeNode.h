@@ -0,0 +1,78 @@
+#ifndef CMT_DGENODE_H
+#define CMT_DGENODE_H
+
+#include <maya/MMatrix.h>
+#include <maya/MPxNode.h>
+
+#include <vector>
+
+/**
+  Opcodes of the compiled dge expression program.  These values are mirrored in
+  cmt.dge.OPCODES so any change here needs to be made there as well.
+*/
+enum class DGEOp {
+  Constant = 0,  // Push constant[arg]
+  Input = 1,     // Push input[arg]
+  Add = 2,
+  Subtract = 3,
+  Multiply = 4,
+  Divide = 5,
+  Pow = 6,
+  Negate = 7,
+  Condition = 8,  // arg is the comparison operation (==, !=, >, >=, <, <=)
+  Abs = 9,
+  Exp = 10,
+  Clamp = 11,
+  Lerp = 12,
+  Min = 13,
+  Max = 14,
+  Sqrt = 15,
+  Cos = 16,
+  Sin = 17,
+  Tan = 18,
+  Acos = 19,
+  Asin = 20,
+  Atan = 21,
+  Distance = 22,  // Two args: the indices of the input matrices
+  Count
+};
+
+/**
+  Evaluates a dge expression that has been compiled to a postfix program.
+
+  Rather than generating a node network of vanilla Maya nodes, cmt.dge can compile an
+  expression to a list of opcodes that are evaluated with a small stack machine in a
+  single compute.
+*/
+class DGENode : public MPxNode {
+ public:
+  DGENode();
+  virtual ~DGENode();
+  static void* creator();
+
+  virtual MStatus setDependentsDirty(const MPlug& plug, MPlugArray& affectedPlugs) override;
+  virtual MStatus compute(const MPlug& plug, MDataBlock& data) override;
+
+  static MStatus initialize();
+  static MTypeId id;
+  static const MString kName;
+  static MObject aOutput;
+  static MObject aInputs;
+  static MObject aInputMatrices;
+  static MObject aProgram;
+  static MObject aConstants;
+
+ private:
+  MStatus buildProgram(MDataBlock& data);
+  double evaluate();
+
+  bool dirty_;
+  bool valid_;
+  std::vector<int> program_;
+  std::vector<double> constants_;
+  std::vector<double> inputs_;
+  std::vector<MMatrix> inputMatrices_;
+  std::vector<double> stack_;
+};
+
+#endif
@@ -0,0 +1,85 @@
+#include "kdTree.h"
+
+#include <algorithm>
+#include <numeric>
+
+KDTree::KDTree() : root_(-1) {}
+
+void KDTree::build(const Eigen::MatrixXd& points) {
+  points_ = points;
+  nodes_.clear();
+  nodes_.reserve(points_.cols());
+  std::vector<int> indices(points_.cols());
+  std::iota(indices.begin(), indices.end(), 0);
+  root_ = build(indices.begin(), indices.end());
+}
+
+int KDTree::build(std::vector<int>::iterator begin, std::vector<int>::iterator end) {
+  if (begin == end) {
+    return -1;
+  }
+  // Split along the dimension with the largest spread
+  Eigen::VectorXd minimum = points_.col(*begin);
+  Eigen::VectorXd maximum = minimum;
+  for (auto it = begin + 1; it != end; ++it) {
+    minimum = minimum.cwiseMin(points_.col(*it));
+    maximum = maximum.cwiseMax(points_.col(*it));
+  }
+  int axis = 0;
+  if (points_.rows()) {
+    (maximum - minimum).maxCoeff(&axis);
+  }
+
+  auto median = begin + (end - begin) / 2;
+  std::nth_element(begin, median, end,
+                   [&](int a, int b) { return points_(axis, a) < points_(axis, b); });
+
+  int node = static_cast<int>(nodes_.size());
+  nodes_.push_back({*median, axis, -1, -1});
+  int left = build(begin, median);
+  int right = build(median + 1, end);
+  nodes_[node].left = left;
+  nodes_[node].right = right;
+  return node;
+}
+
+std::vector<int> KDTree::nearest(const Eigen::VectorXd& point, int count) const {
+  // Max heap of the nearest points found so far
+  std::vector<Neighbor> neighbors;
+  neighbors.reserve(count + 1);
+  if (count > 0) {
+    search(root_, point, count, neighbors);
+  }
+  std::sort_heap(neighbors.begin(), neighbors.end());
+  std::vector<int> indices(neighbors.size());
+  for (size_t i = 0; i < neighbors.size(); ++i) {
+    indices[i] = neighbors[i].second;
+  }
+  return indices;
+}
+
+void KDTree::search(int node, const Eigen::VectorXd& point, int count,
+                    std::vector<Neighbor>& neighbors) const {
+  if (node == -1) {
+    return;
+  }
+  const Node& n = nodes_[node];
+  double distance = (points_.col(n.index) - point).squaredNorm();
+  if (static_cast<int>(neighbors.size()) < count) {
+    neighbors.push_back(Neighbor(distance, n.index));
+    std::push_heap(neighbors.begin(), neighbors.end());
+  } else if (distance < neighbors.front().first) {
+    std::pop_heap(neighbors.begin(), neighbors.end());
+    neighbors.back() = Neighbor(distance, n.index);
+    std::push_heap(neighbors.begin(), neighbors.end());
+  }
+
+  double offset = points_.rows() ? point[n.axis] - points_(n.axis, n.index) : 0.0;
+  int nearSide = offset < 0.0 ? n.left : n.right;
+  int farSide = offset < 0.0 ? n.right : n.left;
+  search(nearSide, point, count, neighbors);
+  // Only visit the other side if it can contain a closer point than the ones already found
+  if (static_cast<int>(neighbors.size()) < count || offset * offset < neighbors.front().first) {
+    search(farSide, point, count, neighbors);
+  }
+}
@@ -0,0 +1,51 @@
+#ifndef CMT_KDTREE_H
+#define CMT_KDTREE_H
+
+#include <Eigen/Dense>
+
+#include <vector>
+
+/**
+  Kd-tree used to find the nearest neighbors of a point in a static set of points.
+
+  The tree does not depend on Maya so it can be used by the standalone rbf solver.
+*/
+class KDTree {
+ public:
+  KDTree();
+
+  /**
+    Build the tree.
+    @param[in] points Matrix with one column per point.
+  */
+  void build(const Eigen::MatrixXd& points);
+
+  /**
+    Find the nearest points to the given point.
+    @param[in] point The point to search around.
+    @param[in] count The number of points to find.
+    @return The indices of the nearest points sorted from nearest to farthest.
+  */
+  std::vector<int> nearest(const Eigen::VectorXd& point, int count) const;
+
+  int size() const { return static_cast<int>(points_.cols()); }
+
+ private:
+  struct Node {
+    int index;
+    int axis;
+    int left;
+    int right;
+  };
+  typedef std::pair<double, int> Neighbor;
+
+  int build(std::vector<int>::iterator begin, std::vector<int>::iterator end);
+  void search(int node, const Eigen::VectorXd& point, int count,
+              std::vector<Neighbor>& neighbors) const;
+
+  Eigen::MatrixXd points_;
+  std::vector<Node> nodes_;
+  int root_;
+};
+
+#endif
@@ -1,48 +1,118 @@
 #include "linearRegressionSolver.h"
 
-#include <maya/MAngle.h>
-#include <maya/MEulerRotation.h>
-#include <maya/MEvaluationNode.h>
-#include <maya/MFnCompoundAttribute.h>
-#include <maya/MFnEnumAttribute.h>
-#include <maya/MFnGenericAttribute.h>
-#include <maya/MFnNumericAttribute.h>
-#include <maya/MFnNumericData.h>
-#include <maya/MFnUnitAttribute.h>
-#include <maya/MQuaternion.h>
+#include <algorithm>
+#include <cmath>
 
-#include "common.h"
+static bool sameQuaternions(const QuaternionArray& a, const QuaternionArray& b) {
+  if (a.size() != b.size()) {
+    return false;
+  }
+  for (size_t i = 0; i < a.size(); ++i) {
+    if (a[i].coeffs() != b[i].coeffs()) {
+      return false;
+    }
+  }
+  return true;
+}
+
+LinearRegressionSolver::LinearRegressionSolver()
+    : distanceNorm_(1.0),
+      rbf_(0),
+      radius_(1.0),
+      solverSpace_(SolverSpace::SwingTwist),
+      nearestCount_(0),
+      regularization_(0.0),
+      decomposition_(Decomposition::JacobiSVD) {}
 
-LinearRegressionSolver::LinearRegressionSolver() {}
+// Embeds a unit quaternion as the upper triangle of q q^T.  The squared euclidean distance
+// between two embedded quaternions is 2 - 2 (q1 . q2)^2 so it increases with the rotational
+// distance and q and -q map to the same point.
+static void rotationSearchPoint(const Quaterniond& q, double* point) {
+  static const double kSqrt2 = std::sqrt(2.0);
+  point[0] = q.x() * q.x();
+  point[1] = q.y() * q.y();
+  point[2] = q.z() * q.z();
+  point[3] = q.w() * q.w();
+  point[4] = kSqrt2 * q.x() * q.y();
+  point[5] = kSqrt2 * q.x() * q.z();
+  point[6] = kSqrt2 * q.x() * q.w();
+  point[7] = kSqrt2 * q.y() * q.z();
+  point[8] = kSqrt2 * q.y() * q.w();
+  point[9] = kSqrt2 * q.z() * q.w();
+}
 
 LinearRegressionSolver::~LinearRegressionSolver() {}
 
 void LinearRegressionSolver::setFeatures(
-    const MatrixXd& featureMatrix, const std::vector<std::vector<MQuaternion>>& featureQuatMatrix,
+    const MatrixXd& featureMatrix, const std::vector<QuaternionArray>& featureQuatMatrix,
     const MatrixXd& outputScalarMatrix, const std::vector<MatrixXd>& outputQuats, short rbf,
-    double radius, double regularization, SolverSpace space) {
+    double radius, double regularization, SolverSpace space, Decomposition decomposition,
+    int nearestCount, const std::vector<int>& twistAxes, const SolverSolution* solution) {
+  // Find the samples that were part of the previous build before the cached features are replaced
+  // so editing, adding or removing a single sample only computes the rotational distances of that
+  // sample.  The cached distances depend on the twist axes so they are only reused if those are
+  // unchanged.
+  std::vector<int> cachedIndex(featureQuatMatrix.size(), -1);
+  if (space == solverSpace_ && twistAxes == twistAxes_) {
+    cachedIndex = matchCachedSamples(featureQuatMatrix);
+  }
   featureMatrix_ = featureMatrix;
   featureQuatMatrix_ = featureQuatMatrix;
+  twistAxes_ = twistAxes;
   outputScalarMatrix_ = outputScalarMatrix;
   outputQuats_ = outputQuats;
   rbf_ = rbf;
   radius_ = radius;
   solverSpace_ = space;
+  regularization_ = regularization;
+  decomposition_ = decomposition;
+  nearestCount_ = 0;
 
   int sampleCount = featureMatrix_.rows() ? featureMatrix_.rows() : featureQuatMatrix_.size();
   if (sampleCount <= 1) {
     theta_.resize(0, 0);
+    quatDistances_.clear();
     return;
   }
   int inputCount = featureMatrix_.cols();
   int inputQuatCount = featureQuatMatrix.size() ? featureQuatMatrix_[0].size() : 0;
+
+  if (nearestCount > 0 && std::max(nearestCount, 2) < sampleCount) {
+    // Local mode: index the samples so solve can fit the system of the nearest samples.
+    // Scale the input values so each one has a root mean square of 1 over the samples, which
+    // puts them on a similar scale to the rotation distances.
+    nearestCount_ = std::max(nearestCount, 2);
+    theta_.resize(0, 0);
+    quatDistances_.clear();
+    searchScale_ = VectorXd::Constant(inputCount, std::sqrt(static_cast<double>(sampleCount)));
+    for (int i = 0; i < inputCount; ++i) {
+      double norm = featureMatrix_.col(i).norm();
+      if (norm != 0.0) {
+        searchScale_[i] /= norm;
+      }
+    }
+    int rotationCount = solverSpace_ == SolverSpace::SwingTwist ? 2 : 1;
+    MatrixXd points(inputCount + inputQuatCount * rotationCount * 10, sampleCount);
+    VectorXd inputs;
+    QuaternionArray inputQuats;
+    for (int s = 0; s < sampleCount; ++s) {
+      if (inputCount) {
+        inputs = featureMatrix_.row(s).transpose();
+      }
+      if (inputQuatCount) {
+        inputQuats = featureQuatMatrix_[s];
+      }
+      points.col(s) = searchPoint(inputs, inputQuats);
+    }
+    searchTree_.build(points);
+    return;
+  }
+
   int valueCols = inputCount ? sampleCount : 0;
   // We will append the swing and twist distances for each input rotation
   // to the distance matrix
   int cols = valueCols + sampleCount * 2 * inputQuatCount;
 
-  MatrixXd m = MatrixXd::Zero(sampleCount, cols);
-
   if (inputCount) {
     featureNorms_.resize(inputCount);
     // Normalize each column so each feature is in the same scale
@@ -52,7 +122,39 @@ void LinearRegressionSolver::setFeatures(
         featureMatrix_.col(i) /= featureNorms_[i];
       }
     }
+  }
+
+  if (inputQuatCount) {
+    // Decompose the sample rotations once so the distance calculations here and in solve only
+    // need to decompose the input rotations
+    featureSwings_.resize(inputQuatCount);
+    featureTwists_.resize(inputQuatCount);
+    for (int i = 0; i < inputQuatCount; ++i) {
+      featureSwings_[i].resize(4, sampleCount);
+      featureTwists_[i].resize(4, sampleCount);
+      Quaterniond swing, twist;
+      for (int s = 0; s < sampleCount; ++s) {
+        decomposeSwingTwist(featureQuatMatrix_[s][i], swing, twist, twistAxis(i));
+        featureSwings_[i].col(s) = swing.coeffs();
+        featureTwists_[i].col(s) = twist.coeffs();
+      }
+    }
+  }
 
+  if (solution && solution->theta.rows() == sampleCount && solution->theta.cols() == cols &&
+      (inputQuatCount == 0 || solution->sampleRadius.size() == sampleCount)) {
+    // The caller guarantees the solution was solved from the same sample inputs and settings so
+    // the distance matrix does not need to be built
+    theta_ = solution->theta;
+    sampleRadius_ = solution->sampleRadius;
+    distanceNorm_ = solution->distanceNorm;
+    quatDistances_.clear();
+    return;
+  }
+
+  MatrixXd m = MatrixXd::Zero(sampleCount, cols);
+
+  if (inputCount) {
     for (int i = 0; i < sampleCount; ++i) {
       m.col(i) = (featureMatrix_.rowwise() - featureMatrix_.row(i)).matrix().rowwise().norm();
     }
@@ -71,40 +173,51 @@ void LinearRegressionSolver::setFeatures(
     }
     sampleRadius_ = VectorXd::Ones(sampleCount);
 
-    // Calculate rotation distances
-    double minFalloff = std::numeric_limits<double>::max();
-    double swingDistance, twistDistance;
-    for (int s1 = 0; s1 < sampleCount; ++s1) {
-      for (int s2 = 0; s2 < sampleCount; ++s2) {
-        for (int i = 0; i < inputQuatCount; ++i) {
-          MQuaternion& q1 = featureQuatMatrix_[s1][i];
-          MQuaternion& q2 = featureQuatMatrix_[s2][i];
-          swingTwistDistance(q1, q2, swingDistance, twistDistance);
-          if (solverSpace_ == SolverSpace::Swing) {
-            twistDistance = 0.0;
-          } else if (solverSpace_ == SolverSpace::Twist) {
-            swingDistance = 0.0;
-          }
-          // TODO: Each feature quat should have it's own radius
-          if (swingDistance > 0.000001 && swingDistance < sampleRadius_[s1]) {
-            sampleRadius_[s1] = swingDistance;
-          }
-          if (twistDistance > 0.000001 && twistDistance < sampleRadius_[s1]) {
-            sampleRadius_[s1] = twistDistance;
+    // Calculate rotation distances.  Each rotation distance matrix interleaves the swing and
+    // twist distance columns of each sample.
+    for (int i = 0; i < inputQuatCount; ++i) {
+      DistanceMap swingDistances(mQuat[i].data(), sampleCount, sampleCount,
+                                 Eigen::OuterStride<>(sampleCount * 2));
+      DistanceMap twistDistances(mQuat[i].data() + sampleCount, sampleCount, sampleCount,
+                                 Eigen::OuterStride<>(sampleCount * 2));
+      for (int s1 = 0; s1 < sampleCount; ++s1) {
+        int c1 = cachedIndex[s1];
+        if (c1 == -1) {
+          continue;
+        }
+        for (int s2 = 0; s2 < sampleCount; ++s2) {
+          int c2 = cachedIndex[s2];
+          if (c2 != -1) {
+            mQuat[i](s1, s2 * 2) = quatDistances_[i](c1, c2 * 2);
+            mQuat[i](s1, s2 * 2 + 1) = quatDistances_[i](c1, c2 * 2 + 1);
           }
-          /*
-          double _r = 57.2958;
-          auto e1 = q1.asEulerRotation();
-          auto e2 = q2.asEulerRotation();
-          std::cout << s1 << ": (" << e1.x * _r << ", " << e1.y * _r << ", " << e1.z * _r
-                    << ") <==> (" << e2.x * _r << ", " << e2.y * _r << ", " << e2.z * _r
-                    << ") s : " << swingDistance << " t : " << twistDistance << std::endl;*/
-
-          mQuat[i](s1, s2 * 2) = swingDistance;
-          mQuat[i](s1, s2 * 2 + 1) = twistDistance;
         }
       }
+      // The distances are symmetric so new or edited samples fill in both their row and column
+      for (int s = 0; s < sampleCount; ++s) {
+        if (cachedIndex[s] != -1) {
+          continue;
+        }
+        Eigen::ArrayXd swing = quaternionDistances(featureSwings_[i], featureSwings_[i].col(s));
+        Eigen::ArrayXd twist = quaternionDistances(featureTwists_[i], featureTwists_[i].col(s));
+        if (solverSpace_ == SolverSpace::Swing) {
+          twist.setZero();
+        } else if (solverSpace_ == SolverSpace::Twist) {
+          swing.setZero();
+        }
+        swingDistances.row(s) = swing.transpose();
+        swingDistances.col(s) = swing;
+        twistDistances.row(s) = twist.transpose();
+        twistDistances.col(s) = twist;
+      }
+
+      // TODO: Each feature quat should have it's own radius
+      Eigen::ArrayXd closest =
+          (mQuat[i].array() > 0.000001).select(mQuat[i].array(), 1.0).rowwise().minCoeff();
+      sampleRadius_ = sampleRadius_.array().min(closest).matrix();
     }
+    quatDistances_ = mQuat;
+
     // Insert rotational distances to main distance matrix
     int quatIndex = 0;
     for (auto& rd : mQuat) {
@@ -121,36 +234,67 @@ void LinearRegressionSolver::setFeatures(
 
   // Rather than solve directly to the output values, we will store 0 or 1 pose values.
   // This lets us calculate the output as a linear combination of the sample outputs and
-  // will make it easier to calculate output quaternions
-  MatrixXd outputMatrix = MatrixXd::Identity(sampleCount, sampleCount);
-  MatrixXd r = MatrixXd::Zero(cols, cols);
+  // will make it easier to calculate output quaternions.
+  // The regularized least squares solution (m^T m + r)^-1 m^T is equal to m^T (m m^T + r)^-1 so
+  // solve the system in sample space.  With rotation inputs m has 2 columns per sample for every
+  // input rotation so this is a much smaller system to factorize each time a sample is edited.
+  MatrixXd r = MatrixXd::Zero(sampleCount, sampleCount);
   r.diagonal().array() = regularization;
 
-  MatrixXd tm = m.transpose();
-  MatrixXd mat = pseudoInverse(tm * m + r) * tm;
-  theta_ = (mat * outputMatrix).transpose();
+  theta_ = solveSymmetric(m * m.transpose() + r, m, decomposition);
 }
 
-VectorXd LinearRegressionSolver::solve(const VectorXd& inputValues,
-                                       const std::vector<MQuaternion>& inputQuats,
-                                       VectorXd& outputs, MatrixXd& outputQuats) {
-  int sampleCount = featureMatrix_.rows() ? featureMatrix_.rows() : featureQuatMatrix_.size();
-  if (sampleCount <= 1) {
-    return VectorXd();
+std::vector<int> LinearRegressionSolver::matchCachedSamples(
+    const std::vector<QuaternionArray>& featureQuatMatrix) const {
+  std::vector<int> cachedIndex(featureQuatMatrix.size(), -1);
+  int cachedCount = quatDistances_.size() ? static_cast<int>(featureQuatMatrix_.size()) : 0;
+  if (cachedCount == 0 || featureQuatMatrix.empty() ||
+      featureQuatMatrix[0].size() != featureQuatMatrix_[0].size()) {
+    return cachedIndex;
+  }
+  // Samples are usually added, removed or edited one at a time so start searching from the
+  // previous match.  This finds all the matches in a single pass in those cases.
+  int hint = 0;
+  for (size_t s = 0; s < featureQuatMatrix.size(); ++s) {
+    for (int i = 0; i < cachedCount; ++i) {
+      int c = (hint + i) % cachedCount;
+      if (sameQuaternions(featureQuatMatrix[s], featureQuatMatrix_[c])) {
+        cachedIndex[s] = c;
+        hint = c + 1;
+        break;
+      }
+    }
   }
-  VectorXd inputs = inputValues;
+  return cachedIndex;
+}
+
+void LinearRegressionSolver::solve(const VectorXd& inputValues,
+                                   const QuaternionArray& inputQuats,
+                                   Eigen::Ref<VectorXd> weights, VectorXd& outputs,
+                                   MatrixXd& outputQuats, Scratch& scratch) const {
+  int sampleCount = weightCount();
+  if (sampleCount == 0) {
+    return;
+  }
+  if (nearestCount_) {
+    solveLocal(inputValues, inputQuats, weights, outputs, outputQuats, scratch);
+    return;
+  }
+  // The scratch buffers are only reallocated when the size of the solver changes
+  VectorXd& inputs = scratch.inputs;
+  inputs = inputValues;
   int inputCount = inputs.size();
 
-  VectorXd inputDistance = VectorXd::Zero(theta_.cols());
+  VectorXd& inputDistance = scratch.distance;
+  inputDistance.setZero(theta_.cols());
   if (inputCount) {
     for (int i = 0; i < inputCount; ++i) {
       if (featureNorms_[i] != 0.0) {
         inputs[i] /= featureNorms_[i];
       }
     }
-    for (int i = 0; i < sampleCount; ++i) {
-      inputDistance[i] = (featureMatrix_.row(i).transpose() - inputs).norm();
-    }
+    inputDistance.head(sampleCount) =
+        (featureMatrix_.rowwise() - inputs.transpose()).rowwise().norm();
     // Normalize distances
     inputDistance /= distanceNorm_;
   }
@@ -158,43 +302,139 @@ VectorXd LinearRegressionSolver::solve(const VectorXd& inputValues,
 
   if (featureQuatMatrix_.size()) {
     int inputQuatCount = featureQuatMatrix_[0].size();
-    // Generate rotational distance matrix from rotation inputs
-    double swingDistance, twistDistance;
+    // Generate rotational distance matrix from rotation inputs.  Only the input rotations need
+    // to be decomposed since the sample decompositions are calculated in setFeatures.
+    Quaterniond swing, twist;
     int idx = inputCount ? sampleCount : 0;
     for (int i = 0; i < inputQuatCount; ++i) {
-      const MQuaternion& q1 = inputQuats[i];
+      decomposeSwingTwist(inputQuats[i], swing, twist, twistAxis(i));
+      VectorMap swingDistances(inputDistance.data() + idx, sampleCount, Eigen::InnerStride<2>());
+      VectorMap twistDistances(inputDistance.data() + idx + 1, sampleCount,
+                               Eigen::InnerStride<2>());
+      if (solverSpace_ == SolverSpace::Twist) {
+        swingDistances.setZero();
+      } else {
+        quaternionDistances(featureSwings_[i], swing.coeffs(), scratch.dots, swingDistances);
+      }
+      if (solverSpace_ == SolverSpace::Swing) {
+        twistDistances.setZero();
+      } else {
+        quaternionDistances(featureTwists_[i], twist.coeffs(), scratch.dots, twistDistances);
+      }
       for (int s1 = 0; s1 < sampleCount; ++s1) {
-        int startIdx = idx;
-        for (int c = 0; c < inputQuatCount; ++c) {
-          MQuaternion& q2 = featureQuatMatrix_[s1][c];
-          swingTwistDistance(q1, q2, swingDistance, twistDistance);
-          if (solverSpace_ == SolverSpace::Swing) {
-            twistDistance = 0.0;
-          } else if (solverSpace_ == SolverSpace::Twist) {
-            swingDistance = 0.0;
-          }
-          inputDistance[idx++] = swingDistance;
-          inputDistance[idx++] = twistDistance;
-        }
-        applyRbf(inputDistance.segment(startIdx, inputQuatCount * 2), rbf_, sampleRadius_[s1]);
+        auto distances = inputDistance.segment(idx, 2);
+        applyRbf(distances, rbf_, sampleRadius_[s1]);
+        idx += 2;
       }
     }
   }
 
-  VectorXd output = theta_ * inputDistance;
+  weights.noalias() = theta_ * inputDistance;
   int outputCount = outputScalarMatrix_.cols();
   outputs.resize(outputCount);
   for (unsigned int i = 0; i < outputCount; ++i) {
-    outputs[i] = output.dot(outputScalarMatrix_.col(i));
+    outputs[i] = weights.dot(outputScalarMatrix_.col(i));
   }
 
   int outputQuatCount = outputQuats_.size();
-  output.normalize();  // Weights must be normalize for weight avg of quaternions
+  weights.normalize();  // Weights must be normalize for weight avg of quaternions
   outputQuats.resize(4, outputQuatCount);
   for (unsigned int i = 0; i < outputQuatCount; ++i) {
-    outputQuats.col(i) = averageQuaternion(outputQuats_[i], output);
+    outputQuats.col(i) = averageQuaternion(outputQuats_[i], weights);
+  }
+}
+
+VectorXd LinearRegressionSolver::searchPoint(const VectorXd& inputs,
+                                             const QuaternionArray& inputQuats) const {
+  int inputCount = inputs.size();
+  int inputQuatCount = inputQuats.size();
+  int rotationCount = solverSpace_ == SolverSpace::SwingTwist ? 2 : 1;
+  VectorXd point(inputCount + inputQuatCount * rotationCount * 10);
+  if (inputCount) {
+    point.head(inputCount) = inputs.cwiseProduct(searchScale_);
+  }
+  double* rotationPoint = point.data() + inputCount;
+  Quaterniond swing, twist;
+  for (int i = 0; i < inputQuatCount; ++i) {
+    decomposeSwingTwist(inputQuats[i], swing, twist, twistAxis(i));
+    if (solverSpace_ != SolverSpace::Twist) {
+      rotationSearchPoint(swing, rotationPoint);
+      rotationPoint += 10;
+    }
+    if (solverSpace_ != SolverSpace::Swing) {
+      rotationSearchPoint(twist, rotationPoint);
+      rotationPoint += 10;
+    }
+  }
+  return point;
+}
+
+// Building the local system allocates so, unlike solving the whole system, this is not
+// allocation free.
+void LinearRegressionSolver::solveLocal(const VectorXd& inputs,
+                                        const QuaternionArray& inputQuats,
+                                        Eigen::Ref<VectorXd> weights, VectorXd& outputs,
+                                        MatrixXd& outputQuats, Scratch& scratch) const {
+  std::vector<int> nearest = searchTree_.nearest(searchPoint(inputs, inputQuats), nearestCount_);
+
+  // The result is the same as a solver built from only the nearest samples
+  int count = static_cast<int>(nearest.size());
+  MatrixXd features(featureMatrix_.rows() ? count : 0, featureMatrix_.cols());
+  std::vector<QuaternionArray> featureQuats(featureQuatMatrix_.size() ? count : 0);
+  MatrixXd outputScalars(outputScalarMatrix_.rows() ? count : 0, outputScalarMatrix_.cols());
+  std::vector<MatrixXd> sampleOutputQuats(outputQuats_.size());
+  for (int i = 0; i < count; ++i) {
+    int s = nearest[i];
+    if (features.rows()) {
+      features.row(i) = featureMatrix_.row(s);
+    }
+    if (featureQuats.size()) {
+      featureQuats[i] = featureQuatMatrix_[s];
+    }
+    if (outputScalars.rows()) {
+      outputScalars.row(i) = outputScalarMatrix_.row(s);
+    }
+  }
+  for (size_t i = 0; i < outputQuats_.size(); ++i) {
+    sampleOutputQuats[i].resize(4, count);
+    for (int j = 0; j < count; ++j) {
+      sampleOutputQuats[i].col(j) = outputQuats_[i].col(nearest[j]);
+    }
+  }
+  LinearRegressionSolver local;
+  local.setFeatures(features, featureQuats, outputScalars, sampleOutputQuats, rbf_, radius_,
+                    regularization_, solverSpace_, decomposition_, 0, twistAxes_);
+  // The local solve only uses the other scratch buffers
+  VectorXd& localWeights = scratch.localWeights;
+  localWeights.resize(local.weightCount());
+  local.solve(inputs, inputQuats, localWeights, outputs, outputQuats, scratch);
+
+  // Samples that are not part of the local system get no weight
+  weights.setZero();
+  for (int i = 0; i < localWeights.size(); ++i) {
+    weights[nearest[i]] = localWeights[i];
   }
-  return output;
+}
+
+MatrixXd solveSymmetric(const MatrixXd& a, const MatrixXd& b, Decomposition decomposition) {
+  // Reciprocal condition number below which LDLT is considered unreliable
+  static const double kMinRCond = 1.0e-12;
+  switch (decomposition) {
+    case Decomposition::LDLT: {
+      Eigen::LDLT<MatrixXd> ldlt(a);
+      if (ldlt.info() == Eigen::Success && ldlt.isPositive() && ldlt.rcond() > kMinRCond) {
+        return ldlt.solve(b);
+      }
+      break;
+    }
+    case Decomposition::BDCSVD:
+      return Eigen::BDCSVD<MatrixXd>(a, Eigen::ComputeThinU | Eigen::ComputeThinV).solve(b);
+    case Decomposition::CompleteOrthogonal:
+      return Eigen::CompleteOrthogonalDecomposition<MatrixXd>(a).solve(b);
+    default:
+      break;
+  }
+  return pseudoInverse(a) * b;
 }
 
 MatrixXd pseudoInverse(const MatrixXd& a, double epsilon) {
@@ -208,36 +448,52 @@ MatrixXd pseudoInverse(const MatrixXd& a, double epsilon) {
          svd.matrixU().adjoint();
 }
 
-double quaternionDistance(MQuaternion& q1, MQuaternion& q2) {
+double quaternionDistance(const Quaterniond& q1, const Quaterniond& q2) {
   double dot = quaternionDot(q1, q2);
-  return acos(2.0 * dot * dot - 1.0) / M_PI;
+  return std::acos(2.0 * dot * dot - 1.0) / EIGEN_PI;
+}
+
+Eigen::ArrayXd quaternionDistances(const MatrixXd& quats, const Eigen::Vector4d& q) {
+  // Clamp any floating point error
+  Eigen::ArrayXd dots = (quats.transpose() * q).array().max(-1.0).min(1.0);
+  return (2.0 * dots.square() - 1.0).acos() / EIGEN_PI;
+}
+
+void quaternionDistances(const MatrixXd& quats, const Eigen::Vector4d& q, VectorXd& dots,
+                         VectorMap distances) {
+  dots.noalias() = quats.transpose() * q;
+  // Clamp any floating point error
+  distances =
+      ((2.0 * dots.array().max(-1.0).min(1.0).square() - 1.0).acos() / EIGEN_PI).matrix();
 }
 
-void swingTwistDistance(const MQuaternion& q1, const MQuaternion& q2, double& swingDistance,
-                        double& twistDistance) {
-  MQuaternion s1, t1, s2, t2;
-  decomposeSwingTwist(q1, s1, t1);
-  decomposeSwingTwist(q2, s2, t2);
+void swingTwistDistance(const Quaterniond& q1, const Quaterniond& q2, double& swingDistance,
+                        double& twistDistance, int twistAxis) {
+  Quaterniond s1, t1, s2, t2;
+  decomposeSwingTwist(q1, s1, t1, twistAxis);
+  decomposeSwingTwist(q2, s2, t2, twistAxis);
   swingDistance = quaternionDistance(s1, s2);
   twistDistance = quaternionDistance(t1, t2);
 }
 
-void decomposeSwingTwist(const MQuaternion& q, MQuaternion& swing, MQuaternion& twist) {
-  // TODO: Support different twist axis
-  twist.x = q.x;
-  twist.y = 0.0;
-  twist.z = 0.0;
-  twist.w = q.w;
-  twist.normalizeIt();
-  swing = twist.inverse() * q;
+void decomposeSwingTwist(const Quaterniond& q, Quaterniond& swing, Quaterniond& twist,
+                         int twistAxis) {
+  // Project the rotation onto the twist axis
+  twist = Quaterniond(q.w(), 0.0, 0.0, 0.0);
+  twist.vec()[twistAxis] = q.vec()[twistAxis];
+  twist.normalize();
+  // twist.inverse() * q in MQuaternion multiplication order
+  swing = q * twist.inverse();
 }
 
-VectorXd averageQuaternion(const MatrixXd& inputQuats, const VectorXd& weights) {
+Eigen::Vector4d averageQuaternion(const MatrixXd& inputQuats,
+                                  const Eigen::Ref<const VectorXd>& weights) {
   // Weighted average of multiple quaternions:
   // https://stackoverflow.com/a/27410865
-  MatrixXd Q = inputQuats * weights;
-  Q *= Q.transpose();
-  Eigen::SelfAdjointEigenSolver<MatrixXd> solver(Q);
+  // The matrix is always 4 x 4 so fixed size types are used to avoid allocating.
+  Eigen::Vector4d q = inputQuats * weights;
+  Eigen::Matrix4d Q = q * q.transpose();
+  Eigen::SelfAdjointEigenSolver<Eigen::Matrix4d> solver(Q);
   auto eigenValues = solver.eigenvalues();
   double maxValue = eigenValues[0];
   int maxIndex = 0;
@@ -247,6 +503,5 @@ VectorXd averageQuaternion(const MatrixXd& inputQuats, const VectorXd& weights)
       maxIndex = j;
     }
   }
-  VectorXd averageQuat = solver.eigenvectors().col(maxIndex);
-  return averageQuat;
+  return solver.eigenvectors().col(maxIndex);
 }
\ No newline at end of file
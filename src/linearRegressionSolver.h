@@ -1,29 +1,45 @@
 #ifndef CMT_LINEARREGRESSIONSOLVER_H
 #define CMT_LINEARREGRESSIONSOLVER_H
 
-#include <maya/MDoubleArray.h>
-#include <maya/MQuaternion.h>
-
 #include <Eigen/Dense>
 #include <Eigen/Eigenvalues>
+#include <Eigen/Geometry>
+#include <Eigen/StdVector>
 
 #include <limits>
 #include <vector>
 
+#include "kdTree.h"
+
 using Eigen::MatrixXd;
+using Eigen::Quaterniond;
 using Eigen::VectorXd;
 
+// The solver does not depend on Maya so it can be built and tested outside of Maya.
+// Quaternion products in this file use Eigen's (Hamilton) multiplication order which is the
+// reverse of MQuaternion's.
+typedef std::vector<Quaterniond, Eigen::aligned_allocator<Quaterniond>> QuaternionArray;
+
+// Strided views used to write the interleaved swing and twist distances
+typedef Eigen::Map<MatrixXd, 0, Eigen::OuterStride<>> DistanceMap;
+typedef Eigen::Map<VectorXd, 0, Eigen::InnerStride<2>> VectorMap;
+
 MatrixXd pseudoInverse(const MatrixXd& a, double epsilon = std::numeric_limits<double>::epsilon());
 
-void decomposeSwingTwist(const MQuaternion& q, MQuaternion& swing, MQuaternion& twist);
+/**
+  Decompose a rotation into the twist around an axis and the remaining swing.
+  @param[in] twistAxis 0, 1 or 2 for the X, Y or Z axis.
+*/
+void decomposeSwingTwist(const Quaterniond& q, Quaterniond& swing, Quaterniond& twist,
+                         int twistAxis = 0);
 
-void swingTwistDistance(const MQuaternion& q1, const MQuaternion& q2, double& swingDistance,
-                        double& twistDistance);
+void swingTwistDistance(const Quaterniond& q1, const Quaterniond& q2, double& swingDistance,
+                        double& twistDistance, int twistAxis = 0);
 
-double quaternionDistance(MQuaternion& q1, MQuaternion& q2);
+double quaternionDistance(const Quaterniond& q1, const Quaterniond& q2);
 
-inline double quaternionDot(const MQuaternion& q1, const MQuaternion& q2) {
-  double dotValue = (q1.x * q2.x) + (q1.y * q2.y) + (q1.z * q2.z) + (q1.w * q2.w);
+inline double quaternionDot(const Quaterniond& q1, const Quaterniond& q2) {
+  double dotValue = q1.dot(q2);
   // Clamp any floating point error
   if (dotValue < -1.0) {
     dotValue = -1.0;
@@ -33,27 +49,113 @@ inline double quaternionDot(const MQuaternion& q1, const MQuaternion& q2) {
   return dotValue;
 }
 
-VectorXd averageQuaternion(const MatrixXd& inputQuats, const VectorXd& weights);
+/**
+  Vectorized quaternionDistance between each column of a 4 x n matrix of quaternions and q.
+*/
+Eigen::ArrayXd quaternionDistances(const MatrixXd& quats, const Eigen::Vector4d& q);
+
+/**
+  quaternionDistances written to distances.  dots is scratch storage so this does not allocate
+  once dots has grown to the column count of quats.
+*/
+void quaternionDistances(const MatrixXd& quats, const Eigen::Vector4d& q, VectorXd& dots,
+                         VectorMap distances);
+
+Eigen::Vector4d averageQuaternion(const MatrixXd& inputQuats,
+                                  const Eigen::Ref<const VectorXd>& weights);
 
 enum class SolverSpace { Swing, Twist, SwingTwist };
 
+/**
+  Decomposition used to solve the regularized normal equations of the solver.  The system
+  matrix is symmetric positive semi-definite so LDLT is the fastest option.  It falls back to
+  JacobiSVD when the system is too ill-conditioned for LDLT.
+*/
+enum class Decomposition { JacobiSVD, LDLT, BDCSVD, CompleteOrthogonal };
+
+/**
+  Solve a x = b for the symmetric positive semi-definite matrix a using the given decomposition.
+*/
+MatrixXd solveSymmetric(const MatrixXd& a, const MatrixXd& b, Decomposition decomposition);
+
+/**
+  The solved system of a LinearRegressionSolver.  It only depends on the sample inputs and the
+  solver settings so it can be stored and passed back to setFeatures to skip solving the system.
+*/
+struct SolverSolution {
+  MatrixXd theta;
+  VectorXd sampleRadius;
+  double distanceNorm;
+};
+
+/**
+  Radial basis function solver that maps input values and rotations to sample weights.
+
+  By default the system of all the samples is solved once in setFeatures.  When a nearest count
+  is given, setFeatures only builds a kd-tree of the samples and solve fits the system of the
+  nearest samples of each input, which keeps the cost of both independent of the sample count
+  in large pose libraries.
+
+  Each input rotation is decomposed into swing and twist around its own twist axis, which
+  defaults to X for input rotations without an axis.
+*/
 class LinearRegressionSolver {
  public:
+  /**
+    Scratch storage used by solve.  solve does not allocate once the buffers have grown to the
+    size of the solver, so callers keep one per solver and thread and reuse it.
+  */
+  struct Scratch {
+    VectorXd inputs;
+    VectorXd distance;
+    VectorXd dots;
+    // Weights of the local system in nearest sample mode
+    VectorXd localWeights;
+  };
 
   LinearRegressionSolver();
   virtual ~LinearRegressionSolver();
   void setFeatures(const MatrixXd& featureMatrix,
-                   const std::vector<std::vector<MQuaternion>>& featureQuatMatrix,
+                   const std::vector<QuaternionArray>& featureQuatMatrix,
                    const MatrixXd& outputScalarMatrix, const std::vector<MatrixXd>& outputQuats,
-                   short rbf, double radius, double regularization, SolverSpace space);
+                   short rbf, double radius, double regularization, SolverSpace space,
+                   Decomposition decomposition = Decomposition::JacobiSVD, int nearestCount = 0,
+                   const std::vector<int>& twistAxes = std::vector<int>(),
+                   const SolverSolution* solution = nullptr);
+
+  /**
+    Number of sample weights written by solve.  0 when there are not enough samples to solve.
+  */
+  int weightCount() const {
+    int sampleCount = featureMatrix_.rows() ? featureMatrix_.rows() : featureQuatMatrix_.size();
+    return sampleCount > 1 ? sampleCount : 0;
+  }
 
-  VectorXd solve(const VectorXd& inputs, const std::vector<MQuaternion>& inputQuats, VectorXd& outputs,
-             MatrixXd& outputQuats);
+  /**
+    Writes the normalized sample weights of the inputs to weights, which must have weightCount
+    rows, along with the output values and rotations.  The outputs are left untouched when there
+    is nothing to solve.
+  */
+  void solve(const VectorXd& inputs, const QuaternionArray& inputQuats,
+             Eigen::Ref<VectorXd> weights, VectorXd& outputs, MatrixXd& outputQuats,
+             Scratch& scratch) const;
 
   const std::vector<MatrixXd>& outputQuats() const { return outputQuats_; }
 
+  SolverSolution solution() const { return {theta_, sampleRadius_, distanceNorm_}; }
+
 
  private:
+  std::vector<int> matchCachedSamples(
+      const std::vector<QuaternionArray>& featureQuatMatrix) const;
+  int twistAxis(size_t inputQuat) const {
+    return inputQuat < twistAxes_.size() ? twistAxes_[inputQuat] : 0;
+  }
+  VectorXd searchPoint(const VectorXd& inputs, const QuaternionArray& inputQuats) const;
+  void solveLocal(const VectorXd& inputs, const QuaternionArray& inputQuats,
+                  Eigen::Ref<VectorXd> weights, VectorXd& outputs, MatrixXd& outputQuats,
+                  Scratch& scratch) const;
+
   double distanceNorm_;
   short rbf_;
   double radius_;
@@ -61,10 +163,24 @@ class LinearRegressionSolver {
   VectorXd sampleRadius_;
   VectorXd featureNorms_;
   MatrixXd featureMatrix_;
-  std::vector<std::vector<MQuaternion>> featureQuatMatrix_;
+  std::vector<QuaternionArray> featureQuatMatrix_;
+  std::vector<int> twistAxes_;
+  // Swing and twist components of the sample rotations.  One 4 x sample count matrix of
+  // (x, y, z, w) columns per input rotation.
+  std::vector<MatrixXd> featureSwings_;
+  std::vector<MatrixXd> featureTwists_;
   MatrixXd outputScalarMatrix_;
   std::vector<MatrixXd> outputQuats_;
   MatrixXd theta_;
+  // Swing and twist distances between each pair of samples for each input rotation before the
+  // rbf is applied.  Distances between samples that did not change are reused on the next build.
+  std::vector<MatrixXd> quatDistances_;
+  // Local mode settings.  nearestCount_ is 0 when the system of all the samples is solved.
+  int nearestCount_;
+  double regularization_;
+  Decomposition decomposition_;
+  VectorXd searchScale_;
+  KDTree searchTree_;
 };
 
 struct Gaussian {
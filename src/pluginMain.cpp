@@ -2,8 +2,11 @@
 #include <maya/MFnPlugin.h>
 
 #include "demBonesCmd.h"
+#include "dgeNode.h"
 #include "ikRigNode.h"
+#include "rbfEvaluateCmd.h"
 #include "rbfNode.h"
+#include "swingTwistArrayNode.h"
 #include "swingTwistCmd.h"
 #include "swingTwistNode.h"
 
@@ -18,8 +21,14 @@ MStatus initializePlugin(MObject obj) {
   status = plugin.registerCommand(SwingTwistCmd::kName, SwingTwistCmd::creator,
                                   SwingTwistCmd::newSyntax);
   CHECK_MSTATUS_AND_RETURN_IT(status);
+  status = plugin.registerNode(SwingTwistArrayNode::kName, SwingTwistArrayNode::id,
+                               SwingTwistArrayNode::creator, SwingTwistArrayNode::initialize);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.registerNode(RBFNode::kName, RBFNode::id, RBFNode::creator, RBFNode::initialize);
   CHECK_MSTATUS_AND_RETURN_IT(status);
+  status = plugin.registerCommand(RBFEvaluateCmd::kName, RBFEvaluateCmd::creator,
+                                  RBFEvaluateCmd::newSyntax);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.registerCommand(DemBonesCmd::kName, DemBonesCmd::creator, DemBonesCmd::newSyntax);
   CHECK_MSTATUS_AND_RETURN_IT(status);
 
@@ -27,18 +36,27 @@ MStatus initializePlugin(MObject obj) {
                                IKRigNode::initialize);
   CHECK_MSTATUS_AND_RETURN_IT(status);
 
+  status = plugin.registerNode(DGENode::kName, DGENode::id, DGENode::creator, DGENode::initialize);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+
   return status;
 }
 
 MStatus uninitializePlugin(MObject obj) {
   MStatus status;
   MFnPlugin plugin(obj);
+  status = plugin.deregisterNode(DGENode::id);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.deregisterNode(IKRigNode::id);
   CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.deregisterCommand(DemBonesCmd::kName);
   CHECK_MSTATUS_AND_RETURN_IT(status);
+  status = plugin.deregisterCommand(RBFEvaluateCmd::kName);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.deregisterNode(RBFNode::id);
   CHECK_MSTATUS_AND_RETURN_IT(status);
+  status = plugin.deregisterNode(SwingTwistArrayNode::id);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.deregisterCommand(SwingTwistCmd::kName);
   CHECK_MSTATUS_AND_RETURN_IT(status);
   status = plugin.deregisterNode(SwingTwistNode::id);
@@ -0,0 +1,113 @@
+#include "rbfEvaluateCmd.h"
+#include "rbfNode.h"
+
+#include <maya/MAngle.h>
+#include <maya/MDoubleArray.h>
+#include <maya/MEulerRotation.h>
+#include <maya/MFnDependencyNode.h>
+#include <maya/MGlobal.h>
+#include <maya/MPlug.h>
+#include <maya/MSelectionList.h>
+
+const char* RBFEvaluateCmd::kInputValueShort = "-iv";
+const char* RBFEvaluateCmd::kInputValueLong = "-inputValue";
+const char* RBFEvaluateCmd::kInputQuatShort = "-iq";
+const char* RBFEvaluateCmd::kInputQuatLong = "-inputQuat";
+const MString RBFEvaluateCmd::kName("rbfEvaluate");
+
+void* RBFEvaluateCmd::creator() { return new RBFEvaluateCmd; }
+
+bool RBFEvaluateCmd::isUndoable() const { return false; }
+
+MSyntax RBFEvaluateCmd::newSyntax() {
+  MSyntax syntax;
+
+  syntax.addFlag(kInputValueShort, kInputValueLong, MSyntax::kDouble);
+  syntax.makeFlagMultiUse(kInputValueShort);
+  syntax.addFlag(kInputQuatShort, kInputQuatLong, MSyntax::kDouble, MSyntax::kDouble,
+                 MSyntax::kDouble, MSyntax::kDouble);
+  syntax.makeFlagMultiUse(kInputQuatShort);
+
+  syntax.setObjectType(MSyntax::kSelectionList, 1, 1);
+  syntax.useSelectionAsDefault(true);
+
+  syntax.enableEdit(false);
+  syntax.enableQuery(false);
+
+  return syntax;
+}
+
+MStatus RBFEvaluateCmd::doIt(const MArgList& argList) {
+  MStatus status;
+  MArgDatabase argData(syntax(), argList, &status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+
+  MSelectionList selection;
+  status = argData.getObjects(selection);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  MObject oNode;
+  status = selection.getDependNode(0, oNode);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  MFnDependencyNode fnNode(oNode, &status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  if (fnNode.typeId() != RBFNode::id) {
+    MGlobal::displayError(fnNode.name() + " is not an rbf node");
+    return MS::kInvalidParameter;
+  }
+  RBFNode* node = static_cast<RBFNode*>(fnNode.userNode());
+
+  int inputCount = MPlug(oNode, RBFNode::aInputValueCount).asInt();
+  int inputQuatCount = MPlug(oNode, RBFNode::aInputQuatCount).asInt();
+  int outputCount = MPlug(oNode, RBFNode::aOutputValueCount).asInt();
+  int outputQuatCount = MPlug(oNode, RBFNode::aOutputQuatCount).asInt();
+  int valueUses = static_cast<int>(argData.numberOfFlagUses(kInputValueShort));
+  int quatUses = static_cast<int>(argData.numberOfFlagUses(kInputQuatShort));
+  if (inputCount == 0 && inputQuatCount == 0) {
+    MGlobal::displayError(fnNode.name() + " does not have any inputs");
+    return MS::kInvalidParameter;
+  }
+  // Every frame contains inputCount values and inputQuatCount rotations
+  int frameCount = inputCount ? valueUses / inputCount : quatUses / inputQuatCount;
+  if (valueUses != frameCount * inputCount || quatUses != frameCount * inputQuatCount) {
+    MGlobal::displayError(MString("The number of input values and rotations does not match ") +
+                          fnNode.name());
+    return MS::kInvalidParameter;
+  }
+
+  MatrixXd inputs(frameCount, inputCount);
+  MArgList args;
+  for (int i = 0; i < valueUses; ++i) {
+    status = argData.getFlagArgumentList(kInputValueShort, i, args);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    inputs(i / inputCount, i % inputCount) = args.asDouble(0);
+  }
+  std::vector<MQuaternion> inputQuats(quatUses);
+  for (int i = 0; i < quatUses; ++i) {
+    status = argData.getFlagArgumentList(kInputQuatShort, i, args);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    inputQuats[i] = MQuaternion(args.asDouble(0), args.asDouble(1), args.asDouble(2),
+                                args.asDouble(3));
+  }
+
+  MatrixXd outputs;
+  std::vector<MQuaternion> outputQuats;
+  status = node->evaluateFrames(inputs, inputQuats, outputs, outputQuats);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+
+  MDoubleArray result(frameCount * (outputCount + outputQuatCount * 3));
+  unsigned int idx = 0;
+  for (int frame = 0; frame < frameCount; ++frame) {
+    for (int i = 0; i < outputCount; ++i) {
+      result[idx++] = outputs(frame, i);
+    }
+    for (int i = 0; i < outputQuatCount; ++i) {
+      MEulerRotation euler = outputQuats[frame * outputQuatCount + i].asEulerRotation();
+      result[idx++] = MAngle(euler.x).asUnits(MAngle::uiUnit());
+      result[idx++] = MAngle(euler.y).asUnits(MAngle::uiUnit());
+      result[idx++] = MAngle(euler.z).asUnits(MAngle::uiUnit());
+    }
+  }
+  setResult(result);
+
+  return MS::kSuccess;
+}
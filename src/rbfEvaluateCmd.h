@@ -0,0 +1,32 @@
+#ifndef RBF_RBFEVALUATECMD_H
+#define RBF_RBFEVALUATECMD_H
+
+#include <maya/MArgDatabase.h>
+#include <maya/MArgList.h>
+#include <maya/MPxCommand.h>
+#include <maya/MSyntax.h>
+
+/**
+  Evaluates an rbf node for many frames in one call.
+
+  The input values and rotations of every frame are passed in with the multi-use inputValue and
+  inputQuat flags, frame by frame.  The result is a flat array containing, for each frame, the
+  output values followed by the x, y and z rotation of each output rotation in the current
+  angular unit.
+*/
+class RBFEvaluateCmd : public MPxCommand {
+ public:
+  virtual MStatus doIt(const MArgList& argList);
+  virtual bool isUndoable() const;
+
+  static void* creator();
+  static MSyntax newSyntax();
+
+  static const MString kName;
+  static const char* kInputValueShort;
+  static const char* kInputValueLong;
+  static const char* kInputQuatShort;
+  static const char* kInputQuatLong;
+};
+
+#endif
@@ -4,19 +4,32 @@
 #include <maya/MEulerRotation.h>
 #include <maya/MEvaluationNode.h>
 #include <maya/MFnCompoundAttribute.h>
+#include <maya/MFnDoubleArrayData.h>
 #include <maya/MFnEnumAttribute.h>
 #include <maya/MFnGenericAttribute.h>
 #include <maya/MFnNumericAttribute.h>
 #include <maya/MFnNumericData.h>
+#include <maya/MFnStringData.h>
+#include <maya/MFnTypedAttribute.h>
 #include <maya/MFnUnitAttribute.h>
+#include <maya/MGlobal.h>
+#include <maya/MPlug.h>
 #include <maya/MQuaternion.h>
+#if MAYA_API_VERSION >= 20190000
+#include <maya/MProfiler.h>
+#endif
 
 #include "common.h"
 
+#include <algorithm>
+#include <cstdint>
+#include <cstdio>
+
 MTypeId RBFNode::id(0x0011581A);
 MObject RBFNode::aInputValues;
 MObject RBFNode::aInputQuats;
 MObject RBFNode::aInputRestQuats;
+MObject RBFNode::aInputTwistAxis;
 MObject RBFNode::aInputValueCount;
 MObject RBFNode::aInputQuatCount;
 MObject RBFNode::aOutputValueCount;
@@ -30,6 +43,12 @@ MObject RBFNode::aSampleOutputMode;
 MObject RBFNode::aRBFFunction;
 MObject RBFNode::aRadius;
 MObject RBFNode::aRegularization;
+MObject RBFNode::aSolver;
+MObject RBFNode::aNearestSamples;
+MObject RBFNode::aStoreSolution;
+MObject RBFNode::aSolution;
+MObject RBFNode::aSolutionHash;
+MObject RBFNode::aParallel;
 MObject RBFNode::aSamples;
 MObject RBFNode::aSampleRadius;
 MObject RBFNode::aSampleRotationType;
@@ -40,6 +59,96 @@ MObject RBFNode::aSampleOutputQuats;
 
 const MString RBFNode::kName("rbf");
 
+#if MAYA_API_VERSION >= 20190000
+// Shows the time spent building and evaluating each rbf node in the Maya Profiler
+static const int kProfilerCategory = MProfiler::addCategory("rbf", "rbf node evaluation");
+#endif
+
+static Quaterniond toQuaterniond(const MQuaternion& q) { return Quaterniond(q.w, q.x, q.y, q.z); }
+
+// Incremented whenever the layout of the stored solution or what it depends on changes so
+// solutions stored by older versions are solved again.
+static const double kSolutionVersion = 1.0;
+
+/**
+  64-bit FNV-1a hash used to detect if a stored solution was solved from the current samples.
+*/
+class FeatureHash {
+ public:
+  FeatureHash() : value_(14695981039346656037ULL) {}
+
+  void add(const void* data, size_t size) {
+    const unsigned char* bytes = static_cast<const unsigned char*>(data);
+    for (size_t i = 0; i < size; ++i) {
+      value_ ^= bytes[i];
+      value_ *= 1099511628211ULL;
+    }
+  }
+
+  template <typename T>
+  void add(const T& value) {
+    add(&value, sizeof(T));
+  }
+
+  MString asString() const {
+    char buffer[17];
+    snprintf(buffer, sizeof(buffer), "%016llx", static_cast<unsigned long long>(value_));
+    return MString(buffer);
+  }
+
+ private:
+  uint64_t value_;
+};
+
+static void appendSolution(const SolverSolution& solution, MDoubleArray& values) {
+  values.append(static_cast<double>(solution.theta.rows()));
+  values.append(static_cast<double>(solution.theta.cols()));
+  for (Eigen::Index i = 0; i < solution.theta.size(); ++i) {
+    values.append(solution.theta.data()[i]);
+  }
+  values.append(static_cast<double>(solution.sampleRadius.size()));
+  for (Eigen::Index i = 0; i < solution.sampleRadius.size(); ++i) {
+    values.append(solution.sampleRadius[i]);
+  }
+  values.append(solution.distanceNorm);
+}
+
+/**
+  Reads the solutions written by appendSolution.
+  @return false if the values are not a valid solution of all the solvers.
+*/
+static bool readSolutions(const MDoubleArray& values, std::array<SolverSolution, 3>& solutions) {
+  unsigned int length = values.length();
+  if (length == 0 || values[0] != kSolutionVersion) {
+    return false;
+  }
+  unsigned int index = 1;
+  for (auto& solution : solutions) {
+    if (index + 2 > length) {
+      return false;
+    }
+    int rows = static_cast<int>(values[index++]);
+    int cols = static_cast<int>(values[index++]);
+    if (rows < 0 || cols < 0 || index + rows * cols + 1 > length) {
+      return false;
+    }
+    solution.theta.resize(rows, cols);
+    for (int i = 0; i < rows * cols; ++i) {
+      solution.theta.data()[i] = values[index++];
+    }
+    int radiusCount = static_cast<int>(values[index++]);
+    if (radiusCount < 0 || index + radiusCount + 1 > length) {
+      return false;
+    }
+    solution.sampleRadius.resize(radiusCount);
+    for (int i = 0; i < radiusCount; ++i) {
+      solution.sampleRadius[i] = values[index++];
+    }
+    solution.distanceNorm = values[index++];
+  }
+  return index == length;
+}
+
 MStatus RBFNode::initialize() {
   MStatus status;
 
@@ -47,6 +156,7 @@ MStatus RBFNode::initialize() {
   MFnGenericAttribute gAttr;
   MFnEnumAttribute eAttr;
   MFnNumericAttribute nAttr;
+  MFnTypedAttribute tAttr;
   MFnUnitAttribute uAttr;
 
   aOutputValues = nAttr.create("outputValue", "outputValue", MFnNumericData::kDouble);
@@ -88,6 +198,16 @@ MStatus RBFNode::initialize() {
   addAttribute(aInputRestQuats);
   affects(aInputRestQuats);
 
+  // Axis each input rotation is decomposed into swing and twist around
+  aInputTwistAxis = eAttr.create("inputTwistAxis", "inputTwistAxis", 0);
+  eAttr.addField("X", 0);
+  eAttr.addField("Y", 1);
+  eAttr.addField("Z", 2);
+  eAttr.setArray(true);
+  eAttr.setUsesArrayDataBuilder(true);
+  addAttribute(aInputTwistAxis);
+  affects(aInputTwistAxis);
+
   aInputValueCount = nAttr.create("inputValueCount", "inputValueCount", MFnNumericData::kInt);
   addAttribute(aInputValueCount);
   affects(aInputValueCount);
@@ -134,6 +254,53 @@ MStatus RBFNode::initialize() {
   addAttribute(aRegularization);
   affects(aRegularization);
 
+  // Defaults to jacobi svd, the solver used before the attribute existed, so scenes saved
+  // without the attribute evaluate the same
+  aSolver = eAttr.create("solver", "solver", 0);
+  eAttr.setKeyable(true);
+  eAttr.addField("jacobi svd", 0);
+  eAttr.addField("ldlt", 1);
+  eAttr.addField("bdc svd", 2);
+  eAttr.addField("complete orthogonal", 3);
+  addAttribute(aSolver);
+  affects(aSolver);
+
+  // When non-zero, each evaluation only solves the system of this many nearest samples
+  aNearestSamples = nAttr.create("nearestSamples", "nearestSamples", MFnNumericData::kInt, 0);
+  nAttr.setKeyable(true);
+  nAttr.setMin(0);
+  addAttribute(aNearestSamples);
+  affects(aNearestSamples);
+
+  // When on, the solved systems are saved with the scene so they are not solved again on load
+  aStoreSolution =
+      nAttr.create("storeSolution", "storeSolution", MFnNumericData::kBoolean, false);
+  addAttribute(aStoreSolution);
+  affects(aStoreSolution);
+
+  MFnDoubleArrayData fnDoubleArrayData;
+  MObject oDefaultSolution = fnDoubleArrayData.create(&status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  aSolution = tAttr.create("solution", "solution", MFnData::kDoubleArray, oDefaultSolution);
+  tAttr.setHidden(true);
+  addAttribute(aSolution);
+  affects(aSolution);
+
+  // Hash of the sample inputs and settings the stored solution was solved from
+  MFnStringData fnStringData;
+  MObject oDefaultHash = fnStringData.create("", &status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  aSolutionHash = tAttr.create("solutionHash", "solutionHash", MFnData::kString, oDefaultHash);
+  tAttr.setHidden(true);
+  addAttribute(aSolutionHash);
+  affects(aSolutionHash);
+
+  // Build and evaluate the swing, twist and swing twist solvers in parallel.  Only worth it with
+  // many samples since each evaluation has to wake up the threads.
+  aParallel = nAttr.create("parallel", "parallel", MFnNumericData::kBoolean, false);
+  addAttribute(aParallel);
+  affects(aParallel);
+
   aSampleRadius = nAttr.create("sampleRadius", "sampleRadius", MFnNumericData::kDouble, 1.0);
   nAttr.setMin(0.0);
 
@@ -192,17 +359,21 @@ void RBFNode::affects(const MObject& attribute) {
 
 void* RBFNode::creator() { return new RBFNode(); }
 
-RBFNode::RBFNode() : dirty_(true) {}
+RBFNode::RBFNode() : dirty_(true), solutionDirty_(true) {}
 
 RBFNode::~RBFNode() {}
 
 MStatus RBFNode::setDependentsDirty(const MPlug& plug, MPlugArray& affectedPlugs) {
   if (plug == aInputValueCount || plug == aInputQuatCount || plug == aOutputValueCount ||
       plug == aOutputQuatCount || plug == aRBFFunction || plug == aRadius ||
-      plug == aRegularization || plug == aSamples || plug == aSampleInputValues ||
-      plug == aSampleInputQuats || plug == aSampleOutputValues || plug == aSampleOutputQuats ||
-      plug == aSampleRadius || plug == aSampleRotationType || plug == aSampleOutputMode) {
+      plug == aRegularization || plug == aSolver || plug == aNearestSamples ||
+      plug == aInputTwistAxis || plug == aSamples ||
+      plug == aSampleInputValues || plug == aSampleInputQuats || plug == aSampleOutputValues ||
+      plug == aSampleOutputQuats || plug == aSampleRadius || plug == aSampleRotationType ||
+      plug == aSampleOutputMode || plug == aSolution || plug == aSolutionHash) {
     dirty_ = true;
+  } else if (plug == aStoreSolution) {
+    solutionDirty_ = true;
   }
   return MPxNode::setDependentsDirty(plug, affectedPlugs);
 }
@@ -222,15 +393,23 @@ MStatus RBFNode::preEvaluation(const MDGContext& context, const MEvaluationNode&
       (evaluationNode.dirtyPlugExists(aRadius, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSampleOutputMode, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aRegularization, &status) && status) ||
+      (evaluationNode.dirtyPlugExists(aSolver, &status) && status) ||
+      (evaluationNode.dirtyPlugExists(aNearestSamples, &status) && status) ||
+      (evaluationNode.dirtyPlugExists(aInputTwistAxis, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSamples, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSampleRadius, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSampleRotationType, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSampleInputValues, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSampleInputQuats, &status) && status) ||
       (evaluationNode.dirtyPlugExists(aSampleOutputValues, &status) && status) ||
-      (evaluationNode.dirtyPlugExists(aSampleOutputQuats, &status) && status)) {
+      (evaluationNode.dirtyPlugExists(aSampleOutputQuats, &status) && status) ||
+      (evaluationNode.dirtyPlugExists(aSolution, &status) && status) ||
+      (evaluationNode.dirtyPlugExists(aSolutionHash, &status) && status)) {
     dirty_ = true;
   }
+  if (evaluationNode.dirtyPlugExists(aStoreSolution, &status) && status) {
+    solutionDirty_ = true;
+  }
   return MS::kSuccess;
 }
 
@@ -255,41 +434,141 @@ MStatus RBFNode::compute(const MPlug& plug, MDataBlock& data) {
   int outputCount = data.inputValue(aOutputValueCount).asInt();
   int outputQuatCount = data.inputValue(aOutputQuatCount).asInt();
   short outputMode = data.inputValue(aSampleOutputMode).asShort();
+  bool parallel = data.inputValue(aParallel).asBool();
 
   // Get the inputs
   MArrayDataHandle hInputs = data.inputArrayValue(aInputValues);
-  VectorXd inputs;
-  status = getDoubleValues(hInputs, inputCount, inputs);
+  status = getDoubleValues(hInputs, inputCount, inputs_);
   CHECK_MSTATUS_AND_RETURN_IT(status);
   MArrayDataHandle hInputQuats = data.inputArrayValue(aInputQuats);
-  std::vector<MQuaternion> inputQuats;
-  status = getQuaternionValues(hInputQuats, inputQuatCount, inputQuats);
+  status = getQuaternionValues(hInputQuats, inputQuatCount, inputQuats_);
   CHECK_MSTATUS_AND_RETURN_IT(status);
   MArrayDataHandle hInputRestQuats = data.inputArrayValue(aInputRestQuats);
-  std::vector<MQuaternion> inputRestQuats;
-  status = getQuaternionValues(hInputRestQuats, inputQuatCount, inputRestQuats);
+  status = getQuaternionValues(hInputRestQuats, inputQuatCount, inputRestQuats_);
   CHECK_MSTATUS_AND_RETURN_IT(status);
 
+  solverQuats_.resize(inputQuatCount);
   for (int i = 0; i < inputQuatCount; ++i) {
     // Convert to relative to neutral to have identity at rest
-    inputQuats[i] = inputQuats[i] * inputRestQuats[i].inverse();
+    solverQuats_[i] = toQuaterniond(inputQuats_[i] * inputRestQuats_[i].inverse());
   }
 
   if (dirty_) {
+#if MAYA_API_VERSION >= 20190000
+    MProfilingScope buildScope(kProfilerCategory, MProfiler::kColorD_L1, "Build rbf solvers");
+#endif
     // Build the system coefficients
     status = buildFeatureMatrix(data, inputCount, outputCount, inputQuatCount, outputQuatCount, rbf,
-                                radius, inputRestQuats);
+                                radius, inputRestQuats_);
     CHECK_MSTATUS_AND_RETURN_IT(status);
     dirty_ = false;
   }
+  if (solutionDirty_) {
+    status = storeSolution(data);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    solutionDirty_ = false;
+  }
 
-  MatrixXd outputScalars = MatrixXd::Zero(3, outputCount);
-  int scalarCount = 0;
-  int quatCount = 0;
-  std::vector<MVector> twistAxis(outputQuatCount);
-  std::vector<MQuaternion> totalTwist(outputQuatCount);
-  std::array<VectorXd, 3> solveWeights;
+  {
+#if MAYA_API_VERSION >= 20190000
+    MProfilingScope evaluateScope(kProfilerCategory, MProfiler::kColorE_L1, "Evaluate rbf");
+#endif
+    evaluate(inputs_, solverQuats_, outputMode, outputCount, parallel, buffers_);
+  }
+  const VectorXd& outValues = buffers_.outputs;
+  const std::vector<MQuaternion>& outQuats = buffers_.outputQuats;
 
+  MDataHandle hOutput;
+  MArrayDataHandle hOutputs = data.outputArrayValue(aOutputValues);
+  for (unsigned int i = 0; i < outputCount; ++i) {
+    status = JumpToElement(hOutputs, i);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    hOutput = hOutputs.outputValue();
+    hOutput.setDouble(outValues[i]);
+  }
+  hOutputs.setAllClean();
+
+  MArrayDataHandle hOutputRotation = data.outputArrayValue(aOutputRotate);
+  for (unsigned int i = 0; i < outputQuatCount; ++i) {
+    MEulerRotation euler = outQuats[i].asEulerRotation();
+
+    status = JumpToElement(hOutputRotation, i);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    hOutput = hOutputRotation.outputValue();
+
+    MAngle rx(euler.x);
+    MAngle ry(euler.y);
+    MAngle rz(euler.z);
+    MDataHandle hX = hOutput.child(aOutputRotateX);
+    MDataHandle hY = hOutput.child(aOutputRotateY);
+    MDataHandle hZ = hOutput.child(aOutputRotateZ);
+    hX.setMAngle(rx);
+    hY.setMAngle(ry);
+    hZ.setMAngle(rz);
+    hX.setClean();
+    hY.setClean();
+    hZ.setClean();
+  }
+  hOutputRotation.setAllClean();
+
+  return MS::kSuccess;
+}
+
+MStatus RBFNode::evaluateFrames(const MatrixXd& inputs, const std::vector<MQuaternion>& inputQuats,
+                                MatrixXd& outputs, std::vector<MQuaternion>& outputQuats) {
+  MStatus status;
+  MObject oNode = thisMObject();
+  int inputCount = MPlug(oNode, aInputValueCount).asInt();
+  int inputQuatCount = MPlug(oNode, aInputQuatCount).asInt();
+  int outputCount = MPlug(oNode, aOutputValueCount).asInt();
+  int outputQuatCount = MPlug(oNode, aOutputQuatCount).asInt();
+  short outputMode = MPlug(oNode, aSampleOutputMode).asShort();
+  int frameCount = static_cast<int>(inputs.rows());
+  if (inputs.cols() != inputCount || inputQuats.size() != frameCount * inputQuatCount) {
+    MGlobal::displayError("The number of rbf inputs does not match the number of frames");
+    return MS::kInvalidParameter;
+  }
+
+  // Pull on an output so compute rebuilds the solvers if any of the sample data is dirty
+  MPlug plugOutput(oNode, aOutputValues);
+  plugOutput.elementByLogicalIndex(0).asDouble(&status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+
+  MPlug plugRestQuats(oNode, aInputRestQuats);
+  std::vector<MQuaternion> inverseRestQuats(inputQuatCount);
+  for (int i = 0; i < inputQuatCount; ++i) {
+    MPlug plugRestQuat = plugRestQuats.elementByLogicalIndex(i);
+    MQuaternion q(plugRestQuat.child(0).asDouble(), plugRestQuat.child(1).asDouble(),
+                  plugRestQuat.child(2).asDouble(), plugRestQuat.child(3).asDouble());
+    inverseRestQuats[i] = q.inverse();
+  }
+
+  outputs.resize(frameCount, outputCount);
+  outputQuats.resize(frameCount * outputQuatCount);
+  // Frames only read the solver state so they can be evaluated in parallel
+#pragma omp parallel
+  {
+    EvaluationBuffers buffers;
+    VectorXd frameInputs(inputCount);
+    QuaternionArray solverQuats(inputQuatCount);
+#pragma omp for
+    for (int frame = 0; frame < frameCount; ++frame) {
+      frameInputs = inputs.row(frame).transpose();
+      for (int i = 0; i < inputQuatCount; ++i) {
+        solverQuats[i] =
+            toQuaterniond(inputQuats[frame * inputQuatCount + i] * inverseRestQuats[i]);
+      }
+      // The frames are already spread over the threads
+      evaluate(frameInputs, solverQuats, outputMode, outputCount, false, buffers);
+      outputs.row(frame) = buffers.outputs.transpose();
+      std::copy(buffers.outputQuats.begin(), buffers.outputQuats.end(),
+                outputQuats.begin() + frame * outputQuatCount);
+    }
+  }
+  return MS::kSuccess;
+}
+
+void RBFNode::assembleOutputQuats(short outputMode, int outputQuatCount) {
   // In absolute mode, store all the quaternions in a single matrix
   // In relative mode, store the neutral quaternion (the first column) once, and then the rest
   int cols = 0;
@@ -305,9 +584,9 @@ MStatus RBFNode::compute(const MPlug& plug, MDataBlock& data) {
     ++cols;
   }
 
-  std::vector<MatrixXd> allQuats(outputQuatCount);
+  allQuats_.resize(outputQuatCount);
   int quatIndex = 0;
-  for (auto& quatMatrix : allQuats) {
+  for (auto& quatMatrix : allQuats_) {
     quatMatrix.resize(4, cols);
 
     int col = outputMode == 0 ? 0 : 1;
@@ -334,13 +613,27 @@ MStatus RBFNode::compute(const MPlug& plug, MDataBlock& data) {
     }
     ++quatIndex;
   }
+}
 
-  VectorXd allWeights = VectorXd::Zero(cols);
+void RBFNode::evaluate(const VectorXd& inputs, const QuaternionArray& inputQuats, short outputMode,
+                       int outputCount, bool parallel, EvaluationBuffers& buffers) const {
+  int outputQuatCount = allQuats_.size();
+  int cols = outputQuatCount ? allQuats_[0].cols() : 0;
+  // setZero only reallocates when the sizes change
+  MatrixXd& outputScalars = buffers.outputScalars;
+  VectorXd& allWeights = buffers.weights;
+  outputScalars.setZero(3, outputCount);
+  allWeights.setZero(cols);
+#pragma omp parallel for if (parallel)
+  for (int i = 0; i < 3; ++i) {
+    // resize is a no-op unless the sample count changed
+    buffers.solverWeights[i].resize(solvers_[i].weightCount());
+    solvers_[i].solve(inputs, inputQuats, buffers.solverWeights[i], buffers.scalars[i],
+                      buffers.quats[i], buffers.solverScratch[i]);
+  }
   int col = outputMode == 0 ? 0 : 1;
   for (int i = 0; i < 3; ++i) {
-    VectorXd scalars;
-    MatrixXd quats;
-    VectorXd weights = solvers_[i].solve(inputs, inputQuats, scalars, quats);
+    const VectorXd& weights = buffers.solverWeights[i];
     if (weights.size() && outputQuatCount) {
       if (outputMode == 0) {
         allWeights.segment(col, weights.size()) = weights;
@@ -352,23 +645,10 @@ MStatus RBFNode::compute(const MPlug& plug, MDataBlock& data) {
       }
     }
 
-    if (scalars.size()) {
-      outputScalars.row(i) = scalars;
+    // The solver leaves the buffers untouched when it has nothing to solve
+    if (weights.size() && buffers.scalars[i].size()) {
+      outputScalars.row(i) = buffers.scalars[i];
     }
-
-    /*for (int c = 0; c < quats.cols(); ++c) {
-      VectorXd col = quats.col(c);
-      MQuaternion q(col.data());
-      if (neutralQuats_.size()) {
-        q = neutralQuats_[i] * q;
-      }
-      MQuaternion swing;
-      MQuaternion twist;
-      decomposeSwingTwist(q, swing, twist);
-      totalTwist[c] *= twist;
-      MMatrix m = swing.asMatrix();
-      twistAxis[c] += MVector(m[0][0], m[0][1], m[0][2]);
-    }*/
   }
   if (outputQuatCount) {
     if (outputMode == 1) {
@@ -382,52 +662,20 @@ MStatus RBFNode::compute(const MPlug& plug, MDataBlock& data) {
     allWeights.normalize();
   }
 
-  VectorXd outValues = outputScalars.colwise().sum();
+  buffers.outputs = outputScalars.colwise().sum();
   if (neutralValues_.size()) {
-    outValues += neutralValues_;
-  }
-
-  MDataHandle hOutput;
-  MArrayDataHandle hOutputs = data.outputArrayValue(aOutputValues);
-  for (unsigned int i = 0; i < outputCount; ++i) {
-    status = JumpToElement(hOutputs, i);
-    CHECK_MSTATUS_AND_RETURN_IT(status);
-    hOutput = hOutputs.outputValue();
-    hOutput.setDouble(outValues[i]);
+    buffers.outputs += neutralValues_;
   }
-  hOutputs.setAllClean();
 
-  MArrayDataHandle hOutputRotation = data.outputArrayValue(aOutputRotate);
-  for (unsigned int i = 0; i < outputQuatCount; ++i) {
-    VectorXd outQ = averageQuaternion(allQuats[i], allWeights);
+  buffers.outputQuats.resize(outputQuatCount);
+  for (int i = 0; i < outputQuatCount; ++i) {
+    Eigen::Vector4d outQ = averageQuaternion(allQuats_[i], allWeights);
     MQuaternion q(outQ.data());
-    // MQuaternion q = totalTwist[i] * MVector::xAxis.rotateTo(twistAxis[i].normal());
     if (neutralQuats_.size()) {
       q = neutralQuats_[i] * q;
     }
-
-    MEulerRotation euler = q.asEulerRotation();
-
-    status = JumpToElement(hOutputRotation, i);
-    CHECK_MSTATUS_AND_RETURN_IT(status);
-    hOutput = hOutputRotation.outputValue();
-
-    MAngle rx(euler.x);
-    MAngle ry(euler.y);
-    MAngle rz(euler.z);
-    MDataHandle hX = hOutput.child(aOutputRotateX);
-    MDataHandle hY = hOutput.child(aOutputRotateY);
-    MDataHandle hZ = hOutput.child(aOutputRotateZ);
-    hX.setMAngle(rx);
-    hY.setMAngle(ry);
-    hZ.setMAngle(rz);
-    hX.setClean();
-    hY.setClean();
-    hZ.setClean();
+    buffers.outputQuats[i] = q;
   }
-  hOutputRotation.setAllClean();
-
-  return MS::kSuccess;
 }
 
 MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int outputCount,
@@ -436,13 +684,15 @@ MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int output
   MStatus status;
   MArrayDataHandle hSamples = data.inputArrayValue(aSamples);
   unsigned int sampleCount = hSamples.elementCount();
+  short outputMode = data.inputValue(aSampleOutputMode).asShort();
   if (sampleCount == 0) {
+    assembleOutputQuats(outputMode, outputQuatCount);
     return MS::kSuccess;
   }
 
   std::array<std::vector<VectorXd>, 3> inputScalars;
   std::array<std::vector<VectorXd>, 3> outputScalars;
-  std::array<std::vector<std::vector<MQuaternion>>, 3> inputQuats;
+  std::array<std::vector<QuaternionArray>, 3> inputQuats;
   std::array<std::vector<std::vector<MQuaternion>>, 3> outputQuats;
 
   for (unsigned int i = 0; i < sampleCount; ++i) {
@@ -470,10 +720,11 @@ MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int output
       CHECK_MSTATUS_AND_RETURN_IT(status);
 
       // Convert into deltas from rest
+      QuaternionArray deltas(inputQuatCount);
       for (int j = 0; j < inputQuatCount; ++j) {
-        quats[j] = quats[j] * inputRestQuats[j].inverse();
+        deltas[j] = toQuaterniond(quats[j] * inputRestQuats[j].inverse());
       }
-      inputQuats[rotationType].push_back(quats);
+      inputQuats[rotationType].push_back(deltas);
     }
 
     if (outputCount) {
@@ -494,12 +745,26 @@ MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int output
   }
 
   double regularization = data.inputValue(aRegularization).asDouble();
-  short outputMode = data.inputValue(aSampleOutputMode).asShort();
+  Decomposition decomposition = static_cast<Decomposition>(data.inputValue(aSolver).asShort());
+  int nearestSamples = data.inputValue(aNearestSamples).asInt();
+  std::vector<int> twistAxes(inputQuatCount, 0);
+  MArrayDataHandle hTwistAxes = data.inputArrayValue(aInputTwistAxis);
+  for (unsigned int i = 0; i < hTwistAxes.elementCount(); ++i) {
+    status = hTwistAxes.jumpToArrayElement(i);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    unsigned int index = hTwistAxes.elementIndex();
+    if (index < twistAxes.size()) {
+      twistAxes[index] = hTwistAxes.inputValue().asShort();
+    }
+  }
   neutralQuats_.clear();
   neutralValues_.resize(0);
+  std::array<MatrixXd, 3> solverInputs;
+  std::array<MatrixXd, 3> solverOutputs;
+  std::array<std::vector<MatrixXd>, 3> solverOutputQuats;
   // Convert inputs and outputs to matrices to store in regression solvers
   for (int i = 0; i < 3; ++i) {
-    MatrixXd inputs;
+    MatrixXd& inputs = solverInputs[i];
     if (inputScalars[i].size()) {
       inputs.resize(inputScalars[i].size(), inputScalars[i][0].size());
       int row = 0;
@@ -508,7 +773,7 @@ MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int output
       }
     }
 
-    MatrixXd outputs;
+    MatrixXd& outputs = solverOutputs[i];
     if (outputScalars[i].size()) {
       if (neutralValues_.size() == 0 && outputMode == 1) {
         neutralValues_ = outputScalars[i][0];
@@ -525,7 +790,7 @@ MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int output
     }
 
     // Store quats as column matrix so we can use weighted quaternion averaging
-    std::vector<MatrixXd> outQuats;
+    std::vector<MatrixXd>& outQuats = solverOutputQuats[i];
     if (outputQuats[i].size()) {
       if (neutralQuats_.size() == 0 && outputMode == 1) {
         neutralQuats_ = outputQuats[i][0];
@@ -551,11 +816,75 @@ MStatus RBFNode::buildFeatureMatrix(MDataBlock& data, int inputCount, int output
         ++sampleIdx;
       }
     }
-    SolverSpace space[] = {SolverSpace::Swing, SolverSpace::Twist, SolverSpace::SwingTwist};
-    solvers_[i].setFeatures(inputs, inputQuats[i], outputs, outQuats, rbf, radius, regularization,
-                            space[i]);
   }
 
+  // The solutions only depend on the sample inputs and the solver settings so a stored solution
+  // is still valid after the sample outputs are edited
+  FeatureHash hash;
+  hash.add(kSolutionVersion);
+  hash.add(rbf);
+  hash.add(radius);
+  hash.add(regularization);
+  hash.add(decomposition);
+  hash.add(nearestSamples);
+  hash.add(twistAxes.data(), twistAxes.size() * sizeof(int));
+  for (int i = 0; i < 3; ++i) {
+    hash.add(solverInputs[i].rows());
+    hash.add(solverInputs[i].cols());
+    hash.add(solverInputs[i].data(), solverInputs[i].size() * sizeof(double));
+    hash.add(inputQuats[i].size());
+    for (auto& quats : inputQuats[i]) {
+      for (auto& q : quats) {
+        hash.add(q.coeffs().data(), 4 * sizeof(double));
+      }
+    }
+  }
+  featureHash_ = hash.asString();
+
+  std::array<SolverSolution, 3> solutions;
+  bool restored = false;
+  if (data.inputValue(aStoreSolution).asBool() &&
+      data.inputValue(aSolutionHash).asString() == featureHash_) {
+    MFnDoubleArrayData fnSolution(data.inputValue(aSolution).data());
+    restored = readSolutions(fnSolution.array(), solutions);
+  }
+
+  bool parallel = data.inputValue(aParallel).asBool();
+  SolverSpace space[] = {SolverSpace::Swing, SolverSpace::Twist, SolverSpace::SwingTwist};
+#pragma omp parallel for if (parallel)
+  for (int i = 0; i < 3; ++i) {
+    solvers_[i].setFeatures(solverInputs[i], inputQuats[i], solverOutputs[i], solverOutputQuats[i],
+                            rbf, radius, regularization, space[i], decomposition, nearestSamples,
+                            twistAxes, restored ? &solutions[i] : nullptr);
+  }
+  assembleOutputQuats(outputMode, outputQuatCount);
+  // A restored solution is already stored
+  solutionDirty_ = !restored;
+
+  return MS::kSuccess;
+}
+
+MStatus RBFNode::storeSolution(MDataBlock& data) {
+  MStatus status;
+  MDoubleArray values;
+  MString hash;
+  if (data.inputValue(aStoreSolution).asBool()) {
+    values.append(kSolutionVersion);
+    for (auto& solver : solvers_) {
+      appendSolution(solver.solution(), values);
+    }
+    hash = featureHash_;
+  }
+  MFnDoubleArrayData fnSolution;
+  MObject oSolution = fnSolution.create(values, &status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  // Write to the data block directly so storing the solution does not dirty the node
+  MDataHandle hSolution = data.outputValue(aSolution);
+  hSolution.set(oSolution);
+  hSolution.setClean();
+  MDataHandle hHash = data.outputValue(aSolutionHash);
+  hHash.set(hash);
+  hHash.setClean();
   return MS::kSuccess;
 }
 
@@ -5,6 +5,7 @@
 #include <maya/MDoubleArray.h>
 #include <maya/MPxNode.h>
 #include <maya/MQuaternion.h>
+#include <maya/MString.h>
 
 #include <Eigen/Dense>
 #include <Eigen/Eigenvalues>
@@ -30,6 +31,18 @@ class RBFNode : public MPxNode {
   virtual MStatus compute(const MPlug& plug, MDataBlock& data) override;
   virtual bool isPassiveOutput(const MPlug& plug) const override;
 
+  /**
+    Evaluates the rbf for a batch of frames in a single call without going through the
+    dependency graph.  The solvers are rebuilt first if any of the sample data has changed.
+    @param[in] inputs Input values with one row per frame.
+    @param[in] inputQuats inputQuatCount input rotations per frame, in the same space as the
+      inputQuat plugs.
+    @param[out] outputs Output values with one row per frame.
+    @param[out] outputQuats outputQuatCount output rotations per frame.
+  */
+  MStatus evaluateFrames(const MatrixXd& inputs, const std::vector<MQuaternion>& inputQuats,
+                         MatrixXd& outputs, std::vector<MQuaternion>& outputQuats);
+
   static MStatus initialize();
   static MTypeId id;
   static const MString kName;
@@ -41,6 +54,7 @@ class RBFNode : public MPxNode {
   static MObject aInputValues;
   static MObject aInputQuats;
   static MObject aInputRestQuats;
+  static MObject aInputTwistAxis;
   static MObject aInputValueCount;
   static MObject aInputQuatCount;
   static MObject aOutputValueCount;
@@ -49,6 +63,12 @@ class RBFNode : public MPxNode {
   static MObject aRBFFunction;
   static MObject aRadius;
   static MObject aRegularization;
+  static MObject aSolver;
+  static MObject aNearestSamples;
+  static MObject aStoreSolution;
+  static MObject aSolution;
+  static MObject aSolutionHash;
+  static MObject aParallel;
   static MObject aSamples;
   static MObject aSampleRadius;
   static MObject aSampleRotationType;
@@ -62,14 +82,50 @@ class RBFNode : public MPxNode {
   MStatus buildFeatureMatrix(MDataBlock& data, int inputCount, int outputCount, int inputQuatCount,
                              int outputQuatCount, short rbf, double radius,
                              const std::vector<MQuaternion>& inputRestQuats);
+  /**
+    Scratch storage used to evaluate a single frame.  compute reuses the same buffers on every
+    evaluation and evaluateFrames uses one set per thread.
+  */
+  struct EvaluationBuffers {
+    MatrixXd outputScalars;
+    VectorXd weights;
+    // One set per solver so the solvers can be evaluated in parallel
+    std::array<VectorXd, 3> solverWeights;
+    std::array<LinearRegressionSolver::Scratch, 3> solverScratch;
+    std::array<VectorXd, 3> scalars;
+    std::array<MatrixXd, 3> quats;
+    VectorXd outputs;
+    std::vector<MQuaternion> outputQuats;
+  };
+
+  /**
+    Writes the solutions of the solvers and the hash of the features they were solved from to
+    the solution attributes, or clears them if storeSolution is off.
+  */
+  MStatus storeSolution(MDataBlock& data);
+  void assembleOutputQuats(short outputMode, int outputQuatCount);
+  void evaluate(const VectorXd& inputs, const QuaternionArray& inputQuats, short outputMode,
+                int outputCount, bool parallel, EvaluationBuffers& buffers) const;
   MStatus getDoubleValues(MArrayDataHandle& hArray, int count, VectorXd& values);
   MStatus getQuaternionValues(MArrayDataHandle& hArray, int count,
                               std::vector<MQuaternion>& quaternions);
 
   bool dirty_;
+  // Set when the stored solution no longer matches the solvers
+  bool solutionDirty_;
+  MString featureHash_;
   std::array<LinearRegressionSolver, 3> solvers_;
   std::vector<MQuaternion> neutralQuats_;
   VectorXd neutralValues_;
+  // Output quaternions of all the solvers concatenated for the weighted quaternion average.
+  // Only rebuilt with the solvers.
+  std::vector<MatrixXd> allQuats_;
+  // Buffers reused between evaluations so compute does not allocate once the solvers are built
+  VectorXd inputs_;
+  std::vector<MQuaternion> inputQuats_;
+  std::vector<MQuaternion> inputRestQuats_;
+  QuaternionArray solverQuats_;
+  EvaluationBuffers buffers_;
 };
 
 #endif
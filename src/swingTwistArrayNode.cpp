@@ -0,0 +1,136 @@
+#include "swingTwistArrayNode.h"
+#include "common.h"
+#include "swingTwistNode.h"
+
+#include <maya/MArrayDataHandle.h>
+#include <maya/MFnCompoundAttribute.h>
+#include <maya/MFnEnumAttribute.h>
+#include <maya/MFnMatrixAttribute.h>
+#include <maya/MFnNumericAttribute.h>
+#include <maya/MQuaternion.h>
+#include <maya/MTransformationMatrix.h>
+
+MTypeId SwingTwistArrayNode::id(0x0011581D);
+MObject SwingTwistArrayNode::aOutMatrix;
+MObject SwingTwistArrayNode::aDriver;
+MObject SwingTwistArrayNode::aInMatrix;
+MObject SwingTwistArrayNode::aRestMatrix;
+MObject SwingTwistArrayNode::aTargetRestMatrix;
+MObject SwingTwistArrayNode::aTwistWeight;
+MObject SwingTwistArrayNode::aSwingWeight;
+MObject SwingTwistArrayNode::aTwistAxis;
+
+const MString SwingTwistArrayNode::kName("swingTwistArray");
+
+MStatus SwingTwistArrayNode::initialize() {
+  MStatus status;
+
+  MFnCompoundAttribute cAttr;
+  MFnEnumAttribute eAttr;
+  MFnMatrixAttribute mAttr;
+  MFnNumericAttribute nAttr;
+
+  aOutMatrix = mAttr.create("outMatrix", "outMatrix");
+  mAttr.setArray(true);
+  mAttr.setUsesArrayDataBuilder(true);
+  mAttr.setWritable(false);
+  mAttr.setStorable(false);
+  addAttribute(aOutMatrix);
+
+  aInMatrix = mAttr.create("driverMatrix", "driverMatrix");
+  aRestMatrix = mAttr.create("driverRestMatrix", "driverRestMatrix");
+  aTargetRestMatrix = mAttr.create("targetRestMatrix", "targetRestMatrix");
+
+  aTwistWeight = nAttr.create("twist", "twist", MFnNumericData::kFloat, 1.0);
+  nAttr.setKeyable(true);
+  nAttr.setMin(-1.0);
+  nAttr.setMax(1.0);
+
+  aSwingWeight = nAttr.create("swing", "swing", MFnNumericData::kFloat, 1.0);
+  nAttr.setKeyable(true);
+  nAttr.setMin(-1.0);
+  nAttr.setMax(1.0);
+
+  aTwistAxis = eAttr.create("twistAxis", "twistAxis");
+  eAttr.setKeyable(true);
+  eAttr.addField("X", 0);
+  eAttr.addField("Y", 1);
+  eAttr.addField("Z", 2);
+
+  aDriver = cAttr.create("driver", "driver");
+  cAttr.setArray(true);
+  cAttr.setUsesArrayDataBuilder(true);
+  cAttr.addChild(aInMatrix);
+  cAttr.addChild(aRestMatrix);
+  cAttr.addChild(aTargetRestMatrix);
+  cAttr.addChild(aTwistWeight);
+  cAttr.addChild(aSwingWeight);
+  cAttr.addChild(aTwistAxis);
+  addAttribute(aDriver);
+
+  attributeAffects(aDriver, aOutMatrix);
+  attributeAffects(aInMatrix, aOutMatrix);
+  attributeAffects(aRestMatrix, aOutMatrix);
+  attributeAffects(aTargetRestMatrix, aOutMatrix);
+  attributeAffects(aTwistWeight, aOutMatrix);
+  attributeAffects(aSwingWeight, aOutMatrix);
+  attributeAffects(aTwistAxis, aOutMatrix);
+
+  return MS::kSuccess;
+}
+
+void* SwingTwistArrayNode::creator() { return new SwingTwistArrayNode(); }
+
+SwingTwistArrayNode::SwingTwistArrayNode() {}
+
+SwingTwistArrayNode::~SwingTwistArrayNode() {}
+
+MStatus SwingTwistArrayNode::compute(const MPlug& plug, MDataBlock& data) {
+  MStatus status;
+
+  if (plug != aOutMatrix) {
+    return MS::kUnknownParameter;
+  }
+
+  // Gather the inputs of all the drivers first so the decompositions run over contiguous
+  // memory instead of interleaving data block access with the math.
+  MArrayDataHandle hDrivers = data.inputArrayValue(aDriver, &status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  unsigned int count = hDrivers.elementCount();
+  elements_.resize(count);
+  for (unsigned int i = 0; i < count; ++i) {
+    status = hDrivers.jumpToArrayElement(i);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    MDataHandle hDriver = hDrivers.inputValue(&status);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    Element& element = elements_[i];
+    element.index = hDrivers.elementIndex();
+    element.localMatrix = hDriver.child(aInMatrix).asMatrix() *
+                          hDriver.child(aRestMatrix).asMatrix().inverse();
+    element.targetRestMatrix = hDriver.child(aTargetRestMatrix).asMatrix();
+    element.twistWeight = hDriver.child(aTwistWeight).asFloat();
+    element.swingWeight = hDriver.child(aSwingWeight).asFloat();
+    element.twistAxis = hDriver.child(aTwistAxis).asShort();
+  }
+
+  outMatrices_.resize(count);
+  for (unsigned int i = 0; i < count; ++i) {
+    const Element& element = elements_[i];
+    MQuaternion rotation = MTransformationMatrix(element.localMatrix).rotation();
+    MQuaternion outRotation = SwingTwistNode::weightedRotation(
+        rotation, element.twistAxis, element.twistWeight, element.swingWeight);
+    // Put the rotation in the space of the driven transform like the swingTwist node
+    outMatrices_[i] = outRotation.asMatrix() * element.targetRestMatrix;
+  }
+
+  MArrayDataHandle hOutputs = data.outputArrayValue(aOutMatrix, &status);
+  CHECK_MSTATUS_AND_RETURN_IT(status);
+  for (unsigned int i = 0; i < count; ++i) {
+    status = JumpToElement(hOutputs, elements_[i].index);
+    CHECK_MSTATUS_AND_RETURN_IT(status);
+    hOutputs.outputValue().setMMatrix(outMatrices_[i]);
+  }
+  hOutputs.setAllClean();
+
+  return MS::kSuccess;
+}
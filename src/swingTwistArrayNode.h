@@ -0,0 +1,49 @@
+#ifndef SWINGTWIST_SWINGTWISTARRAYNODE_H
+#define SWINGTWIST_SWINGTWISTARRAYNODE_H
+
+#include <maya/MMatrix.h>
+#include <maya/MPxNode.h>
+
+#include <vector>
+
+/**
+  Computes the swing twist decomposition of many drivers in a single compute.  Each element of
+  the driver array holds the same inputs as a swingTwist node and drives the outMatrix element
+  with the same logical index.
+*/
+class SwingTwistArrayNode : public MPxNode {
+ public:
+  SwingTwistArrayNode();
+  virtual ~SwingTwistArrayNode();
+  static void* creator();
+
+  virtual MStatus compute(const MPlug& plug, MDataBlock& data) override;
+
+  static MStatus initialize();
+  static MTypeId id;
+  static const MString kName;
+  static MObject aOutMatrix;
+  static MObject aDriver;
+  static MObject aInMatrix;
+  static MObject aRestMatrix;
+  static MObject aTargetRestMatrix;
+  static MObject aTwistWeight;
+  static MObject aSwingWeight;
+  static MObject aTwistAxis;
+
+ private:
+  struct Element {
+    unsigned int index;
+    MMatrix localMatrix;
+    MMatrix targetRestMatrix;
+    float twistWeight;
+    float swingWeight;
+    short twistAxis;
+  };
+
+  // Reused between evaluations so compute does not allocate once the arrays are sized
+  std::vector<Element> elements_;
+  std::vector<MMatrix> outMatrices_;
+};
+
+#endif
@@ -123,7 +123,7 @@ MStatus SwingTwistCmd::doIt(const MArgList& argList) {
                               "translateZ",
                               "rotateX",
                               "rotateY",
-                              "rotateZ"
+                              "rotateZ",
                               "jointOrientX",
                               "jointOrientY",
                               "jointOrientZ"};
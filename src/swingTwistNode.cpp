@@ -1,9 +1,12 @@
 #include "swingTwistNode.h"
 
+#include <maya/MAngle.h>
+#include <maya/MEulerRotation.h>
 #include <maya/MFloatVector.h>
 #include <maya/MFnEnumAttribute.h>
 #include <maya/MFnMatrixAttribute.h>
 #include <maya/MFnNumericAttribute.h>
+#include <maya/MFnUnitAttribute.h>
 #include <maya/MMatrix.h>
 #include <maya/MQuaternion.h>
 #include <maya/MTransformationMatrix.h>
@@ -11,12 +14,26 @@
 
 MTypeId SwingTwistNode::id(0x00115819);
 MObject SwingTwistNode::aOutMatrix;
+MObject SwingTwistNode::aOutRotate;
+MObject SwingTwistNode::aOutRotateX;
+MObject SwingTwistNode::aOutRotateY;
+MObject SwingTwistNode::aOutRotateZ;
 MObject SwingTwistNode::aInMatrix;
 MObject SwingTwistNode::aTargetRestMatrix;
 MObject SwingTwistNode::aRestMatrix;
 MObject SwingTwistNode::aTwistWeight;
 MObject SwingTwistNode::aSwingWeight;
 MObject SwingTwistNode::aTwistAxis;
+MObject SwingTwistNode::aMatrix;
+MObject SwingTwistNode::aJointOrient;
+MObject SwingTwistNode::aJointOrientX;
+MObject SwingTwistNode::aJointOrientY;
+MObject SwingTwistNode::aJointOrientZ;
+MObject SwingTwistNode::aRotateAxis;
+MObject SwingTwistNode::aRotateAxisX;
+MObject SwingTwistNode::aRotateAxisY;
+MObject SwingTwistNode::aRotateAxisZ;
+MObject SwingTwistNode::aRotateOrder;
 
 
 const MString SwingTwistNode::kName("swingTwist");
@@ -27,37 +44,47 @@ MStatus SwingTwistNode::initialize() {
   MFnEnumAttribute eAttr;
   MFnMatrixAttribute mAttr;
   MFnNumericAttribute nAttr;
+  MFnUnitAttribute uAttr;
 
   aOutMatrix = mAttr.create("outMatrix", "outMatrix");
   mAttr.setWritable(false);
   mAttr.setStorable(false);
   addAttribute(aOutMatrix);
 
+  // Euler output of the legacy Python swingTwist node, meant to drive the rotate of the target
+  aOutRotateX = uAttr.create("outRotateX", "outRotateX", MFnUnitAttribute::kAngle);
+  aOutRotateY = uAttr.create("outRotateY", "outRotateY", MFnUnitAttribute::kAngle);
+  aOutRotateZ = uAttr.create("outRotateZ", "outRotateZ", MFnUnitAttribute::kAngle);
+  aOutRotate = nAttr.create("outRotate", "outRotate", aOutRotateX, aOutRotateY, aOutRotateZ);
+  nAttr.setWritable(false);
+  nAttr.setStorable(false);
+  addAttribute(aOutRotate);
+
   aInMatrix = mAttr.create("driverMatrix", "driverMatrix");
   addAttribute(aInMatrix);
-  attributeAffects(aInMatrix, aOutMatrix);
+  affects(aInMatrix);
 
   aRestMatrix = mAttr.create("driverRestMatrix", "driverRestMatrix");
   addAttribute(aRestMatrix);
-  attributeAffects(aRestMatrix, aOutMatrix);
+  affects(aRestMatrix);
 
   aTargetRestMatrix = mAttr.create("targetRestMatrix", "targetRestMatrix");
   addAttribute(aTargetRestMatrix);
-  attributeAffects(aTargetRestMatrix, aOutMatrix);
+  affects(aTargetRestMatrix);
 
   aTwistWeight = nAttr.create("twist", "twist", MFnNumericData::kFloat, 1.0);
   nAttr.setKeyable(true);
   nAttr.setMin(-1.0);
   nAttr.setMax(1.0);
   addAttribute(aTwistWeight);
-  attributeAffects(aTwistWeight, aOutMatrix);
+  affects(aTwistWeight);
 
   aSwingWeight = nAttr.create("swing", "swing", MFnNumericData::kFloat, 1.0);
   nAttr.setKeyable(true);
   nAttr.setMin(-1.0);
   nAttr.setMax(1.0);
   addAttribute(aSwingWeight);
-  attributeAffects(aSwingWeight, aOutMatrix);
+  affects(aSwingWeight);
 
   aTwistAxis = eAttr.create("twistAxis", "twistAxis");
   eAttr.setKeyable(true);
@@ -65,46 +92,57 @@ MStatus SwingTwistNode::initialize() {
   eAttr.addField("Y", 1);
   eAttr.addField("Z", 2);
   addAttribute(aTwistAxis);
-  attributeAffects(aTwistAxis, aOutMatrix);
+  affects(aTwistAxis);
+
+  // The local matrix of the driver as connected by the legacy Python swingTwist node.  It is
+  // combined with the driver matrices so rigs can connect either one.
+  aMatrix = mAttr.create("matrix", "matrix");
+  addAttribute(aMatrix);
+  affects(aMatrix);
+
+  aJointOrient = createAngles("jointOrient", aJointOrientX, aJointOrientY, aJointOrientZ);
+  addAttribute(aJointOrient);
+  affects(aJointOrient);
+
+  aRotateAxis = createAngles("rotateAxis", aRotateAxisX, aRotateAxisY, aRotateAxisZ);
+  addAttribute(aRotateAxis);
+  affects(aRotateAxis);
+
+  aRotateOrder = eAttr.create("rotateOrder", "rotateOrder");
+  eAttr.addField("XYZ", 0);
+  eAttr.addField("YZX", 1);
+  eAttr.addField("ZXY", 2);
+  eAttr.addField("XZY", 3);
+  eAttr.addField("YXZ", 4);
+  eAttr.addField("ZYX", 5);
+  addAttribute(aRotateOrder);
+  affects(aRotateOrder);
 
   return MS::kSuccess;
 }
 
 
-void* SwingTwistNode::creator() {
-  return new SwingTwistNode(); 
-}
-
-
-SwingTwistNode::SwingTwistNode() {
+MObject SwingTwistNode::createAngles(const MString& name, MObject& x, MObject& y, MObject& z) {
+  MFnNumericAttribute nAttr;
+  MFnUnitAttribute uAttr;
+  x = uAttr.create(name + "X", name + "X", MFnUnitAttribute::kAngle);
+  y = uAttr.create(name + "Y", name + "Y", MFnUnitAttribute::kAngle);
+  z = uAttr.create(name + "Z", name + "Z", MFnUnitAttribute::kAngle);
+  return nAttr.create(name, name, x, y, z);
 }
 
 
-SwingTwistNode::~SwingTwistNode() {
+void SwingTwistNode::affects(const MObject& attribute) {
+  attributeAffects(attribute, aOutMatrix);
+  attributeAffects(attribute, aOutRotate);
+  attributeAffects(attribute, aOutRotateX);
+  attributeAffects(attribute, aOutRotateY);
+  attributeAffects(attribute, aOutRotateZ);
 }
 
 
-MStatus SwingTwistNode::compute(const MPlug &plug, MDataBlock &data) {
-  MStatus status;
-
-  if (plug != aOutMatrix) {
-    return MS::kUnknownParameter;
-  }
-
-  // Get the input data
-  MMatrix inMatrix = data.inputValue(aInMatrix).asMatrix();
-  MMatrix targetRestMatrix = data.inputValue(aTargetRestMatrix).asMatrix();
-  MMatrix restMatrix = data.inputValue(aRestMatrix).asMatrix();
-  float twistWeight = data.inputValue(aTwistWeight).asFloat();
-  float swingWeight = data.inputValue(aSwingWeight).asFloat();
-  short twistAxis = data.inputValue(aTwistAxis).asShort();
-
-  // By calculating the local matrix with the world and parent inverse, we automatically
-  // take in to account whether the joint uses joint orient or not.
-  MMatrix localMatrix = inMatrix * restMatrix.inverse();
-
-  // Get the input rotation quaternion
-  MQuaternion rotation = MTransformationMatrix(localMatrix).rotation();
+MQuaternion SwingTwistNode::weightedRotation(const MQuaternion& rotation, short twistAxis,
+                                             float twistWeight, float swingWeight) {
   MQuaternion twist(rotation);
 
   // Get the reference twist vector
@@ -139,8 +177,58 @@ MStatus SwingTwistNode::compute(const MPlug &plug, MDataBlock &data) {
   MQuaternion rest;
   swing = slerp(rest, swing, swingWeight);
   twist = slerp(rest, twist, twistWeight);
-  
-  MQuaternion outRotation = twist * swing;
+
+  return twist * swing;
+}
+
+
+void* SwingTwistNode::creator() {
+  return new SwingTwistNode();
+}
+
+
+SwingTwistNode::SwingTwistNode() {
+}
+
+
+SwingTwistNode::~SwingTwistNode() {
+}
+
+
+MStatus SwingTwistNode::compute(const MPlug &plug, MDataBlock &data) {
+  MStatus status;
+
+  if (plug != aOutMatrix && plug != aOutRotate && plug.parent() != aOutRotate) {
+    return MS::kUnknownParameter;
+  }
+
+  // Get the input data
+  MMatrix inMatrix = data.inputValue(aInMatrix).asMatrix();
+  MMatrix targetRestMatrix = data.inputValue(aTargetRestMatrix).asMatrix();
+  MMatrix restMatrix = data.inputValue(aRestMatrix).asMatrix();
+  float twistWeight = data.inputValue(aTwistWeight).asFloat();
+  float swingWeight = data.inputValue(aSwingWeight).asFloat();
+  short twistAxis = data.inputValue(aTwistAxis).asShort();
+  MMatrix matrix = data.inputValue(aMatrix).asMatrix();
+  short rotateOrder = data.inputValue(aRotateOrder).asShort();
+  MDataHandle hJointOrient = data.inputValue(aJointOrient);
+  MEulerRotation jointOrient(hJointOrient.child(aJointOrientX).asAngle().asRadians(),
+                             hJointOrient.child(aJointOrientY).asAngle().asRadians(),
+                             hJointOrient.child(aJointOrientZ).asAngle().asRadians());
+  MDataHandle hRotateAxis = data.inputValue(aRotateAxis);
+  MEulerRotation rotateAxis(hRotateAxis.child(aRotateAxisX).asAngle().asRadians(),
+                            hRotateAxis.child(aRotateAxisY).asAngle().asRadians(),
+                            hRotateAxis.child(aRotateAxisZ).asAngle().asRadians());
+
+  // By calculating the local matrix with the world and parent inverse, we automatically
+  // take in to account whether the joint uses joint orient or not.
+  MMatrix localMatrix = matrix * inMatrix * restMatrix.inverse();
+
+  // Get the input rotation quaternion.  Rigs built with the legacy Python node connect the
+  // local matrix of the driver so the joint orient and rotate axis still need to be removed.
+  MQuaternion rotation = MTransformationMatrix(localMatrix).rotation();
+  rotation = rotateAxis.asQuaternion().inverse() * rotation * jointOrient.asQuaternion().inverse();
+  MQuaternion outRotation = weightedRotation(rotation, twistAxis, twistWeight, swingWeight);
 
   // Since this is meant to drive offsetParentMatrix, we need to put the rotation
   // in the space of the driven transform. If we don't multiply by the target's rest
@@ -151,5 +239,19 @@ MStatus SwingTwistNode::compute(const MPlug &plug, MDataBlock &data) {
   hOut.setMMatrix(outMatrix);
   hOut.setClean();
 
+  MEulerRotation euler = outRotation.asEulerRotation();
+  euler.reorderIt(static_cast<MEulerRotation::RotationOrder>(rotateOrder));
+  MDataHandle hOutRotate = data.outputValue(aOutRotate);
+  MDataHandle hX = hOutRotate.child(aOutRotateX);
+  MDataHandle hY = hOutRotate.child(aOutRotateY);
+  MDataHandle hZ = hOutRotate.child(aOutRotateZ);
+  hX.setMAngle(MAngle(euler.x));
+  hY.setMAngle(MAngle(euler.y));
+  hZ.setMAngle(MAngle(euler.z));
+  hX.setClean();
+  hY.setClean();
+  hZ.setClean();
+  hOutRotate.setClean();
+
   return MS::kSuccess;
 }
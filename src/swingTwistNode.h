@@ -2,6 +2,7 @@
 #define SWINGTWIST_SWINGTWISTNODE_H
 
 #include <maya/MPxNode.h>
+#include <maya/MQuaternion.h>
 
 class SwingTwistNode : public MPxNode {
  public:
@@ -11,16 +12,45 @@ class SwingTwistNode : public MPxNode {
 
   virtual MStatus compute(const MPlug& plug, MDataBlock& data);
 
+  /**
+    Decomposes a local rotation into swing and twist about the given axis and scales each
+    part by its weight.  Negative weights invert the part.
+    @param[in] rotation Local rotation relative to the rest orientation.
+    @param[in] twistAxis 0, 1 or 2 for the X, Y or Z axis.
+    @return The weighted twist followed by the weighted swing.
+  */
+  static MQuaternion weightedRotation(const MQuaternion& rotation, short twistAxis,
+                                      float twistWeight, float swingWeight);
+
   static MStatus initialize();
   static MTypeId id;
   static const MString kName;
   static MObject aOutMatrix;
+  static MObject aOutRotate;
+  static MObject aOutRotateX;
+  static MObject aOutRotateY;
+  static MObject aOutRotateZ;
   static MObject aRestMatrix;
   static MObject aTargetRestMatrix;
   static MObject aInMatrix;
   static MObject aTwistWeight;
   static MObject aSwingWeight;
   static MObject aTwistAxis;
+  // Inputs of the legacy Python swingTwist node
+  static MObject aMatrix;
+  static MObject aJointOrient;
+  static MObject aJointOrientX;
+  static MObject aJointOrientY;
+  static MObject aJointOrientZ;
+  static MObject aRotateAxis;
+  static MObject aRotateAxisX;
+  static MObject aRotateAxisY;
+  static MObject aRotateAxisZ;
+  static MObject aRotateOrder;
+
+ private:
+  static void affects(const MObject& attribute);
+  static MObject createAngles(const MString& name, MObject& x, MObject& y, MObject& z);
 };
 
 #endif
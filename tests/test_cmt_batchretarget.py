@@ -0,0 +1,35 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import cmt.anim.batchretarget as batchretarget
+from cmt.test import TestCase
+
+
+class BatchRetargetTests(TestCase):
+    def test_get_export_path(self):
+        path = batchretarget.get_export_path(
+            "/mocap/walk_mocap.fbx",
+            "/retargeted",
+            prefix="hero_",
+            search="_mocap",
+            replace="",
+        )
+        self.assertEqual(path, os.path.realpath("/retargeted/hero_walk.fbx"))
+
+    def test_manifest_round_trip(self):
+        file_path = self.get_temp_filename("manifest.json")
+        manifest = batchretarget.Manifest(file_path)
+        job = manifest.add("/mocap/walk.fbx", "/retargeted/walk.fbx")
+        job["status"] = batchretarget.DONE
+        manifest.add("/mocap/run.fbx", "/retargeted/run.fbx")
+        manifest.save()
+
+        manifest = batchretarget.Manifest(file_path)
+        self.assertEqual(len(manifest.jobs), 2)
+        job = manifest.add("/mocap/walk.fbx", "/retargeted/walk.fbx")
+        self.assertEqual(job["status"], batchretarget.DONE)
+        self.assertEqual(len(manifest.jobs), 2)
+        self.assertEqual(manifest.jobs[1]["status"], batchretarget.PENDING)
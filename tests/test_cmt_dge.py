@@ -1,5 +1,5 @@
 import maya.cmds as cmds
-from cmt.dge import dge
+from cmt.dge import dge, evaluate, BuildSession
 from cmt.test import TestCase
 import math
 
@@ -314,3 +314,236 @@ class DGETests(TestCase):
         result = dge("distance(i, j)", container="mydistance", i=loc, j=loc2)
         d = cmds.getAttr(result)
         self.assertAlmostEquals(d, 2.5)
+
+    def test_compiled_soft_ik(self):
+        loc = cmds.spaceLocator()[0]
+        cmds.addAttr(loc, ln="softIk", minValue=0, maxValue=1, dv=0.2)
+        expression = (
+            "x > (1.0 - softIk)"
+            "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
+            ": x"
+        )
+        kwargs = {"x": "{}.tx".format(loc), "softIk": "{}.softIk".format(loc)}
+        result = dge(expression, **kwargs)
+        compiled_result = dge(expression, compiled=True, **kwargs)
+        self.assertEqual(cmds.nodeType(compiled_result), "dge")
+        for i in range(20):
+            cmds.setAttr("{}.tx".format(loc), 0.1 * i)
+            self.assertAlmostEquals(
+                cmds.getAttr(compiled_result), cmds.getAttr(result), places=5
+            )
+
+    def test_compiled_assignment(self):
+        loc = cmds.spaceLocator()[0]
+        dge(
+            "y=lerp(4, 8, x)",
+            compiled=True,
+            x="{}.tx".format(loc),
+            y="{}.ty".format(loc),
+        )
+        cmds.setAttr("{}.tx".format(loc), 0.25)
+        y = cmds.getAttr("{}.ty".format(loc))
+        self.assertAlmostEquals(y, 5)
+        self.assertEqual(len(cmds.ls(type="dge")), 1)
+
+    def test_compiled_trigonometry(self):
+        loc = cmds.spaceLocator()[0]
+        for function in ["cos", "sin", "tan", "acos", "asin", "atan"]:
+            vanilla = dge("{}(x)".format(function), x="{}.tx".format(loc))
+            compiled = dge(
+                "{}(x)".format(function), compiled=True, x="{}.tx".format(loc)
+            )
+            for i in range(20):
+                cmds.setAttr("{}.tx".format(loc), -0.95 + 0.1 * i)
+                self.assertAlmostEquals(
+                    cmds.getAttr(compiled), cmds.getAttr(vanilla), places=3
+                )
+
+    def test_compiled_distance(self):
+        loc = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        cmds.setAttr("{}.tx".format(loc), 2.5)
+        result = dge("distance(i, j) * 2", compiled=True, i=loc, j=loc2)
+        d = cmds.getAttr(result)
+        self.assertAlmostEquals(d, 5.0)
+
+    def test_compiled_rejects_array_attributes(self):
+        loc = cmds.spaceLocator()[0]
+        with self.assertRaises(RuntimeError):
+            dge("x+3", compiled=True, x="{}.t".format(loc))
+
+    def test_constant_folding(self):
+        loc = cmds.spaceLocator()[0]
+        dge("y=x * 2 * PI", x="{}.tx".format(loc), y="{}.ty".format(loc))
+        cmds.setAttr("{}.tx".format(loc), 0.5)
+        y = cmds.getAttr("{}.ty".format(loc))
+        self.assertAlmostEquals(y, math.pi, places=5)
+        mdn = cmds.ls(type="multiplyDivide")
+        self.assertEqual(len(mdn), 1)
+
+    def test_constant_expression(self):
+        loc = cmds.spaceLocator()[0]
+        result = dge("y=sqrt(4) + 1 > 2 ? 10 : 20", y="{}.ty".format(loc))
+        self.assertAlmostEquals(result, 10)
+        y = cmds.getAttr("{}.ty".format(loc))
+        self.assertAlmostEquals(y, 10)
+
+    def test_reuse_commutative_nodes(self):
+        loc = cmds.spaceLocator()[0]
+        dge(
+            "z=x*y + y*x",
+            x="{}.tx".format(loc),
+            y="{}.ty".format(loc),
+            z="{}.tz".format(loc),
+        )
+        cmds.setAttr("{}.tx".format(loc), 2)
+        cmds.setAttr("{}.ty".format(loc), 3)
+        z = cmds.getAttr("{}.tz".format(loc))
+        self.assertAlmostEquals(z, 12)
+        self.assertEqual(len(cmds.ls(type="multiplyDivide")), 1)
+        self.assertEqual(len(cmds.ls(type="plusMinusAverage")), 1)
+
+    def test_cached_expression_with_new_values(self):
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        dge("y=x*3", x="{}.tx".format(loc1), y="{}.ty".format(loc1))
+        dge("y=x*3", x="{}.tz".format(loc2), y="{}.ty".format(loc2))
+        cmds.setAttr("{}.tx".format(loc1), 2)
+        cmds.setAttr("{}.tz".format(loc2), 4)
+        self.assertAlmostEquals(cmds.getAttr("{}.ty".format(loc1)), 6)
+        self.assertAlmostEquals(cmds.getAttr("{}.ty".format(loc2)), 12)
+
+    def test_build_session_shares_nodes(self):
+        loc = cmds.spaceLocator()[0]
+        with BuildSession():
+            dge("y=x * 2 + 1", x="{}.tx".format(loc), y="{}.ty".format(loc))
+            dge(
+                "y=(a * 2 + 1) / b",
+                a="{}.translateX".format(loc),
+                b="{}.sx".format(loc),
+                y="{}.tz".format(loc),
+            )
+        cmds.setAttr("{}.tx".format(loc), 3)
+        cmds.setAttr("{}.sx".format(loc), 2)
+        self.assertAlmostEquals(cmds.getAttr("{}.ty".format(loc)), 7)
+        self.assertAlmostEquals(cmds.getAttr("{}.tz".format(loc)), 3.5)
+        self.assertEqual(len(cmds.ls(type="multiplyDivide")), 2)
+        self.assertEqual(len(cmds.ls(type="plusMinusAverage")), 1)
+
+    def test_batched(self):
+        loc = cmds.spaceLocator()[0]
+        dge(
+            "y = x > 1 ? clamp(x * 2, 0, 3) : abs(x)",
+            batched=True,
+            x="{}.tx".format(loc),
+            y="{}.ty".format(loc),
+        )
+        for x in [-0.5, 0.5, 1.2, 4.0]:
+            cmds.setAttr("{}.tx".format(loc), x)
+            y = cmds.getAttr("{}.ty".format(loc))
+            expected = min(max(x * 2, 0), 3) if x > 1 else math.fabs(x)
+            self.assertAlmostEquals(y, expected)
+        notes = cmds.getAttr("{}.notes".format(cmds.ls(type="clamp")[0]))
+        self.assertIn("clamp", notes)
+
+    def test_batched_undo(self):
+        loc = cmds.spaceLocator()[0]
+        dge(
+            "y = x * 2 + 1",
+            batched=True,
+            x="{}.tx".format(loc),
+            y="{}.ty".format(loc),
+        )
+        self.assertEqual(len(cmds.ls(type="multiplyDivide")), 1)
+        cmds.undo()
+        self.assertEqual(len(cmds.ls(type="multiplyDivide")), 0)
+        self.assertEqual(len(cmds.ls(type="plusMinusAverage")), 0)
+        self.assertFalse(cmds.listConnections("{}.ty".format(loc)))
+
+    def assert_network_matches_evaluate(self, expression, values, **kwargs):
+        loc = cmds.spaceLocator()[0]
+        result = dge(expression, x="{}.tx".format(loc), **kwargs)
+        expected = evaluate(expression, x=values, **kwargs)
+        for x, y in zip(values, expected):
+            cmds.setAttr("{}.tx".format(loc), x)
+            self.assertAlmostEquals(cmds.getAttr(result), y, places=4)
+
+    def test_evaluate_soft_ik(self):
+        self.assert_network_matches_evaluate(
+            "x > (1.0 - softIk)"
+            "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
+            ": x",
+            [0.1 * i for i in range(20)],
+            softIk=0.2,
+        )
+
+    def test_evaluate_functions(self):
+        values = [-0.95 + 0.1 * i for i in range(20)]
+        for expression in [
+            "abs(x) + sqrt(abs(x)) - 2^x",
+            "clamp(x, -0.5, 0.25) * lerp(2, 4, x)",
+            "min(x, 0.2) + max(x, -0.3)",
+            "sin(x) + cos(x) + tan(x)",
+            "acos(x) + asin(x) + atan(x)",
+        ]:
+            self.assert_network_matches_evaluate(expression, values)
+
+    def test_evaluate_distance(self):
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        cmds.setAttr("{}.t".format(loc2), 3, 4, 0)
+        result = dge("distance(a, b)", a=loc1, b=loc2)
+        m1 = [cmds.getAttr("{}.worldMatrix[0]".format(loc1))]
+        m2 = [cmds.getAttr("{}.worldMatrix[0]".format(loc2))]
+        # Maya returns flat matrices
+        expected = evaluate(
+            "distance(a, b)",
+            a=[[m[0:4], m[4:8], m[8:12], m[12:16]] for m in m1],
+            b=[[m[0:4], m[4:8], m[8:12], m[12:16]] for m in m2],
+        )
+        self.assertAlmostEquals(cmds.getAttr(result), expected[0])
+        self.assertAlmostEquals(expected[0], 5)
+
+    def test_vector_functions(self):
+        loc = cmds.spaceLocator()[0]
+        cmds.setAttr("{}.t".format(loc), 1, 2, 3)
+        cmds.setAttr("{}.s".format(loc), 4, 0, 1)
+        result = dge(
+            "dot(normalize(t), s) + length(cross(t, s))",
+            t="{}.t".format(loc),
+            s="{}.s".format(loc),
+        )
+        expected = evaluate(
+            "dot(normalize(t), s) + length(cross(t, s))", t=[1, 2, 3], s=[4, 0, 1]
+        )
+        self.assertAlmostEquals(cmds.getAttr(result), expected, places=5)
+        self.assertEqual(len(cmds.ls(type="vectorProduct")), 3)
+        self.assertEqual(len(cmds.ls(type="distanceBetween")), 1)
+
+    def test_matrix_functions(self):
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        cmds.setAttr("{}.t".format(loc1), 1, 2, 3)
+        cmds.setAttr("{}.r".format(loc1), 20, 45, 10)
+        cmds.setAttr("{}.t".format(loc2), -2, 5, 1)
+        cmds.setAttr("{}.r".format(loc2), 0, 90, 0)
+        dge(
+            "p = pointmatrix(t, matmul(a, inverse(b)))",
+            t="{}.t".format(loc2),
+            a=loc1,
+            b=loc2,
+            p="{}.t".format(cmds.spaceLocator()[0]),
+        )
+        self.assertEqual(len(cmds.ls(type="multMatrix")), 1)
+        self.assertEqual(len(cmds.ls(type="inverseMatrix")), 1)
+        self.assertEqual(len(cmds.ls(type="pointMatrixMult")), 1)
+        result = cmds.getAttr("{}.output".format(cmds.ls(type="pointMatrixMult")[0]))
+        matrices = [
+            cmds.getAttr("{}.worldMatrix[0]".format(node)) for node in [loc1, loc2]
+        ]
+        a, b = [[m[0:4], m[4:8], m[8:12], m[12:16]] for m in matrices]
+        expected = evaluate(
+            "pointmatrix(t, matmul(a, inverse(b)))", t=[-2, 5, 1], a=a, b=b
+        )
+        for v1, v2 in zip(result[0], expected):
+            self.assertAlmostEquals(v1, v2, places=4)
@@ -1,10 +1,53 @@
 import maya.cmds as cmds
+import maya.api.OpenMaya as OpenMaya
 import cmt.rig.rbf as rbf
+import cmt.rig.rbfsolver as rbfsolver
 from cmt.test import TestCase
 import math
 
 
 class RBFTests(TestCase):
+    def create_rotation_rbf(
+        self, sample_count=3, output_rotations=True, rbf_function=None, parallel=False
+    ):
+        """Create an rbf node driven by the tx and rotation of a locator that drives the
+        scale of a second locator and optionally the rotation of a third.
+
+        :param sample_count: Number of the shared samples to add, up to 3.
+        :param output_rotations: True to add the rotation output.
+        :param rbf_function: Optional rbf function set before the samples are added.
+        :param parallel: Value of the parallel attribute.
+        :return: The RBF node and the three locators.
+        """
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        loc3 = cmds.spaceLocator()[0]
+        node = rbf.RBF.create(
+            inputs=["{}.tx".format(loc1)],
+            input_transforms=[loc1],
+            outputs=["{}.s{}".format(loc2, x) for x in "xyz"],
+            output_transforms=[loc3] if output_rotations else None,
+        )
+        if rbf_function is not None:
+            cmds.setAttr("{}.rbf".format(node.name), rbf_function)
+        cmds.setAttr("{}.parallel".format(node.name), parallel)
+        samples = {
+            "input_values": [[1], [-2], [0.5]],
+            "input_rotations": [[[90, 45, 0]], [[-90, -60, 0]], [[20, 0, 70]]],
+            "output_values": [[2, 1, 2], [0.5, 2, 3], [1, 3, 1]],
+            "rotation_types": [rbf.RBF.swing_twist, rbf.RBF.swing, rbf.RBF.twist],
+        }
+        if output_rotations:
+            samples["output_rotations"] = [
+                [[45, 0, 0]],
+                [[0, 30, 10]],
+                [[10, 10, 0]],
+            ]
+        node.add_samples(
+            **{key: values[:sample_count] for key, values in samples.items()}
+        )
+        return node, loc1, loc2, loc3
+
     def test_create(self):
         loc1 = cmds.spaceLocator()[0]
         node = rbf.RBF.create(
@@ -231,3 +274,226 @@ class RBFTests(TestCase):
         cmds.setAttr("{}.sampleMode".format(node.name), 1)
         r = cmds.getAttr("{}.r".format(joint2))[0]
         self.assertListAlmostEqual(r, [18.226, -43.161, -1.089], places=6)
+
+    def test_add_samples(self):
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        node = rbf.RBF.create(
+            inputs=["{}.t{}".format(loc1, x) for x in "xy"],
+            input_transforms=[loc1],
+            outputs=["{}.s{}".format(loc2, x) for x in "xyz"],
+            add_neutral_sample=False,
+        )
+        indices = node.add_samples(
+            input_values=[[1, 2], [3, 4], [1, 2], [1, 2.00001]],
+            input_rotations=[[[0, 0, 0]], [[45, 0, 0]], [[0, 0, 0]], [[0, 0, 0]]],
+            output_values=[[2, 2, 2], [3, 3, 3], [4, 4, 4], [5, 5, 5]],
+            rotation_types=[rbf.RBF.swing, rbf.RBF.swing, rbf.RBF.twist, rbf.RBF.swing],
+        )
+        self.assertEqual(indices, [0, 1, 2, None])
+        self.assertIsNone(
+            node.add_sample(
+                input_values=[3, 4],
+                input_rotations=[[45, 0, 0]],
+                output_values=[1, 1, 1],
+            )
+        )
+
+        samples = node.samples()
+        self.assertListEqual(list(samples.indices), [0, 1, 2])
+        self.assertListEqual(list(samples.rotation_types), [0, 0, 1])
+        self.assertListAlmostEqual(list(samples.input_values[1]), [3, 4])
+        self.assertListAlmostEqual(list(samples.output_values[2]), [4, 4, 4])
+        q = rbf.euler_to_quat([[45, 0, 0]], [loc1])[0]
+        self.assertListAlmostEqual(list(samples.input_quats[1][0]), q)
+
+    def test_pose_interpolator_matches_node(self):
+        node, loc1, loc2, _ = self.create_rotation_rbf(
+            output_rotations=False, rbf_function=rbfsolver.GAUSSIAN
+        )
+        translations = [0.5, -1, 0.25]
+        rotations = [[30, 20, 10], [-45, 10, 60], [90, 0, 0]]
+        expected = []
+        for tx, r in zip(translations, rotations):
+            cmds.setAttr("{}.tx".format(loc1), tx)
+            cmds.setAttr("{}.r".format(loc1), *r)
+            expected.append(cmds.getAttr("{}.s".format(loc2))[0])
+
+        interpolator = rbfsolver.PoseInterpolator(
+            node.samples(), rbf=rbfsolver.GAUSSIAN
+        )
+        quats = rbf.euler_to_quat(rotations, [loc1] * len(rotations))
+        values, _ = interpolator.evaluate(
+            [[tx] for tx in translations], [[q] for q in quats]
+        )
+        for actual, scale in zip(values, expected):
+            self.assertListAlmostEqual(list(actual), scale, places=4)
+
+    def test_evaluate_frames_matches_node(self):
+        node, loc1, loc2, loc3 = self.create_rotation_rbf(sample_count=2)
+        translations = [0.5, -1, 0.25, 1]
+        rotations = [[30, 20, 10], [-45, 10, 60], [90, 0, 0], [90, 45, 0]]
+        expected_scales = []
+        expected_rotations = []
+        for tx, r in zip(translations, rotations):
+            cmds.setAttr("{}.tx".format(loc1), tx)
+            cmds.setAttr("{}.r".format(loc1), *r)
+            expected_scales.append(cmds.getAttr("{}.s".format(loc2))[0])
+            expected_rotations.append(cmds.getAttr("{}.r".format(loc3))[0])
+
+        quats = rbf.euler_to_quat(rotations, [loc1] * len(rotations))
+        values, output_rotations = node.evaluate(
+            [[tx] for tx in translations], [[q] for q in quats]
+        )
+        for actual, scale in zip(values, expected_scales):
+            self.assertListAlmostEqual(list(actual), scale)
+        for actual, r in zip(output_rotations, expected_rotations):
+            self.assertListAlmostEqual(list(actual[0]), r)
+
+    def test_nearest_samples(self):
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        node = rbf.RBF.create(
+            inputs=["{}.t{}".format(loc1, x) for x in "xy"],
+            outputs=["{}.s{}".format(loc2, x) for x in "xyz"],
+            add_neutral_sample=False,
+        )
+        cmds.setAttr("{}.nearestSamples".format(node.name), 3)
+        input_values = [[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1], [2, 2]]
+        output_values = [
+            [1, 1, 1],
+            [2, 1, 1],
+            [1, 2, 1],
+            [0.5, 1, 1],
+            [1, 0.5, 1],
+            [3, 3, 2],
+        ]
+        node.add_samples(input_values=input_values, output_values=output_values)
+        for (tx, ty), scale in zip(input_values, output_values):
+            cmds.setAttr("{}.t".format(loc1), tx, ty, 0)
+            self.assertListAlmostEqual(cmds.getAttr("{}.s".format(loc2))[0], scale)
+
+        translations = [[0.5, 0.25], [-0.5, -0.75], [1.5, 1]]
+        expected = []
+        for tx, ty in translations:
+            cmds.setAttr("{}.t".format(loc1), tx, ty, 0)
+            expected.append(cmds.getAttr("{}.s".format(loc2))[0])
+        interpolator = rbfsolver.PoseInterpolator(node.samples(), nearest_count=3)
+        values, _ = interpolator.evaluate(translations)
+        for actual, scale in zip(values, expected):
+            self.assertListAlmostEqual(list(actual), scale, places=4)
+
+    def test_dump_and_load(self):
+        node, loc1, loc2, loc3 = self.create_rotation_rbf(sample_count=2)
+        cmds.setAttr("{}.storeSolution".format(node.name), True)
+        cmds.setAttr("{}.tx".format(loc1), 0.5)
+        cmds.setAttr("{}.r".format(loc1), 30, 20, 10)
+        expected_scale = cmds.getAttr("{}.s".format(loc2))[0]
+        expected_rotation = cmds.getAttr("{}.r".format(loc3))[0]
+        solution_hash = cmds.getAttr("{}.solutionHash".format(node.name))
+        self.assertTrue(solution_hash)
+        self.assertTrue(cmds.getAttr("{}.solution".format(node.name)))
+
+        file_path = self.get_temp_filename("setup.rbf")
+        rbf.dump(node, file_path)
+        cmds.delete(node.name)
+        node = rbf.load(file_path)
+        self.assertListAlmostEqual(cmds.getAttr("{}.s".format(loc2))[0], expected_scale)
+        self.assertListAlmostEqual(
+            cmds.getAttr("{}.r".format(loc3))[0], expected_rotation
+        )
+        self.assertEqual(
+            cmds.getAttr("{}.solutionHash".format(node.name)), solution_hash
+        )
+
+        # Editing a sample input invalidates the stored solution
+        cmds.setAttr("{}.sample[1].sampleInputValue[0]".format(node.name), 3)
+        cmds.getAttr("{}.s".format(loc2))
+        self.assertNotEqual(
+            cmds.getAttr("{}.solutionHash".format(node.name)), solution_hash
+        )
+
+    def test_parallel_matches_serial(self):
+        results = []
+        for parallel in [False, True]:
+            node, loc1, loc2, loc3 = self.create_rotation_rbf(parallel=parallel)
+            cmds.setAttr("{}.tx".format(loc1), 0.25)
+            cmds.setAttr("{}.r".format(loc1), 30, 20, 10)
+            results.append(
+                (
+                    cmds.getAttr("{}.s".format(loc2))[0],
+                    cmds.getAttr("{}.r".format(loc3))[0],
+                )
+            )
+        (serial_scale, serial_rotation), (parallel_scale, parallel_rotation) = results
+        self.assertListAlmostEqual(parallel_scale, serial_scale)
+        self.assertListAlmostEqual(parallel_rotation, serial_rotation)
+
+    def test_euler_to_quat_matches_maya(self):
+        joint = cmds.createNode("joint")
+        cmds.setAttr("{}.jo".format(joint), 10, 20, 30)
+        eulers = [[30, -45, 70], [120, 10, -80], [-15, 160, 5]]
+        for rotate_order in range(6):
+            cmds.setAttr("{}.ro".format(joint), rotate_order)
+            quats = rbf.euler_to_quat([[r] for r in eulers], [joint])
+            for r, q in zip(eulers, quats):
+                euler = OpenMaya.MEulerRotation(
+                    [math.radians(x) for x in r], rotate_order
+                )
+                jo = OpenMaya.MEulerRotation([math.radians(x) for x in [10, 20, 30]])
+                expected = euler.asQuaternion() * jo.asQuaternion()
+                if expected.w * q[0][3] < 0.0:
+                    expected.negateIt()
+                self.assertListAlmostEqual(
+                    list(q[0]), [expected.x, expected.y, expected.z, expected.w]
+                )
+
+    def test_quaternion_distance_matrix(self):
+        quats1 = rbf.eulers_to_quats([[[30, 0, 0]], [[0, 45, 10]]], 0)
+        quats2 = rbf.eulers_to_quats([[[30, 0, 0]], [[-20, 90, 0]], [[5, 5, 5]]], 0)
+        distances = rbf.quaternion_distance_matrix(quats1, quats2)
+        self.assertEqual(distances.shape, (2, 3, 1))
+        for i, q1 in enumerate(quats1):
+            for j, q2 in enumerate(quats2):
+                expected = rbf.quaternion_distance(
+                    OpenMaya.MQuaternion(*q1[0]), OpenMaya.MQuaternion(*q2[0])
+                )
+                self.assertAlmostEqual(distances[i, j, 0], expected)
+
+    def test_input_rotation_twist_axis(self):
+        loc1 = cmds.spaceLocator()[0]
+        loc2 = cmds.spaceLocator()[0]
+        node = rbf.RBF.create(
+            input_transforms=[loc1],
+            outputs=["{}.s{}".format(loc2, x) for x in "xyz"],
+            twist_axes=[1],
+        )
+        self.assertEqual(node.twist_axes(), [1])
+        node.add_sample(
+            input_rotations=[[0, 90, 0]],
+            output_values=[2, 1, 2],
+            rotation_type=rbf.RBF.twist,
+        )
+        node.add_sample(
+            input_rotations=[[0, -90, 0]],
+            output_values=[0.5, 2, 3],
+            rotation_type=rbf.RBF.twist,
+        )
+        # Rotating around x is all swing when the twist axis is y
+        cmds.setAttr("{}.rx".format(loc1), 90)
+        s = cmds.getAttr("{}.s".format(loc2))[0]
+        self.assertListAlmostEqual(s, [1.0, 1.0, 1.0])
+        cmds.setAttr("{}.rx".format(loc1), 0)
+        cmds.setAttr("{}.ry".format(loc1), 90)
+        s = cmds.getAttr("{}.s".format(loc2))[0]
+        self.assertListAlmostEqual(s, [2, 1, 2])
+        cmds.setAttr("{}.rz".format(loc1), 45)
+        s = cmds.getAttr("{}.s".format(loc2))[0]
+        self.assertListAlmostEqual(s, [2, 1, 2])
+
+        interpolator = rbfsolver.PoseInterpolator(
+            node.samples(), twist_axes=node.twist_axes()
+        )
+        quats = rbf.euler_to_quat([[0, 90, 45]], [loc1])
+        values, _ = interpolator.evaluate(None, [quats])
+        self.assertListAlmostEqual(list(values[0]), s, places=4)
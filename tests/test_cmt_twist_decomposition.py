@@ -5,6 +5,7 @@ from __future__ import print_function
 import maya.cmds as cmds
 import maya.api.OpenMaya as OpenMaya
 import cmt.rig.swingtwist as st
+import cmt.plugins.swingtwist as legacy_st
 from cmt.test import TestCase
 
 import math
@@ -80,3 +81,76 @@ class TwistDecompositionTests(TestCase):
         )
         tm.translateBy(OpenMaya.MVector(self.tx, 0, 0), OpenMaya.MSpace.kTransform)
         self.assertListAlmostEqual(m, tm.asMatrix())
+
+    def test_legacy_swing_twist_drives_rotate(self):
+        driven = cmds.createNode("transform", name="driven")
+        cmds.setAttr("{}.rotateOrder".format(driven), 3)
+        node = legacy_st.create(self.start_joint, driven, name="legacy_swing_twist")
+        self.assertEqual(node, "legacy_swing_twist")
+        self.assertEqual(cmds.nodeType(node), "swingTwist")
+        self.assertTrue(
+            cmds.connectionInfo("{}.jointOrient".format(node), isDestination=True)
+        )
+        # Full swing and twist reproduce the rotation without the joint orient
+        cmds.setAttr("{}.r".format(self.start_joint), 10, 20, 30)
+        expected = OpenMaya.MEulerRotation(
+            *[math.radians(x) for x in [10, 20, 30]]
+        ).reorder(OpenMaya.MEulerRotation.kXZY)
+        r = cmds.getAttr("{}.r".format(driven))[0]
+        self.assertListAlmostEqual(
+            r, [math.degrees(x) for x in [expected.x, expected.y, expected.z]]
+        )
+
+        cmds.setAttr("{}.rotateOrder".format(driven), 0)
+        cmds.setAttr("{}.twist".format(node), 0)
+        cmds.setAttr("{}.r".format(self.start_joint), 45, 0, 0)
+        self.assertListAlmostEqual(cmds.getAttr("{}.r".format(driven))[0], [0, 0, 0])
+        cmds.setAttr("{}.r".format(self.start_joint), 0, 30, 0)
+        self.assertListAlmostEqual(cmds.getAttr("{}.r".format(driven))[0], [0, 30, 0])
+
+    def test_swing_twist_array_drives_many_transforms(self):
+        other_joint = cmds.duplicate(self.twist_joint, name="other_twist_joint")[0]
+        st.create_swing_twist(
+            self.start_joint,
+            self.twist_joint,
+            twist_weight=-0.5,
+            swing_weight=0.0,
+            node="twist_array",
+        )
+        st.create_swing_twist(
+            self.start_joint, other_joint, twist_weight=0.5, node="twist_array"
+        )
+        self.assertEqual(cmds.nodeType("twist_array"), "swingTwistArray")
+        self.assertEqual(cmds.getAttr("twist_array.driver", multiIndices=True), [0, 1])
+        m = self.local_matrix()
+        self.assertListAlmostEqual(m, self.rest_m)
+        cmds.setAttr("{}.rx".format(self.start_joint), 45)
+        for joint, angle in [(self.twist_joint, -22.5), (other_joint, 22.5)]:
+            m = OpenMaya.MMatrix(cmds.getAttr("{}.worldMatrix[0]".format(joint)))
+            pinv = OpenMaya.MMatrix(
+                cmds.getAttr("{}.worldInverseMatrix[0]".format(self.start_joint))
+            )
+            tm = OpenMaya.MTransformationMatrix()
+            tm.rotateBy(
+                OpenMaya.MEulerRotation(math.radians(angle), 0, 0),
+                OpenMaya.MSpace.kTransform,
+            )
+            tm.translateBy(OpenMaya.MVector(self.tx, 0, 0), OpenMaya.MSpace.kTransform)
+            self.assertListAlmostEqual(m * pinv, tm.asMatrix())
+
+    def test_swing_twist_array_is_always_native(self):
+        with self.assertRaises(RuntimeError):
+            st.create_swing_twist(
+                self.start_joint, self.twist_joint, node="twist_array", native=False
+            )
+        self.assertFalse(cmds.objExists("twist_array"))
+
+
+class SwingTwistBenchmarkTests(TestCase):
+    def test_benchmark_cleans_up(self):
+        before = set(cmds.ls(long=True))
+        results = st.benchmark(count=1, frames=2)
+        self.assertEqual(sorted(results.keys()), ["native", "network"])
+        for seconds in results.values():
+            self.assertIsInstance(seconds, float)
+        self.assertEqual(set(cmds.ls(long=True)), before)